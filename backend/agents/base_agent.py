@@ -1,20 +1,58 @@
 """
 Base Research Agent - Implements the ReAct (Reason-Act-Observe) pattern.
 """
+import asyncio
+import hashlib
+import textwrap
 import time
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import structlog
 
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import HumanMessage, SystemMessage
 
+from backend.agents.intent_router import get_intent_router
 from backend.app.models import AgentStep, AgentTrace, SourceInfo
+from backend.config.settings import get_settings
+from backend.services.agent_result_cache import get_agent_result_cache
+from backend.services.tool_memo import current_tool_memo
 from backend.tools.base_tool import BaseTool
+from backend.utils.resilience import has_time_for, within_deadline
+from backend.utils.token_budget import compact_entries, estimate_tokens, truncate_to_tokens
 
 logger = structlog.get_logger()
 
+# Response rules shared by every agent's reasoning prompt (part of the stable prefix)
+REACT_RESPONSE_RULES = """Response rules:
+If you have gathered sufficient information, respond with "DONE: [brief summary]"
+Otherwise, explain what specific information you need to gather next and which tool would be best to use."""
+
+# Response rules of the function-calling mode (used instead of REACT_RESPONSE_RULES)
+TOOL_CALLING_RULES = """Response rules:
+Briefly state your reasoning, then call the tools that gather the information you need next.
+You may call several tools at once when the lookups are independent.
+When the findings answer the query, or on the final iteration, call finish_research with a concise summary
+of the most important insights instead of calling more tools."""
+
+# Function the model calls to end research with its summary of the findings
+FINISH_TOOL = "finish_research"
+FINISH_TOOL_SCHEMA = {
+    "type": "function",
+    "function": {
+        "name": FINISH_TOOL,
+        "description": "End the research and report a concise summary of the most important findings",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string", "description": "Summary of the research findings"}
+            },
+            "required": ["summary"]
+        }
+    }
+}
+
 
 class BaseResearchAgent(ABC):
     """
@@ -24,12 +62,21 @@ class BaseResearchAgent(ABC):
     1. Reason: Think about what to do next
     2. Act: Use a tool to gather information
     3. Observe: Process the results and decide whether to continue
+    
+    In function-calling mode (the default) Reason and Act are a single LLM call: the
+    model returns its thought together with structured tool calls, and ends research
+    by calling finish_research with its summary, which saves the summary call.
     """
     
     def __init__(self, llm: BaseChatModel, agent_type: str):
         self.llm = llm
         self.agent_type = agent_type
+        self.settings = get_settings()
         self.tools = self._initialize_tools()
+        self._stable_prefix: Optional[str] = None
+        self._tool_schemas: Optional[List[Dict[str, Any]]] = None
+        # Results of earlier requests, reused while still fresh for this agent type
+        self.result_cache = get_agent_result_cache() if self.settings.agent_cache_enabled else None
         
     @abstractmethod
     def _initialize_tools(self) -> List[BaseTool]:
@@ -45,21 +92,52 @@ class BaseResearchAgent(ABC):
         self, 
         ticker: str, 
         query: str, 
-        max_iterations: int = 3
+        max_iterations: int = 3,
+        intent: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Run the research process for a given ticker.
         
+        A result cached by an earlier request for the same ticker and query intent is
+        returned instead while it is within the agent's freshness window. Once it is
+        stale, the agent's input fingerprint is taken; if the inputs are unchanged the
+        stale result is renewed and returned (marked "unchanged") without a ReAct run.
+        
         Args:
             ticker: Stock ticker symbol
             query: Original user query
             max_iterations: Maximum number of ReAct iterations
+            intent: Query intent from the intent router (classified from the query if omitted)
             
         Returns:
             Dictionary containing research results and execution trace
         """
         start_time = time.time()
         
+        if self.result_cache:
+            if intent is None:
+                intent = get_intent_router().route(query, max_iterations).intent
+            cached = self.result_cache.get(self.agent_type, ticker, intent)
+            if cached:
+                logger.info("Using cached research", 
+                           agent_type=self.agent_type,
+                           ticker=ticker,
+                           intent=intent)
+                return cached
+        
+        fingerprint = None
+        if self.result_cache and self.settings.delta_refresh_enabled:
+            fingerprint = await self._safe_input_fingerprint(ticker)
+            stale = self.result_cache.get_stale(self.agent_type, ticker, intent)
+            if fingerprint and stale and stale.get("fingerprint") == fingerprint:
+                logger.info("Inputs unchanged, renewing cached research", 
+                           agent_type=self.agent_type,
+                           ticker=ticker,
+                           intent=intent)
+                self.result_cache.renew(self.agent_type, ticker, intent)
+                stale["unchanged"] = True
+                return stale
+        
         logger.info("Starting research", 
                    agent_type=self.agent_type,
                    ticker=ticker,
@@ -81,10 +159,21 @@ class BaseResearchAgent(ABC):
             "sources": [],
             "iteration": 0
         }
+        # Set when the request deadline stopped the loop early; such results are not cached
+        cut_short = False
         
         try:
             # Run ReAct loop
             for iteration in range(max_iterations):
+                # Stop early rather than start an iteration the request deadline would cut short
+                if not has_time_for(self.settings.deadline_min_stage_seconds):
+                    logger.warning("Stopping research, request deadline near",
+                                   agent_type=self.agent_type,
+                                   ticker=ticker,
+                                   iteration=iteration + 1)
+                    cut_short = True
+                    break
+                
                 context["iteration"] = iteration + 1
                 
                 logger.info("Starting ReAct iteration", 
@@ -94,22 +183,35 @@ class BaseResearchAgent(ABC):
                 
                 step_start_time = time.time()
                 
-                # REASON: Think about what to do next
-                thought = await self._reason(context, trace.steps)
-                
-                # Check if agent thinks it's done
-                if self._is_done(thought):
-                    logger.info("Agent decided to stop", 
-                               agent_type=self.agent_type,
-                               ticker=ticker,
-                               iteration=iteration + 1)
-                    break
-                
-                # ACT: Choose and execute a tool
-                action, action_input = await self._act(thought, context)
+                if self.settings.agent_tool_calling_enabled:
+                    # REASON + ACT: one call returns the thought and the tool calls (or the summary)
+                    thought, actions, summary = await self._reason_and_act(
+                        context, trace.steps, final=iteration + 1 == max_iterations
+                    )
+                    if summary is not None:
+                        context["summary"] = summary
+                        logger.info("Agent finished with summary", 
+                                   agent_type=self.agent_type,
+                                   ticker=ticker,
+                                   iteration=iteration + 1)
+                        break
+                else:
+                    # REASON: Think about what to do next
+                    thought = await self._reason(context, trace.steps)
+                    
+                    # Check if agent thinks it's done
+                    if self._is_done(thought):
+                        logger.info("Agent decided to stop", 
+                                   agent_type=self.agent_type,
+                                   ticker=ticker,
+                                   iteration=iteration + 1)
+                        break
+                    
+                    # ACT: Choose the tools to use
+                    actions = await self._plan_actions(thought, context)
                 
-                # Execute the action
-                observation, sources = await self._execute_action(action, action_input, ticker)
+                # Execute the independent actions concurrently and merge their observations
+                action, observation, sources = await self._execute_actions(actions, ticker)
                 
                 # Update context with new findings
                 context["findings"].append({
@@ -125,7 +227,7 @@ class BaseResearchAgent(ABC):
                 step = AgentStep(
                     step_number=iteration + 1,
                     thought=thought,
-                    action=f"{action}: {action_input}",
+                    action=action,
                     observation=observation,
                     sources=sources,
                     latency_ms=step_latency
@@ -136,6 +238,7 @@ class BaseResearchAgent(ABC):
                            agent_type=self.agent_type,
                            ticker=ticker,
                            iteration=iteration + 1,
+                           actions=len(actions),
                            latency_ms=step_latency)
             
             # Mark as successful
@@ -151,12 +254,16 @@ class BaseResearchAgent(ABC):
                        total_latency_ms=total_latency,
                        steps_count=len(trace.steps))
             
-            return {
+            result = {
                 "trace": trace,
                 "findings": context["findings"],
                 "sources": context["sources"],
-                "summary": await self._summarize_findings(context)
+                "summary": context.get("summary") or await self._summarize_findings(context),
+                "fingerprint": fingerprint
             }
+            if self.result_cache and context["findings"] and not cut_short:
+                self.result_cache.put(self.agent_type, ticker, intent, result)
+            return result
             
         except Exception as e:
             logger.error("Research failed", 
@@ -186,8 +293,84 @@ class BaseResearchAgent(ABC):
         Returns:
             Thought about what to do next
         """
-        # Build the reasoning prompt
-        system_prompt = self._get_system_prompt()
+        instructions = f"""
+        Think step by step about what you should do next to gather relevant information about {context['ticker']} 
+        related to the query: "{context['query']}"
+        """
+        
+        response = await self.llm.ainvoke(self._build_reasoning_messages(context, previous_steps, instructions))
+        return response.content.strip()
+    
+    async def _reason_and_act(
+        self,
+        context: Dict[str, Any],
+        previous_steps: List[AgentStep],
+        final: bool = False
+    ) -> Tuple[str, List[Tuple[str, str]], Optional[str]]:
+        """
+        Reason and choose actions in a single function-calling LLM call.
+        
+        Args:
+            context: Current research context
+            previous_steps: Previous steps taken
+            final: Whether this is the last iteration
+            
+        Returns:
+            Tuple of (thought, [(action_name, action_input)], summary); the summary is
+            set, and the action list empty, when the model ends the research
+        """
+        instructions = f"""
+        Decide what to look up next about {context['ticker']} for the query: "{context['query']}"
+        """
+        if final and context["findings"]:
+            instructions += "This is the final iteration: call finish_research with your summary now.\n"
+        
+        response = await self.llm.ainvoke(
+            self._build_reasoning_messages(context, previous_steps, instructions),
+            tools=self._get_tool_schemas()
+        )
+        thought = self._response_text(response)
+        tool_calls = getattr(response, "tool_calls", None)
+        if not isinstance(tool_calls, list) or not tool_calls:
+            # No structured calls (e.g. a model without function calling): read the text instead
+            if self._is_done(thought):
+                return thought, [], thought[len("DONE:"):].strip() or None
+            return thought, await self._plan_actions(thought, context), None
+        
+        actions = []
+        summary = None
+        for call in tool_calls:
+            args = call.get("args") or {}
+            if call.get("name") == FINISH_TOOL:
+                summary = str(args.get("summary") or thought or "").strip()
+                continue
+            actions.append((call.get("name", ""), str(args.get("query") or context["ticker"])))
+        
+        if actions:
+            # Tools requested alongside finish_research run first; the summary is made afterwards
+            return thought, actions[:self.settings.agent_max_tool_calls], None
+        return thought, [], summary or None
+    
+    def _build_reasoning_messages(
+        self,
+        context: Dict[str, Any],
+        previous_steps: List[AgentStep],
+        instructions: str
+    ) -> List[Any]:
+        """Build the reasoning prompt: stable prefix, then findings and steps within the token budget."""
+        # Byte-stable prefix first so it can be served from the provider's context cache
+        stable_prefix = self._get_stable_prefix()
+        
+        # Findings and previous steps share whatever the fixed parts leave of the budget
+        fixed_tokens = (
+            estimate_tokens(stable_prefix)
+            + estimate_tokens(instructions)
+            + estimate_tokens(context['query'])
+            + 50
+        )
+        available_tokens = max(self.settings.prompt_token_budget - fixed_tokens, 100)
+        findings_text = self._format_findings(context['findings'], max_tokens=available_tokens * 2 // 3)
+        steps_budget = available_tokens - estimate_tokens(findings_text)
         
         # Create context summary
         context_summary = f"""
@@ -196,32 +379,32 @@ class BaseResearchAgent(ABC):
         Current Iteration: {context['iteration']}
         
         Previous Findings:
-        {self._format_findings(context['findings'])}
-        
-        Available Tools:
-        {self._format_tools()}
+        {findings_text}
         """
         
         if previous_steps:
-            context_summary += f"\n\nPrevious Steps:\n{self._format_previous_steps(previous_steps)}"
+            context_summary += f"\n\nPrevious Steps:\n{self._format_previous_steps(previous_steps, max_tokens=steps_budget)}"
         
         reasoning_prompt = f"""
         {context_summary}
-        
-        Think step by step about what you should do next to gather relevant information about {context['ticker']} 
-        related to the query: "{context['query']}"
-        
-        If you have gathered sufficient information, respond with "DONE: [brief summary]"
-        Otherwise, explain what specific information you need to gather next and which tool would be best to use.
+        {instructions}
         """
         
-        messages = [
-            SystemMessage(content=system_prompt),
+        return [
+            SystemMessage(content=stable_prefix),
             HumanMessage(content=reasoning_prompt)
         ]
-        
-        response = await self.llm.ainvoke(messages)
-        return response.content.strip()
+    
+    @staticmethod
+    def _response_text(response: Any) -> str:
+        """Get the text of a model response whose content may be a list of parts."""
+        content = getattr(response, "content", "")
+        if isinstance(content, list):
+            content = " ".join(
+                part.get("text", "") if isinstance(part, dict) else str(part)
+                for part in content
+            )
+        return str(content or "").strip()
     
     async def _act(self, thought: str, context: Dict[str, Any]) -> tuple[str, str]:
         """
@@ -267,6 +450,66 @@ class BaseResearchAgent(ABC):
         
         return action, action_input
     
+    async def _plan_actions(self, thought: str, context: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """
+        Choose the actions of an iteration from a text thought.
+        
+        The action picked by _act comes first; every other tool the thought names is
+        added with the same input, so one iteration can consult several sources.
+        
+        Args:
+            thought: The agent's reasoning
+            context: Current research context
+            
+        Returns:
+            List of (action_name, action_input), at most agent_max_tool_calls long
+        """
+        action, action_input = await self._act(thought, context)
+        actions = [(action, action_input)]
+        
+        thought_lower = thought.lower()
+        for tool in self.tools:
+            if tool.name != action and tool.name.lower() in thought_lower:
+                actions.append((tool.name, action_input))
+        
+        return actions[:self.settings.agent_max_tool_calls]
+    
+    async def _execute_actions(
+        self,
+        actions: List[Tuple[str, str]],
+        ticker: str
+    ) -> Tuple[str, str, List[SourceInfo]]:
+        """
+        Execute the actions of an iteration concurrently and merge their results.
+        
+        Args:
+            actions: List of (action_name, action_input); duplicates run once
+            ticker: Stock ticker
+            
+        Returns:
+            Tuple of (action description, merged observation, sources of all actions)
+        """
+        actions = list(dict.fromkeys(actions))
+        if len(actions) == 1:
+            action, action_input = actions[0]
+            observation, sources = await self._execute_action(action, action_input, ticker)
+            return f"{action}: {action_input}", observation, sources
+        
+        # Each tool call is cut off at the request deadline and reports its own failures
+        results = await asyncio.gather(*(
+            self._execute_action(action, action_input, ticker)
+            for action, action_input in actions
+        ))
+        
+        observations = []
+        sources: List[SourceInfo] = []
+        for (action, _), (observation, action_sources) in zip(actions, results):
+            observations.append(f"[{action}] {observation}")
+            sources.extend(action_sources)
+        
+        description = "; ".join(f"{action}: {action_input}" for action, action_input in actions)
+        return description, "\n".join(observations), sources
+    
     async def _execute_action(
         self, 
         action: str, 
@@ -299,12 +542,12 @@ class BaseResearchAgent(ABC):
             return "No tools available", []
         
         try:
-            # Execute the tool
-            result = await tool.execute(action_input, ticker)
+            result = await self._run_tool(tool, action_input, ticker)
             
             # Extract observation and sources
             if isinstance(result, dict):
                 observation = result.get("observation", str(result))
+                observation = truncate_to_tokens(observation, self.settings.observation_token_budget)
                 sources_data = result.get("sources", [])
                 
                 # Convert sources to SourceInfo objects
@@ -321,7 +564,7 @@ class BaseResearchAgent(ABC):
                 
                 return observation, sources
             else:
-                return str(result), []
+                return truncate_to_tokens(str(result), self.settings.observation_token_budget), []
                 
         except Exception as e:
             logger.error("Tool execution failed", 
@@ -330,6 +573,64 @@ class BaseResearchAgent(ABC):
                         error=str(e))
             return f"Tool execution failed: {str(e)}", []
     
+    async def _run_tool(self, tool: BaseTool, query: str, ticker: str) -> Any:
+        """Execute a tool within the deadline, or reuse an equivalent call made for this request by any agent."""
+        memo = current_tool_memo()
+        if memo is not None:
+            return await within_deadline(
+                memo.get_or_run(tool.name, query, ticker, lambda: tool.execute(query, ticker)),
+                name=tool.name
+            )
+        return await within_deadline(tool.execute(query, ticker), name=tool.name)
+    
+    async def input_fingerprint(self, ticker: str) -> Optional[str]:
+        """
+        Fingerprint the inputs this agent would research, without any LLM call.
+        
+        The agent's primary tool is probed with a canonical query and the result is
+        reduced by _fingerprint_from_result. Equal fingerprints mean a new ReAct run
+        would see the same data, so a stale result can be renewed instead.
+        
+        Args:
+            ticker: Stock ticker symbol
+            
+        Returns:
+            Fingerprint string, or None if the inputs cannot be fingerprinted
+        """
+        if not self.tools:
+            return None
+        result = await self._run_tool(self.tools[0], self._fingerprint_query(ticker), ticker)
+        if not isinstance(result, dict):
+            return None
+        fingerprint = self._fingerprint_from_result(result)
+        return f"{self.agent_type}:{fingerprint}" if fingerprint else None
+    
+    def _fingerprint_query(self, ticker: str) -> str:
+        """Get the canonical tool query used to fingerprint the agent's inputs."""
+        return f"{ticker} {self.agent_type}"
+    
+    def _fingerprint_from_result(self, result: Dict[str, Any]) -> Optional[str]:
+        """Reduce a probe result to a fingerprint: by default a hash of its source URL set."""
+        urls = sorted({
+            source.get("url", "")
+            for source in result.get("sources", [])
+            if isinstance(source, dict) and source.get("url")
+        })
+        if not urls:
+            return None
+        return hashlib.sha256("\n".join(urls).encode("utf-8")).hexdigest()[:16]
+    
+    async def _safe_input_fingerprint(self, ticker: str) -> Optional[str]:
+        """Get the input fingerprint, or None if probing fails."""
+        try:
+            return await self.input_fingerprint(ticker)
+        except Exception as e:
+            logger.warning("Input fingerprint failed", 
+                          agent_type=self.agent_type,
+                          ticker=ticker,
+                          error=str(e))
+            return None
+    
     def _is_done(self, thought: str) -> bool:
         """Check if the agent thinks it's done."""
         return thought.upper().startswith("DONE:")
@@ -339,10 +640,18 @@ class BaseResearchAgent(ABC):
         if not context["findings"]:
             return "No significant findings."
         
-        findings_text = "\n".join([
-            f"- {finding['observation']}" 
-            for finding in context["findings"]
-        ])
+        if not has_time_for(self.settings.deadline_min_stage_seconds):
+            # No time for an LLM summary: list the most recent observations instead
+            return "\n".join(
+                f"- {finding['observation']}"
+                for finding in context["findings"][-self.settings.prompt_recent_findings:]
+            )
+        
+        findings_text = "\n".join(compact_entries(
+            [f"- {finding['observation']}" for finding in context["findings"]],
+            max_tokens=self.settings.prompt_token_budget,
+            keep_recent=self.settings.prompt_recent_findings
+        ))
         
         summary_prompt = f"""
         Summarize the following research findings for {context['ticker']}:
@@ -360,8 +669,8 @@ class BaseResearchAgent(ABC):
         response = await self.llm.ainvoke(messages)
         return response.content.strip()
     
-    def _format_findings(self, findings: List[Dict[str, Any]]) -> str:
-        """Format findings for display."""
+    def _format_findings(self, findings: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> str:
+        """Format findings for display, compacting older ones to fit max_tokens if given."""
         if not findings:
             return "None yet."
         
@@ -369,8 +678,32 @@ class BaseResearchAgent(ABC):
         for i, finding in enumerate(findings, 1):
             formatted.append(f"{i}. {finding['observation']}")
         
+        if max_tokens is not None:
+            formatted = compact_entries(formatted, max_tokens, keep_recent=self.settings.prompt_recent_findings)
+        
         return "\n".join(formatted)
     
+    def _get_stable_prefix(self) -> str:
+        """
+        Get the part of the reasoning prompt that is identical across tickers and iterations.
+        
+        The prefix holds the system prompt, tool descriptions and response rules, and is
+        built once per agent so that repeated calls send byte-identical text.
+        """
+        if self._stable_prefix is None:
+            self._stable_prefix = "\n\n".join([
+                textwrap.dedent(self._get_system_prompt()).strip(),
+                "Available Tools:\n" + self._format_tools(),
+                TOOL_CALLING_RULES if self.settings.agent_tool_calling_enabled else REACT_RESPONSE_RULES
+            ])
+        return self._stable_prefix
+    
+    def _get_tool_schemas(self) -> List[Dict[str, Any]]:
+        """Get the function declarations of the agent's tools plus finish_research, built once per agent."""
+        if self._tool_schemas is None:
+            self._tool_schemas = [tool.to_function_schema() for tool in self.tools] + [FINISH_TOOL_SCHEMA]
+        return self._tool_schemas
+    
     def _format_tools(self) -> str:
         """Format available tools for display."""
         if not self.tools:
@@ -382,8 +715,8 @@ class BaseResearchAgent(ABC):
         
         return "\n".join(formatted)
     
-    def _format_previous_steps(self, steps: List[AgentStep]) -> str:
-        """Format previous steps for display."""
+    def _format_previous_steps(self, steps: List[AgentStep], max_tokens: Optional[int] = None) -> str:
+        """Format previous steps for display, compacting older ones to fit max_tokens if given."""
         if not steps:
             return "None."
         
@@ -391,4 +724,7 @@ class BaseResearchAgent(ABC):
         for step in steps:
             formatted.append(f"Step {step.step_number}: {step.thought} -> {step.action} -> {step.observation[:100]}...")
         
+        if max_tokens is not None:
+            formatted = compact_entries(formatted, max(max_tokens, 0), keep_recent=self.settings.prompt_recent_findings)
+        
         return "\n".join(formatted)
@@ -1,7 +1,7 @@
 """
 SEC Filings Research Agent - Specializes in analyzing SEC filings and regulatory documents.
 """
-from typing import List
+from typing import Any, Dict, List, Optional
 from langchain_core.language_models import BaseChatModel
 
 from backend.agents.base_agent import BaseResearchAgent
@@ -48,3 +48,14 @@ class FilingsAgent(BaseResearchAgent):
         Always reference specific filing types, dates, and sections.
         Focus on material changes from previous filings.
         """
+    
+    def _fingerprint_from_result(self, result: Dict[str, Any]) -> Optional[str]:
+        """Fingerprint filings by the latest filing document, which changes only when a new filing appears."""
+        filings = [
+            source for source in result.get("sources", [])
+            if isinstance(source, dict) and source.get("url")
+        ]
+        if not filings:
+            return None
+        latest = max(filings, key=lambda source: source.get("published_at") or "")
+        return latest["url"]
@@ -0,0 +1,117 @@
+"""
+Intent Router - Rule-based query classification that picks the research agents a query needs.
+"""
+import re
+from typing import List, Optional, Tuple
+import structlog
+
+from backend.config.settings import Settings, get_settings
+
+logger = structlog.get_logger()
+
+# Focused intents: (name, keyword pattern, agents, iteration budget)
+INTENT_RULES: List[Tuple[str, str, List[str], int]] = [
+    ("technical", r"technical|chart|support|resistance|trend|moving averages?|rsi|macd|momentum|"
+                  r"breakout|price action|price target|52[- ]week", ["price"], 2),
+    ("news", r"news|headlines?|sentiment|press release|announce(?:d|ment|ments)?", ["news"], 2),
+    ("earnings", r"earnings|eps|revenue|guidance|quarterly results|margins?|profit", ["earnings"], 2),
+    ("filings", r"filings?|10-?k|10-?q|8-?k|sec|annual report|proxy", ["filings"], 2),
+    ("insider", r"insiders?|form 4|executives? (?:buying|selling)|share sales", ["insider"], 2),
+    ("patents", r"patents?|intellectual property|r&d|innovation", ["patents"], 2),
+]
+
+# Phrases asking for a full picture; any of them routes the query to the default agents
+GENERAL_PATTERN = (
+    r"should i|buy|sell|hold|invest(?:ment|ing)?|outlook|overview|recommend(?:ation)?|"
+    r"analy[sz]e|analysis|thesis|compare|full|everything|deep dive"
+)
+
+
+def _compile(pattern: str) -> re.Pattern:
+    return re.compile(rf"(?<![\w-])(?:{pattern})(?![\w-])", re.IGNORECASE)
+
+
+class ResearchPlan:
+    """Agents to run for a query and the iteration budget of each."""
+
+    def __init__(self, intent: str, agents: List[str], max_iterations: int):
+        self.intent = intent
+        self.agents = agents
+        self.max_iterations = max_iterations
+
+
+class IntentRouter:
+    """
+    Maps a query to the smallest set of research agents that can answer it.
+
+    Classification is keyword based and runs locally, without an LLM call. A query
+    matching one or more focused intents (e.g. "technical setup", "insider selling")
+    runs only their agents with a reduced iteration budget. General questions, and
+    queries matching no intent, run the configured default agents.
+    """
+
+    def __init__(self, default_agents: List[str]):
+        self.default_agents = default_agents
+        self._rules = [
+            (intent, _compile(pattern), agents, iterations)
+            for intent, pattern, agents, iterations in INTENT_RULES
+        ]
+        self._general = _compile(GENERAL_PATTERN)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "IntentRouter":
+        """Create a router with the default agents from the application settings."""
+        agents = [name.strip() for name in settings.default_research_agents.split(",") if name.strip()]
+        return cls(agents)
+
+    def route(self, query: str, max_iterations: int, available: Optional[List[str]] = None) -> ResearchPlan:
+        """
+        Plan the research of a query.
+
+        Args:
+            query: Natural language query
+            max_iterations: Iteration limit requested by the caller
+            available: Names of the agents that exist (defaults to no restriction)
+
+        Returns:
+            Plan with the agents to run, in the order of `available`, and their iteration budget
+        """
+        default = self._plan("general", self.default_agents, max_iterations, available)
+        if not default.agents and available:
+            default.agents = list(available)
+        if self._general.search(query):
+            return default
+
+        matched = [
+            (intent, agents, iterations)
+            for intent, pattern, agents, iterations in self._rules
+            if pattern.search(query)
+        ]
+        if not matched:
+            return default
+
+        plan = self._plan(
+            "+".join(intent for intent, _, _ in matched),
+            [agent for _, agents, _ in matched for agent in agents],
+            min(max_iterations, max(iterations for _, _, iterations in matched)),
+            available
+        )
+        # A focused intent whose agents do not exist here falls back to the default
+        return plan if plan.agents else default
+
+    @staticmethod
+    def _plan(intent: str, agents: List[str], max_iterations: int, available: Optional[List[str]]) -> ResearchPlan:
+        if available is not None:
+            agents = [name for name in available if name in agents]
+        else:
+            agents = list(dict.fromkeys(agents))
+        return ResearchPlan(intent, agents, max_iterations)
+
+
+# Global intent router instance
+intent_router = IntentRouter.from_settings(get_settings())
+
+
+def get_intent_router() -> IntentRouter:
+    """Get the query intent router."""
+    return intent_router
@@ -2,17 +2,22 @@
 Research Orchestrator - Manages the multi-agent workflow for stock research.
 """
 import asyncio
+import operator
 import re
 import time
+import uuid
+from contextlib import nullcontext
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import Annotated, Awaitable, Callable, List, Dict, Any, Optional, TypedDict, Union
 import structlog
 
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 from langgraph.graph.state import CompiledStateGraph
+from langgraph.types import Send
 
 from backend.app.models import (
+    AnalysisResponse,
     TickerInsight, 
     AgentTrace, 
     AgentStep, 
@@ -21,27 +26,101 @@ from backend.app.models import (
     ConfidenceLevel
 )
 from backend.agents.base_agent import BaseResearchAgent
+from backend.agents.intent_router import get_intent_router
 from backend.agents.news_agent import NewsAgent
 from backend.agents.filings_agent import FilingsAgent
 from backend.agents.earnings_agent import EarningsAgent
 from backend.agents.insider_agent import InsiderAgent
 from backend.agents.patents_agent import PatentsAgent
 from backend.agents.price_agent import PriceAgent
-from backend.agents.synthesis_agent import SynthesisAgent
+from backend.agents.synthesis_agent import FindingsContext, SynthesisAgent
 from backend.config.settings import get_settings
+from backend.services.agent_result_cache import get_agent_result_cache, input_signature
+from backend.services.checkpoint_store import get_checkpoint_store
+from backend.services.event_stream import get_event_bus
+from backend.services.llm_gateway import LLMGateway, create_gateway
+from backend.services.model_router import get_model_router
+from backend.services.tool_memo import tool_memo_scope
+from backend.utils.resilience import (
+    DeadlineExceeded, deadline_scope, has_time_for, remaining_time, within_deadline
+)
 
 logger = structlog.get_logger()
 
+# Result recorded for an agent that was not run (or not finished) because of the request deadline
+SKIPPED_ERROR = "Skipped: request deadline reached"
+
+
+def merge_agent_results(
+    current: Dict[str, Dict[str, Any]],
+    update: Dict[str, Dict[str, Any]]
+) -> Dict[str, Dict[str, Any]]:
+    """Reducer merging ticker -> agent -> result updates written by concurrent graph nodes."""
+    merged = dict(current or {})
+    for ticker, results in (update or {}).items():
+        merged[ticker] = {**merged.get(ticker, {}), **results}
+    return merged
+
+
+class WorkflowState(TypedDict, total=False):
+    """Typed state of the research graph."""
+    query: str
+    max_iterations: int
+    request_id: str
+    run_id: str
+    synthesis_reserve_seconds: float
+    tickers: List[str]
+    agents: List[str]
+    intent: str
+    agent_results: Annotated[Dict[str, Dict[str, Any]], merge_agent_results]
+    insights: Annotated[List[TickerInsight], operator.add]
+    warnings: Annotated[List[str], operator.add]
+    node_timings: Annotated[List[Dict[str, Any]], operator.add]
+
+
+class TickerState(TypedDict, total=False):
+    """Typed state of the per-ticker research subgraph."""
+    ticker: str
+    query: str
+    max_iterations: int
+    request_id: str
+    run_id: str
+    synthesis_reserve_seconds: float
+    agents: List[str]
+    intent: str
+    agent_results: Annotated[Dict[str, Dict[str, Any]], merge_agent_results]
+    insights: Annotated[List[TickerInsight], operator.add]
+    warnings: Annotated[List[str], operator.add]
+    node_timings: Annotated[List[Dict[str, Any]], operator.add]
+
+
+class AgentTask(TypedDict):
+    """Input of one research agent run, sent to the run_agent node."""
+    ticker: str
+    agent_name: str
+    query: str
+    max_iterations: int
+    request_id: str
+    run_id: str
+    synthesis_reserve_seconds: float
+    intent: str
+
 
 class ResearchState:
-    """State object for the research workflow."""
+    """Results of a research run, accumulated from graph updates as they stream in."""
     
     def __init__(self):
         self.query: str = ""
         self.tickers: List[str] = []
+        # Research agents chosen for the query
+        self.agents: List[str] = []
         self.max_iterations: int = 3
         self.timeout_seconds: int = 30
         self.request_id: str = ""
+        # Identifies this run's in-memory state (request IDs repeat across retries)
+        self.run_id: str = uuid.uuid4().hex
+        # Seconds of the deadline held back from research for synthesis
+        self.synthesis_reserve_seconds: float = 0.0
         
         # Results storage
         self.agent_results: Dict[str, Dict[str, Any]] = {}
@@ -52,6 +131,21 @@ class ResearchState:
         self.current_step: str = ""
         self.errors: List[str] = []
         self.warnings: List[str] = []
+        self.node_timings: List[Dict[str, Any]] = []
+    
+    def apply_update(self, update: Dict[str, Any]) -> None:
+        """Fold a node's state update into the accumulated results."""
+        if "tickers" in update:
+            self.tickers = update["tickers"]
+        if "agents" in update:
+            self.agents = update["agents"]
+        if "max_iterations" in update:
+            self.max_iterations = update["max_iterations"]
+        if "agent_results" in update:
+            self.agent_results = merge_agent_results(self.agent_results, update["agent_results"])
+        self.insights.extend(update.get("insights", []))
+        self.warnings.extend(update.get("warnings", []))
+        self.node_timings.extend(update.get("node_timings", []))
 
 
 class ResearchOrchestrator:
@@ -61,11 +155,16 @@ class ResearchOrchestrator:
     
     def __init__(self):
         self.settings = get_settings()
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=self.settings.gemini_api_key,
-            temperature=0.1
-        )
+        self.model_router = get_model_router()
+        
+        # Research agents run on the fast tier; synthesis escalates to the strong tier when unsure
+        self.llm = self._create_llm(self.model_router.tier_for("reasoning"))
+        synthesis_tier = self.model_router.tier_for("synthesis")
+        self.synthesis_llm = self._create_llm(synthesis_tier)
+        escalation_tier = self.model_router.escalation_tier(synthesis_tier)
+        self.escalation_llm = None
+        if self.settings.synthesis_escalation_enabled and escalation_tier:
+            self.escalation_llm = self._create_llm(escalation_tier)
         
         # Initialize agents
         self.agents = {
@@ -77,11 +176,52 @@ class ResearchOrchestrator:
             "price": PriceAgent(self.llm)
         }
         
-        self.synthesis_agent = SynthesisAgent(self.llm)
+        self.synthesis_agent = SynthesisAgent(
+            self.synthesis_llm,
+            escalation_llm=self.escalation_llm,
+            tier=synthesis_tier
+        )
+        # Synthesizes partial findings when the deadline cut research short
+        self.fast_synthesis_agent = SynthesisAgent(self.llm)
+        # Picks the agents each query needs (all of them when routing is disabled)
+        self.intent_router = get_intent_router() if self.settings.intent_routing_enabled else None
+        
+        # Concurrency slots shared by all agent runs of this orchestrator (created per event loop)
+        self._agent_slots: Optional[asyncio.Semaphore] = None
+        self._agent_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.events = get_event_bus()
+        # Finished agent results and insights, so a retry with the same request ID resumes
+        self.checkpoints = get_checkpoint_store() if self.settings.checkpoint_enabled else None
+        # Insights of earlier requests, reused when none of their agent inputs changed
+        self.result_cache = get_agent_result_cache() if self.settings.agent_cache_enabled else None
+        # Synthesis input of each running analysis, built as its agent results complete
+        self._synthesis_contexts: Dict[str, Dict[str, FindingsContext]] = {}
         
         # Build the workflow graph
+        self.ticker_workflow = self._build_ticker_workflow()
         self.workflow = self._build_workflow()
     
+    def _create_llm(self, tier: str) -> LLMGateway:
+        """Create the gateway-wrapped chat model for a model tier."""
+        model_name = self.model_router.model_for(tier)
+        chat_model = ChatGoogleGenerativeAI(
+            model=model_name,
+            google_api_key=self.settings.gemini_api_key,
+            temperature=0.1
+        )
+        # Calls go through the gateway, which caches stable prompt prefixes and records stats
+        return create_gateway(chat_model, model_name, tier=tier)
+    
+    async def aclose(self) -> None:
+        """Close the HTTP sessions of the agents' tools and release the LLM gateways."""
+        for agent in self.agents.values():
+            for tool in agent.tools:
+                if hasattr(tool, "close"):
+                    await tool.close()
+        for llm in (self.llm, self.synthesis_llm, self.escalation_llm):
+            if llm is not None:
+                await llm.aclose()
+    
     def _extract_tickers(self, query: str) -> List[str]:
         """Extract stock tickers from the query."""
         # Simple regex to find ticker symbols (3-5 uppercase letters)
@@ -104,122 +244,166 @@ class ResearchOrchestrator:
         return unique_tickers
     
     def _build_workflow(self) -> CompiledStateGraph:
-        """Build the LangGraph workflow for research orchestration."""
-        
-        def parse_query(state: ResearchState) -> ResearchState:
-            """Parse the input query and extract tickers."""
-            logger.info("Parsing query", query=state.query)
-            state.tickers = self._extract_tickers(state.query)
-            state.current_step = f"Extracted tickers: {', '.join(state.tickers)}"
-            
-            if not state.tickers:
-                state.errors.append("No valid stock tickers found in query")
-                logger.warning("No tickers found", query=state.query)
-            
-            return state
-        
-        def run_parallel_research(state: ResearchState) -> ResearchState:
-            """Run parallel research agents for each ticker."""
-            logger.info("Starting parallel research", 
-                       tickers=state.tickers, 
-                       agent_count=len(self.agents))
-            
-            state.current_step = "Running parallel research agents"
-            
-            # Create tasks for each ticker-agent combination
-            async def run_agent_for_ticker(agent_name: str, agent: BaseResearchAgent, ticker: str):
-                try:
-                    logger.info("Running agent", agent=agent_name, ticker=ticker)
-                    result = await agent.research(
-                        ticker=ticker,
-                        query=state.query,
-                        max_iterations=state.max_iterations
-                    )
-                    return agent_name, ticker, result
-                except Exception as e:
-                    logger.error("Agent failed", agent=agent_name, ticker=ticker, error=str(e))
-                    return agent_name, ticker, {"error": str(e)}
-            
-            # Run all agent-ticker combinations in parallel
-            async def run_all_research():
-                tasks = []
-                for ticker in state.tickers:
-                    for agent_name, agent in self.agents.items():
-                        task = run_agent_for_ticker(agent_name, agent, ticker)
-                        tasks.append(task)
-                
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                # Organize results by ticker
-                for result in results:
-                    if isinstance(result, Exception):
-                        state.errors.append(f"Research task failed: {str(result)}")
-                        continue
-                    
-                    agent_name, ticker, agent_result = result
-                    
-                    if ticker not in state.agent_results:
-                        state.agent_results[ticker] = {}
-                    
-                    state.agent_results[ticker][agent_name] = agent_result
-            
-            # Run the async research
-            try:
-                asyncio.run(run_all_research())
-            except Exception as e:
-                state.errors.append(f"Parallel research failed: {str(e)}")
-                logger.error("Parallel research failed", error=str(e))
-            
-            return state
+        """
+        Build the research graph.
         
-        def synthesize_insights(state: ResearchState) -> ResearchState:
-            """Synthesize research results into actionable insights."""
-            logger.info("Synthesizing insights", ticker_count=len(state.tickers))
-            state.current_step = "Synthesizing insights"
-            
-            try:
-                # Process each ticker
-                for ticker in state.tickers:
-                    if ticker not in state.agent_results:
-                        state.warnings.append(f"No research results for ticker {ticker}")
-                        continue
-                    
-                    # Get agent results for this ticker
-                    ticker_results = state.agent_results[ticker]
-                    
-                    # Synthesize using the synthesis agent
-                    insight = asyncio.run(self.synthesis_agent.synthesize(
-                        ticker=ticker,
-                        agent_results=ticker_results,
-                        query=state.query
-                    ))
-                    
-                    state.insights.append(insight)
-                
-            except Exception as e:
-                state.errors.append(f"Synthesis failed: {str(e)}")
-                logger.error("Synthesis failed", error=str(e))
-            
-            return state
+        parse_query fans out one research_ticker node per ticker; each runs the
+        per-ticker subgraph, so a ticker is synthesized as soon as its own agents finish.
+        """
+        workflow = StateGraph(WorkflowState)
+        workflow.add_node("parse_query", self._timed("parse_query", self._parse_query))
+        workflow.add_node("research_ticker", self._research_ticker)
         
-        # Build the graph
-        workflow = StateGraph(ResearchState)
+        workflow.add_edge(START, "parse_query")
+        workflow.add_conditional_edges("parse_query", self._fan_out_tickers, ["research_ticker"])
+        workflow.add_edge("research_ticker", END)
         
-        # Add nodes
-        workflow.add_node("parse_query", parse_query)
-        workflow.add_node("run_research", run_parallel_research)
-        workflow.add_node("synthesize", synthesize_insights)
+        return workflow.compile()
+    
+    def _build_ticker_workflow(self) -> CompiledStateGraph:
+        """Build the per-ticker subgraph: checkpoint restore, every remaining agent in parallel, then synthesis."""
+        workflow = StateGraph(TickerState)
+        workflow.add_node("load_checkpoint", self._load_checkpoint)
+        workflow.add_node("run_agent", self._timed("run_agent", self._run_agent))
+        workflow.add_node("synthesize", self._timed("synthesize", self._synthesize))
         
-        # Add edges
-        workflow.add_edge("parse_query", "run_research")
-        workflow.add_edge("run_research", "synthesize")
+        workflow.add_edge(START, "load_checkpoint")
+        workflow.add_conditional_edges("load_checkpoint", self._fan_out_agents, ["run_agent", "synthesize", END])
+        workflow.add_edge("run_agent", "synthesize")
         workflow.add_edge("synthesize", END)
         
-        # Set entry point
-        workflow.set_entry_point("parse_query")
-        
         return workflow.compile()
     
+    def _timed(
+        self,
+        node: str,
+        func: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+    ) -> Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]:
+        """Wrap a node so its latency is added to the state and published as a progress event."""
+        async def run(state: Dict[str, Any]) -> Dict[str, Any]:
+            start_time = time.time()
+            update = await func(state)
+            timing = {
+                "node": node,
+                "ticker": state.get("ticker"),
+                "agent": state.get("agent_name"),
+                "latency_ms": (time.time() - start_time) * 1000
+            }
+            self.events.publish(state.get("request_id", ""), "node_completed", timing)
+            return {**update, "node_timings": [timing]}
+        return run
+    
+    def _fan_out_tickers(self, state: WorkflowState) -> List[Send]:
+        """Send each ticker to its own research subgraph."""
+        return [
+            Send("research_ticker", {
+                "ticker": ticker,
+                "query": state["query"],
+                "max_iterations": state["max_iterations"],
+                "request_id": state.get("request_id", ""),
+                "run_id": state.get("run_id", ""),
+                "synthesis_reserve_seconds": state.get("synthesis_reserve_seconds", 0.0),
+                "agents": state["agents"],
+                "intent": state.get("intent", "general"),
+            })
+            for ticker in state["tickers"]
+        ]
+    
+    def _fan_out_agents(self, state: TickerState) -> Union[List[Send], str]:
+        """Send each planned research agent of a ticker without a checkpointed result to its own run_agent node."""
+        if state.get("insights"):
+            return END
+        done = state.get("agent_results", {}).get(state["ticker"], {})
+        if all(agent_name in done for agent_name in state["agents"]):
+            return "synthesize"
+        return [
+            Send("run_agent", {
+                "ticker": state["ticker"],
+                "agent_name": agent_name,
+                "query": state["query"],
+                "max_iterations": state["max_iterations"],
+                "request_id": state.get("request_id", ""),
+                "run_id": state.get("run_id", ""),
+                "synthesis_reserve_seconds": state.get("synthesis_reserve_seconds", 0.0),
+                "intent": state.get("intent", "general"),
+            })
+            for agent_name in state["agents"]
+            if agent_name not in done
+        ]
+    
+    async def _parse_query(self, state: WorkflowState) -> Dict[str, Any]:
+        """Parse the input query, extract tickers and plan which agents to run."""
+        logger.info("Parsing query", query=state["query"])
+        tickers = self._extract_tickers(state["query"])
+        if not tickers:
+            raise Exception("No valid stock tickers found in query")
+        
+        if not self.intent_router:
+            return {"tickers": tickers, "agents": list(self.agents), "intent": "general"}
+        plan = self.intent_router.route(state["query"], state["max_iterations"], available=list(self.agents))
+        logger.info("Planned research",
+                    intent=plan.intent,
+                    agents=plan.agents,
+                    max_iterations=plan.max_iterations)
+        return {
+            "tickers": tickers,
+            "agents": plan.agents,
+            "max_iterations": plan.max_iterations,
+            "intent": plan.intent
+        }
+    
+    async def _research_ticker(self, state: TickerState) -> Dict[str, Any]:
+        """Run the research subgraph of one ticker and pass its results up."""
+        result = await self.ticker_workflow.ainvoke(state)
+        return {
+            "agent_results": result.get("agent_results", {}),
+            "insights": result.get("insights", []),
+            "warnings": result.get("warnings", []),
+            "node_timings": result.get("node_timings", []),
+        }
+    
+    async def _load_checkpoint(self, state: TickerState) -> Dict[str, Any]:
+        """Restore a ticker's finished insight, or its finished agent results, from an earlier attempt."""
+        ticker = state["ticker"]
+        request_id = state.get("request_id", "")
+        if not (self.checkpoints and request_id):
+            return {}
+        
+        insight = await asyncio.to_thread(self.checkpoints.load_insight, request_id, ticker)
+        checkpointed = await asyncio.to_thread(self.checkpoints.load_agent_results, request_id, ticker)
+        if insight:
+            logger.info("Resumed ticker from checkpoint", ticker=ticker, request_id=request_id)
+            return {"agent_results": {ticker: checkpointed}, "insights": [insight]}
+        self._collect_results(state.get("run_id", ""), ticker, checkpointed)
+        if checkpointed:
+            logger.info("Resuming agents from checkpoint",
+                        ticker=ticker,
+                        request_id=request_id,
+                        agents=sorted(checkpointed))
+            return {"agent_results": {ticker: checkpointed}}
+        return {}
+    
+    def _findings_context(self, run_id: str, ticker: str) -> FindingsContext:
+        """Get the synthesis input being built for a ticker of a run."""
+        contexts = self._synthesis_contexts.setdefault(run_id, {})
+        if ticker not in contexts:
+            contexts[ticker] = self.synthesis_agent.new_context()
+        return contexts[ticker]
+    
+    def _collect_results(self, run_id: str, ticker: str, agent_results: Dict[str, Dict[str, Any]]) -> None:
+        """Add agent results to a ticker's synthesis input as soon as they complete."""
+        context = self._findings_context(run_id, ticker)
+        for agent_name, result in agent_results.items():
+            context.add(agent_name, result)
+    
+    def _agent_semaphore(self) -> asyncio.Semaphore:
+        """Get the semaphore bounding concurrent agent runs on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._agent_slots is None or self._agent_slots_loop is not loop:
+            self._agent_slots = asyncio.Semaphore(self.settings.max_concurrent_agents)
+            self._agent_slots_loop = loop
+        return self._agent_slots
+    
     async def analyze(
         self, 
         query: str, 
@@ -233,13 +417,42 @@ class ResearchOrchestrator:
         Args:
             query: Natural language query with stock tickers
             max_iterations: Maximum iterations per agent
-            timeout_seconds: Timeout for the entire analysis
+            timeout_seconds: Deadline for the entire analysis, propagated to every agent,
+                tool and LLM call
+            request_id: Unique request identifier
+            
+        Returns:
+            List of ticker insights (partial if the deadline cut the analysis short)
+        """
+        response = await self.analyze_with_report(query, max_iterations, timeout_seconds, request_id)
+        return response.insights
+    
+    async def analyze_with_report(
+        self, 
+        query: str, 
+        max_iterations: int = 3, 
+        timeout_seconds: int = 30,
+        request_id: str = ""
+    ) -> AnalysisResponse:
+        """
+        Run the complete stock analysis workflow, completing it best-effort on timeout.
+        
+        Research gets the request budget minus a reserve for synthesis; agents still
+        running when it is spent are cancelled and the ticker is synthesized from the
+        findings collected so far by the fast model. If the whole budget runs out,
+        every ticker without an insight gets a deterministic summary of its findings.
+        
+        Args:
+            query: Natural language query with stock tickers
+            max_iterations: Maximum iterations per agent
+            timeout_seconds: Deadline for the entire analysis
             request_id: Unique request identifier
             
         Returns:
-            List of ticker insights
+            AnalysisResponse whose warnings list skipped agents and partial tickers
         """
         start_time = time.time()
+        started_at = datetime.now()
         
         logger.info("Starting stock analysis", 
                    query=query, 
@@ -247,87 +460,210 @@ class ResearchOrchestrator:
                    timeout_seconds=timeout_seconds,
                    request_id=request_id)
         
-        # Initialize state
+        # Accumulates streamed graph updates, so results survive a timeout
         state = ResearchState()
         state.query = query
         state.max_iterations = max_iterations
         state.timeout_seconds = timeout_seconds
         state.request_id = request_id
         state.start_time = start_time
+        state.synthesis_reserve_seconds = min(self.settings.partial_synthesis_reserve_seconds, timeout_seconds / 2)
         
         try:
-            # Run the workflow with timeout
-            result = await asyncio.wait_for(
-                self._run_workflow_async(state),
-                timeout=timeout_seconds
-            )
+            # Run the workflow within the request deadline; the timeout is only a backstop.
+            # Agents share one tool memo, so overlapping searches are made once per request.
+            memo_scope = tool_memo_scope() if self.settings.tool_memo_enabled else nullcontext()
+            with deadline_scope(timeout_seconds), memo_scope as memo:
+                try:
+                    await asyncio.wait_for(self._run_workflow(state), timeout=timeout_seconds)
+                except (asyncio.TimeoutError, DeadlineExceeded):
+                    logger.warning("Analysis budget exhausted, completing with partial results",
+                                   request_id=request_id,
+                                   timeout_seconds=timeout_seconds)
+                    await self._complete_partial(state)
             
             execution_time = time.time() - start_time
             logger.info("Analysis completed", 
                        request_id=request_id,
                        execution_time=execution_time,
-                       insights_count=len(result.insights))
-            
-            return result.insights
+                       insights_count=len(state.insights),
+                       warnings=len(state.warnings),
+                       tool_memo=memo.summary() if memo else None)
             
-        except asyncio.TimeoutError:
-            logger.error("Analysis timed out", 
-                        request_id=request_id,
-                        timeout_seconds=timeout_seconds)
-            raise Exception(f"Analysis timed out after {timeout_seconds} seconds")
+            # Report tickers in query order, whichever path produced their insight
+            order = {ticker: index for index, ticker in enumerate(state.tickers)}
+            insights = sorted(state.insights, key=lambda insight: order.get(insight.ticker, len(order)))
+            return AnalysisResponse(
+                request_id=request_id,
+                query=query,
+                insights=insights,
+                total_latency_ms=execution_time * 1000,
+                tickers_analyzed=[insight.ticker for insight in insights],
+                agents_used=sorted({
+                    agent_name
+                    for results in state.agent_results.values()
+                    for agent_name, result in results.items()
+                    if "trace" in result
+                }),
+                warnings=state.warnings,
+                errors=state.errors,
+                started_at=started_at,
+                completed_at=datetime.now()
+            )
         
         except Exception as e:
             logger.error("Analysis failed", 
                         request_id=request_id,
                         error=str(e))
             raise
+        finally:
+            self._synthesis_contexts.pop(state.run_id, None)
     
-    async def _run_workflow_async(self, state: ResearchState) -> ResearchState:
-        """Run the workflow asynchronously."""
-        # Since LangGraph doesn't natively support async, we'll simulate it
-        # In a real implementation, you'd use LangGraph's async capabilities
+    async def _run_workflow(self, state: ResearchState) -> ResearchState:
+        """
+        Run the research graph, folding its node updates into the state as they arrive.
         
-        # For now, we'll run a simplified version
-        try:
-            # Parse query
-            state.tickers = self._extract_tickers(state.query)
-            
-            if not state.tickers:
-                raise Exception("No valid stock tickers found in query")
+        Updates from inside the per-ticker subgraphs are streamed as well, so agent
+        results are kept even if the run is cancelled before their ticker finishes.
+        """
+        inputs: WorkflowState = {
+            "query": state.query,
+            "max_iterations": state.max_iterations,
+            "request_id": state.request_id,
+            "run_id": state.run_id,
+            "synthesis_reserve_seconds": state.synthesis_reserve_seconds,
+        }
+        async for namespace, updates in self.workflow.astream(inputs, stream_mode="updates", subgraphs=True):
+            for node, update in updates.items():
+                # research_ticker repeats the updates already streamed from its subgraph
+                if node == "research_ticker" and not namespace:
+                    continue
+                if update:
+                    state.apply_update(update)
+        return state
+    
+    async def _run_agent(self, task: AgentTask) -> Dict[str, Any]:
+        """Run one research agent for a ticker once a concurrency slot is free."""
+        ticker = task["ticker"]
+        agent_name = task["agent_name"]
+        reserve = task["synthesis_reserve_seconds"]
+        agent = self.agents[agent_name]
+        
+        async with self._agent_semaphore():
+            # Leave the synthesis reserve untouched
+            if not has_time_for(reserve + self.settings.deadline_min_stage_seconds):
+                logger.warning("Skipping agent, request deadline near",
+                               agent=agent_name,
+                               ticker=ticker)
+                self._collect_results(task["run_id"], ticker, {agent_name: {"error": SKIPPED_ERROR}})
+                return {
+                    "agent_results": {ticker: {agent_name: {"error": SKIPPED_ERROR}}},
+                    "warnings": [f"{ticker}: {agent_name} agent skipped, request deadline reached"]
+                }
             
-            # Run research for each ticker
-            for ticker in state.tickers:
-                ticker_results = {}
-                
-                # Run each agent for this ticker
-                for agent_name, agent in self.agents.items():
-                    try:
-                        result = await agent.research(
+            try:
+                remaining = remaining_time()
+                research_scope = deadline_scope(remaining - reserve) if remaining is not None else nullcontext()
+                with research_scope:
+                    result = await within_deadline(
+                        agent.research(
                             ticker=ticker,
-                            query=state.query,
-                            max_iterations=state.max_iterations
-                        )
-                        ticker_results[agent_name] = result
-                    except Exception as e:
-                        logger.error("Agent failed", 
-                                   agent=agent_name, 
-                                   ticker=ticker, 
-                                   error=str(e))
-                        ticker_results[agent_name] = {"error": str(e)}
-                
-                state.agent_results[ticker] = ticker_results
-                
-                # Synthesize insights for this ticker
-                insight = await self.synthesis_agent.synthesize(
-                    ticker=ticker,
-                    agent_results=ticker_results,
-                    query=state.query
-                )
-                
-                state.insights.append(insight)
+                            query=task["query"],
+                            max_iterations=task["max_iterations"],
+                            intent=task["intent"]
+                        ),
+                        name=f"{agent_name} research"
+                    )
+            except DeadlineExceeded:
+                logger.warning("Agent cut short by request deadline", agent=agent_name, ticker=ticker)
+                self._collect_results(task["run_id"], ticker, {agent_name: {"error": SKIPPED_ERROR}})
+                return {
+                    "agent_results": {ticker: {agent_name: {"error": SKIPPED_ERROR}}},
+                    "warnings": [f"{ticker}: {agent_name} agent did not finish before the deadline"]
+                }
+            except Exception as e:
+                logger.error("Agent failed", 
+                           agent=agent_name, 
+                           ticker=ticker, 
+                           error=str(e))
+                result = {"error": str(e)}
+        
+        # Format this agent's findings for synthesis now, while other agents are still running
+        self._collect_results(task["run_id"], ticker, {agent_name: result})
+        if self.checkpoints:
+            await asyncio.to_thread(self.checkpoints.save_agent_result, task["request_id"], ticker, agent_name, result)
+        return {"agent_results": {ticker: {agent_name: result}}}
+    
+    async def _synthesize(self, state: TickerState) -> Dict[str, Any]:
+        """Synthesize a ticker's insight; research cut short by the deadline gets the fast model."""
+        ticker = state["ticker"]
+        ticker_results = state.get("agent_results", {}).get(ticker, {})
+        partial = any(result.get("error") == SKIPPED_ERROR for result in ticker_results.values())
+        complete = not any("error" in result for result in ticker_results.values())
+        
+        # Re-synthesize only if some agent input changed since the last insight for this ticker
+        signature = input_signature(ticker_results)
+        intent = state.get("intent", "general")
+        if self.result_cache and complete:
+            previous = self.result_cache.get_insight(ticker, intent, signature)
+            if previous:
+                logger.info("Agent inputs unchanged, reusing insight", ticker=ticker, intent=intent)
+                return {"insights": [previous]}
+        
+        synthesis_agent = self.fast_synthesis_agent if partial else self.synthesis_agent
+        try:
+            insight = await synthesis_agent.synthesize(
+                ticker=ticker,
+                agent_results=ticker_results,
+                query=state["query"],
+                raise_on_error=True,
+                context=self._findings_context(state.get("run_id", ""), ticker)
+            )
+        except Exception as e:
+            insight = synthesis_agent.fallback_insight(ticker, ticker_results, reason=str(e))
+            return {"insights": [insight]}
+        
+        # Only an insight synthesized from complete research is final; others are redone on retry
+        if complete:
+            if self.checkpoints:
+                await asyncio.to_thread(self.checkpoints.save_insight, state.get("request_id", ""), insight)
+            if self.result_cache:
+                self.result_cache.put_insight(ticker, intent, signature, insight, agent_types=list(ticker_results))
+        return {"insights": [insight]}
+    
+    async def _complete_partial(self, state: ResearchState) -> None:
+        """
+        Produce insights for every ticker the workflow did not finish, from the results collected so far.
+        
+        Args:
+            state: Workflow state at the time the budget ran out
+        """
+        finished = {insight.ticker for insight in state.insights}
+        for ticker in state.tickers:
+            if ticker in finished:
+                continue
             
-            return state
+            ticker_results = state.agent_results.get(ticker, {})
+            for agent_name in state.agents or self.agents:
+                if agent_name not in ticker_results:
+                    ticker_results[agent_name] = {"error": SKIPPED_ERROR}
+                    state.warnings.append(f"{ticker}: {agent_name} agent did not finish before the deadline")
             
-        except Exception as e:
-            logger.error("Workflow execution failed", error=str(e))
-            raise
+            reason = "request deadline reached before synthesis"
+            insight = None
+            if has_time_for(self.settings.deadline_min_stage_seconds):
+                try:
+                    insight = await within_deadline(
+                        self.fast_synthesis_agent.synthesize(
+                            ticker, ticker_results, state.query,
+                            context=self._findings_context(state.run_id, ticker)
+                        ),
+                        name="partial synthesis"
+                    )
+                except DeadlineExceeded:
+                    pass
+            if insight is None:
+                insight = self.synthesis_agent.fallback_insight(ticker, ticker_results, reason)
+            
+            state.warnings.append(f"{ticker}: insight synthesized from partial research")
+            state.insights.append(insight)
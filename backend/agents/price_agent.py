@@ -1,7 +1,8 @@
 """
 Price & Technical Analysis Agent - Specializes in analyzing price movements and technical factors.
 """
-from typing import List
+import math
+from typing import Any, Dict, List, Optional
 from langchain_core.language_models import BaseChatModel
 
 from backend.agents.base_agent import BaseResearchAgent
@@ -57,3 +58,14 @@ class PriceAgent(BaseResearchAgent):
         Always consider the broader market context and sector rotation.
         Focus on actionable technical levels for the 3-6 month timeframe.
         """
+    
+    def _fingerprint_from_result(self, result: Dict[str, Any]) -> Optional[str]:
+        """Fingerprint price data by a logarithmic price bucket, so small moves keep the research."""
+        try:
+            price = result["data"]["chart"]["chart"]["result"][0]["meta"]["regularMarketPrice"]
+        except (KeyError, IndexError, TypeError):
+            return None
+        if not isinstance(price, (int, float)) or price <= 0:
+            return None
+        step = self.settings.fingerprint_price_bucket_pct / 100
+        return f"price-bucket:{math.floor(math.log(price) / math.log1p(step))}"
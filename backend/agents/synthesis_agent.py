@@ -3,7 +3,7 @@ Synthesis Agent - Combines research findings into actionable insights and invest
 """
 import asyncio
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import structlog
 
 from langchain_core.language_models import BaseChatModel
@@ -16,32 +16,137 @@ from backend.app.models import (
     StanceType,
     ConfidenceLevel
 )
+from backend.config.settings import get_settings
+from backend.services.model_router import ModelRouter, get_model_router
+from backend.utils.resilience import has_time_for
+from backend.utils.token_budget import compact_entries
 
 logger = structlog.get_logger()
 
 
+class FindingsContext:
+    """
+    Synthesis input of one ticker, built incrementally as agent results arrive.
+    
+    Each agent's findings are formatted, and its sources and traces collected, when
+    its result is added, in completion order. Once the last agent returns, only the
+    per-agent budget compaction is left before the synthesis call can be made.
+    """
+    
+    def __init__(self, findings_token_budget: int, keep_recent: int):
+        self.findings_token_budget = findings_token_budget
+        self.keep_recent = keep_recent
+        self.findings: List[Dict[str, Any]] = []
+        self.sources: List[SourceInfo] = []
+        self.traces: List[AgentTrace] = []
+        self._entries: Dict[str, List[str]] = {}
+        self._seen_urls = set()
+    
+    def __contains__(self, agent_name: str) -> bool:
+        return agent_name in self._entries
+    
+    def add(self, agent_name: str, result: Dict[str, Any]) -> None:
+        """Add an agent's result (adding the same agent again has no effect)."""
+        if agent_name in self._entries:
+            return
+        
+        # Agents that failed part-way still contribute the findings they gathered
+        entries = []
+        for finding in result.get("findings", []):
+            self.findings.append({**finding, "agent": agent_name})
+            entries.append(f"[{agent_name.upper()}] {finding.get('observation', '')}")
+        self._entries[agent_name] = entries
+        
+        for source_data in result.get("sources", []):
+            if isinstance(source_data, SourceInfo):
+                source_data = source_data.model_dump()
+            if isinstance(source_data, dict):
+                url = source_data.get("url", "")
+                if url and url not in self._seen_urls:
+                    self._seen_urls.add(url)
+                    self.sources.append(SourceInfo(
+                        url=url,
+                        title=source_data.get("title"),
+                        published_at=source_data.get("published_at"),
+                        snippet=source_data.get("snippet")
+                    ))
+        
+        trace = result.get("trace")
+        if trace and isinstance(trace, AgentTrace):
+            self.traces.append(trace)
+    
+    def render(self) -> str:
+        """
+        Format the findings for the synthesis prompt.
+        
+        Each agent gets an equal share of the findings budget, so one verbose agent
+        cannot crowd out the others; within a share older findings are compacted.
+        """
+        by_agent = [entries for entries in self._entries.values() if entries]
+        if not by_agent:
+            return "No significant findings available."
+        
+        agent_budget = self.findings_token_budget // len(by_agent)
+        formatted = []
+        for entries in by_agent:
+            formatted.extend(compact_entries(entries, max_tokens=agent_budget, keep_recent=self.keep_recent))
+        return "\n".join(formatted)
+
+
 class SynthesisAgent:
     """
     Agent responsible for synthesizing research findings from all agents
     into actionable insights and investment recommendations.
     """
     
-    def __init__(self, llm: BaseChatModel):
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        escalation_llm: Optional[BaseChatModel] = None,
+        tier: Optional[str] = None,
+        router: Optional[ModelRouter] = None
+    ):
+        """
+        Args:
+            llm: Chat model for the first synthesis pass
+            escalation_llm: Stronger chat model for redoing unusable or unsure passes
+            tier: Model tier of `llm`, under which escalations are recorded
+            router: Model router recording escalations (the global one by default)
+        """
         self.llm = llm
+        self.escalation_llm = escalation_llm
+        self.tier = tier
+        self.router = router or get_model_router()
+        self.settings = get_settings()
+    
+    def new_context(self) -> FindingsContext:
+        """Create an empty findings context for incremental synthesis input."""
+        return FindingsContext(
+            self.settings.synthesis_findings_token_budget,
+            self.settings.prompt_recent_findings
+        )
     
     async def synthesize(
         self, 
         ticker: str, 
         agent_results: Dict[str, Dict[str, Any]], 
-        query: str
+        query: str,
+        raise_on_error: bool = False,
+        context: Optional[FindingsContext] = None
     ) -> TickerInsight:
         """
         Synthesize research findings into a comprehensive ticker insight.
         
+        Analysis and recommendation come from a single LLM call. When the caller has
+        been feeding agent results into a findings context as they completed, the
+        prompt is ready and that call is made straight away.
+        
         Args:
             ticker: Stock ticker symbol
             agent_results: Results from all research agents
             query: Original user query
+            raise_on_error: Raise synthesis errors instead of returning a fallback insight
+            context: Findings context built so far (results it lacks are added)
             
         Returns:
             TickerInsight with comprehensive analysis and recommendation
@@ -49,13 +154,28 @@ class SynthesisAgent:
         logger.info("Synthesizing insights", ticker=ticker)
         
         try:
-            # Extract all findings and sources
-            all_findings = self._extract_findings(agent_results)
-            all_sources = self._extract_sources(agent_results)
-            agent_traces = self._extract_traces(agent_results)
+            context = context or self.new_context()
+            for agent_name, result in agent_results.items():
+                context.add(agent_name, result)
+            all_findings = context.findings
+            all_sources = context.sources
+            agent_traces = context.traces
+            findings_text = context.render()
             
-            # Generate comprehensive analysis
-            analysis = await self._generate_analysis(ticker, all_findings, query)
+            # Generate comprehensive analysis and investment recommendation
+            analysis, recommendation = await self._generate_insight(ticker, findings_text, query)
+            
+            # Rerun on the stronger model only when the first pass is unusable or unsure,
+            # and only if the request deadline leaves time for it
+            escalation_reason = self._escalation_reason(analysis, recommendation)
+            if (escalation_reason and self.escalation_llm is not None
+                    and has_time_for(self.settings.deadline_min_stage_seconds)):
+                if self.tier:
+                    self.router.record_escalation(self.tier, reason=escalation_reason)
+                logger.info("Escalating synthesis", ticker=ticker, reason=escalation_reason)
+                analysis, recommendation = await self._generate_insight(
+                    ticker, findings_text, query, llm=self.escalation_llm
+                )
             
             # Extract structured insights
             summary = analysis.get("summary", "")
@@ -63,9 +183,6 @@ class SynthesisAgent:
             risks = analysis.get("risks", [])
             catalysts = analysis.get("catalysts", [])
             
-            # Generate investment recommendation
-            recommendation = await self._generate_recommendation(ticker, analysis, all_findings)
-            
             stance = self._parse_stance(recommendation.get("stance", "hold"))
             confidence = self._parse_confidence(recommendation.get("confidence", "medium"))
             rationale = recommendation.get("rationale", "")
@@ -98,162 +215,119 @@ class SynthesisAgent:
             
         except Exception as e:
             logger.error("Synthesis failed", ticker=ticker, error=str(e))
+            if raise_on_error:
+                raise
             
-            # Return a basic insight with error information
-            return TickerInsight(
-                ticker=ticker,
-                summary=f"Analysis failed: {str(e)}",
-                key_drivers=[],
-                risks=[f"Analysis error: {str(e)}"],
-                catalysts=[],
-                stance=StanceType.HOLD,
-                confidence=ConfidenceLevel.LOW,
-                rationale="Unable to complete analysis due to technical issues",
-                sources=[],
-                agent_traces=[],
-                analysis_timestamp=datetime.now()
-            )
+            # Keep whatever the research agents found rather than discarding it
+            return self.fallback_insight(ticker, agent_results, reason=str(e))
     
-    def _extract_findings(self, agent_results: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Extract all findings from agent results."""
-        all_findings = []
+    def fallback_insight(
+        self,
+        ticker: str,
+        agent_results: Dict[str, Dict[str, Any]],
+        reason: str
+    ) -> TickerInsight:
+        """
+        Build an insight from agent results without calling the LLM.
         
-        for agent_name, result in agent_results.items():
-            if "error" in result:
-                continue
-                
-            findings = result.get("findings", [])
-            for finding in findings:
-                finding["agent"] = agent_name
-                all_findings.append(finding)
+        Used when synthesis failed or there was no time left for it. The summary lists
+        each agent's own summary (or latest observation), and the stance defaults to a
+        low-confidence hold since the findings were not weighed.
         
-        return all_findings
+        Args:
+            ticker: Stock ticker symbol
+            agent_results: Results from the research agents (complete or partial)
+            reason: Why synthesis did not run
+            
+        Returns:
+            Deterministic TickerInsight
+        """
+        agent_summaries = []
+        for agent_name, result in agent_results.items():
+            summary = result.get("summary")
+            if not summary and result.get("findings"):
+                summary = result["findings"][-1].get("observation", "")
+            if summary:
+                agent_summaries.append(f"{agent_name.title()}: {summary.strip()}")
+        
+        if agent_summaries:
+            summary = f"Partial analysis ({reason}). " + " ".join(agent_summaries)
+        else:
+            summary = f"Analysis failed: {reason}"
+        
+        return TickerInsight(
+            ticker=ticker,
+            company_name=self._extract_company_name(self._extract_findings(agent_results)),
+            summary=summary,
+            key_drivers=[],
+            risks=[f"Analysis incomplete: {reason}"],
+            catalysts=[],
+            stance=StanceType.HOLD,
+            confidence=ConfidenceLevel.LOW,
+            rationale="Stance defaults to hold because the research findings could not be synthesized into a recommendation",
+            sources=self._extract_sources(agent_results),
+            agent_traces=self._extract_traces(agent_results),
+            analysis_timestamp=datetime.now()
+        )
+    
+    def _extract_findings(self, agent_results: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Extract all findings from agent results."""
+        return self._build_context(agent_results).findings
     
     def _extract_sources(self, agent_results: Dict[str, Dict[str, Any]]) -> List[SourceInfo]:
         """Extract all sources from agent results."""
-        all_sources = []
-        seen_urls = set()
-        
-        for agent_name, result in agent_results.items():
-            if "error" in result:
-                continue
-                
-            sources = result.get("sources", [])
-            for source_data in sources:
-                if isinstance(source_data, dict):
-                    url = source_data.get("url", "")
-                    if url and url not in seen_urls:
-                        seen_urls.add(url)
-                        source = SourceInfo(
-                            url=url,
-                            title=source_data.get("title"),
-                            published_at=source_data.get("published_at"),
-                            snippet=source_data.get("snippet")
-                        )
-                        all_sources.append(source)
-        
-        return all_sources
+        return self._build_context(agent_results).sources
     
     def _extract_traces(self, agent_results: Dict[str, Dict[str, Any]]) -> List[AgentTrace]:
         """Extract agent execution traces."""
-        traces = []
-        
+        return self._build_context(agent_results).traces
+    
+    def _build_context(self, agent_results: Dict[str, Dict[str, Any]]) -> FindingsContext:
+        """Build a findings context from a complete set of agent results."""
+        context = self.new_context()
         for agent_name, result in agent_results.items():
-            trace_data = result.get("trace")
-            if trace_data and isinstance(trace_data, AgentTrace):
-                traces.append(trace_data)
-        
-        return traces
+            context.add(agent_name, result)
+        return context
     
-    async def _generate_analysis(
-        self, 
-        ticker: str, 
-        findings: List[Dict[str, Any]], 
-        query: str
-    ) -> Dict[str, Any]:
-        """Generate comprehensive analysis from all findings."""
-        
-        # Prepare findings summary
-        findings_text = self._format_findings_for_analysis(findings)
+    async def _generate_insight(
+        self,
+        ticker: str,
+        findings_text: str,
+        query: str,
+        llm: Optional[BaseChatModel] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Generate the analysis and investment recommendation in one call (with self.llm unless llm is given).
         
-        analysis_prompt = f"""
-        Analyze the following research findings for {ticker} and provide a comprehensive assessment:
+        Returns:
+            Tuple of (analysis, recommendation)
+        """
+        insight_prompt = f"""
+        Analyze the following research findings for {ticker}, provide a comprehensive assessment
+        and an investment recommendation:
         
         Original Query: {query}
         
         Research Findings:
         {findings_text}
-        
-        Please provide a structured analysis in the following format:
-        
-        SUMMARY:
-        [2-3 sentence executive summary of the key findings]
-        
-        KEY_DRIVERS:
-        - [List 3-5 key growth drivers or positive factors]
-        
-        RISKS:
-        - [List 3-5 key risks or negative factors]
-        
-        CATALYSTS:
-        - [List 2-4 upcoming catalysts or events that could impact the stock]
-        
-        Focus on the most material and actionable insights. Be specific and cite key findings.
-        """
-        
-        messages = [
-            SystemMessage(content=self._get_analysis_system_prompt()),
-            HumanMessage(content=analysis_prompt)
-        ]
-        
-        response = await self.llm.ainvoke(messages)
-        return self._parse_analysis_response(response.content)
-    
-    async def _generate_recommendation(
-        self, 
-        ticker: str, 
-        analysis: Dict[str, Any], 
-        findings: List[Dict[str, Any]]
-    ) -> Dict[str, Any]:
-        """Generate investment recommendation and stance."""
-        
-        recommendation_prompt = f"""
-        Based on the following analysis for {ticker}, provide an investment recommendation:
-        
-        Summary: {analysis.get('summary', '')}
-        Key Drivers: {', '.join(analysis.get('key_drivers', []))}
-        Risks: {', '.join(analysis.get('risks', []))}
-        Catalysts: {', '.join(analysis.get('catalysts', []))}
-        
-        Provide your recommendation in the following format:
-        
-        STANCE: [BUY/HOLD/SELL]
-        CONFIDENCE: [HIGH/MEDIUM/LOW]
-        RATIONALE: [2-3 sentences explaining the reasoning for your stance and confidence level]
-        
-        Consider the 3-6 month investment horizon and balance the positive drivers against the risks.
         """
         
         messages = [
-            SystemMessage(content=self._get_recommendation_system_prompt()),
-            HumanMessage(content=recommendation_prompt)
+            SystemMessage(content=self._get_insight_system_prompt()),
+            HumanMessage(content=insight_prompt)
         ]
         
-        response = await self.llm.ainvoke(messages)
-        return self._parse_recommendation_response(response.content)
+        response = await (llm or self.llm).ainvoke(messages)
+        return self._parse_analysis_response(response.content), self._parse_recommendation_response(response.content)
     
-    def _format_findings_for_analysis(self, findings: List[Dict[str, Any]]) -> str:
-        """Format findings for analysis prompt."""
-        if not findings:
-            return "No significant findings available."
-        
-        formatted = []
-        for finding in findings:
-            agent = finding.get("agent", "unknown")
-            observation = finding.get("observation", "")
-            formatted.append(f"[{agent.upper()}] {observation}")
-        
-        return "\n".join(formatted)
+    def _get_insight_system_prompt(self) -> str:
+        """Get the system prompt of the combined analysis and recommendation call."""
+        return "\n".join([
+            self._get_analysis_system_prompt().rstrip(),
+            "",
+            "        Then, on the same response, give your investment recommendation.",
+            self._get_recommendation_system_prompt()
+        ])
     
     def _get_analysis_system_prompt(self) -> str:
         """Get system prompt for analysis generation."""
@@ -268,6 +342,22 @@ class SynthesisAgent:
         - Consider both fundamental and technical factors
         - Be specific and avoid generic statements
         - Cite key findings when making assertions
+        
+        Always respond with a structured analysis in the following format:
+        
+        SUMMARY:
+        [2-3 sentence executive summary of the key findings]
+        
+        KEY_DRIVERS:
+        - [List 3-5 key growth drivers or positive factors]
+        
+        RISKS:
+        - [List 3-5 key risks or negative factors]
+        
+        CATALYSTS:
+        - [List 2-4 upcoming catalysts or events that could impact the stock]
+        
+        Focus on the most material and actionable insights. Be specific and cite key findings.
         """
     
     def _get_recommendation_system_prompt(self) -> str:
@@ -286,8 +376,30 @@ class SynthesisAgent:
         - LOW: Limited conviction due to conflicting signals or insufficient data
         
         Be conservative and realistic in your assessments.
+        
+        Always respond in the following format:
+        
+        STANCE: [BUY/HOLD/SELL]
+        CONFIDENCE: [HIGH/MEDIUM/LOW]
+        RATIONALE: [2-3 sentences explaining the reasoning for your stance and confidence level]
+        
+        Consider the 3-6 month investment horizon and balance the positive drivers against the risks.
         """
     
+    def _escalation_reason(self, analysis: Dict[str, Any], recommendation: Dict[str, Any]) -> Optional[str]:
+        """Get the reason a first-pass synthesis should be redone on a stronger model, if any."""
+        missing = [
+            section for section in ("summary", "key_drivers", "risks")
+            if not analysis.get(section)
+        ]
+        if missing:
+            return f"analysis missing {', '.join(missing)}"
+        if not recommendation.get("rationale"):
+            return "recommendation missing rationale"
+        if self._parse_confidence(recommendation.get("confidence", "medium")) == ConfidenceLevel.LOW:
+            return "low confidence"
+        return None
+    
     def _parse_analysis_response(self, response: str) -> Dict[str, Any]:
         """Parse the structured analysis response."""
         analysis = {
@@ -314,6 +426,9 @@ class SynthesisAgent:
                 current_section = 'risks'
             elif line.startswith('CATALYSTS:'):
                 current_section = 'catalysts'
+            elif line.startswith(('STANCE:', 'CONFIDENCE:', 'RATIONALE:')):
+                # Recommendation part of a combined response
+                current_section = None
             elif line.startswith('- ') and current_section in ['key_drivers', 'risks', 'catalysts']:
                 item = line.replace('- ', '').strip()
                 analysis[current_section].append(item)
@@ -5,7 +5,7 @@ import asyncio
 import re
 import time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional, TypeVar
 import structlog
 
 from backend.app.models import (
@@ -19,21 +19,39 @@ from backend.app.models import (
 from backend.config.settings import get_settings
 from backend.tools.yahoo_finance_tool import YahooFinanceTool
 from backend.services.gemini_service import GeminiService
+from backend.services.event_stream import get_event_bus
+from backend.services.scheduler import get_scheduler
+from backend.utils.resilience import DeadlineExceeded, deadline_scope, within_deadline
 
 logger = structlog.get_logger()
 
+T = TypeVar("T")
+
 
 class YahooFinanceOrchestrator:
     """
     Orchestrator that uses Yahoo Finance for real-time data and Gemini for analysis.
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        yahoo_tool: Optional[YahooFinanceTool] = None,
+        gemini_service: Optional[GeminiService] = None
+    ):
+        """
+        Initialize the orchestrator.
+        
+        Args:
+            yahoo_tool: Yahoo Finance tool (a new one by default)
+            gemini_service: Gemini service (a new one by default)
+        """
         self.settings = get_settings()
-        self.yahoo_tool = YahooFinanceTool()
-        self.gemini_service = GeminiService()
+        self.yahoo_tool = yahoo_tool or YahooFinanceTool()
+        self.gemini_service = gemini_service or GeminiService()
+        self.events = get_event_bus()
+        self.scheduler = get_scheduler()
     
-    def _extract_tickers(self, query: str) -> List[str]:
+    def extract_tickers(self, query: str) -> List[str]:
         """Extract stock tickers from the query."""
         # Simple regex to find ticker symbols (1-5 uppercase letters)
         ticker_pattern = r'\b[A-Z]{1,5}\b'
@@ -64,7 +82,65 @@ class YahooFinanceOrchestrator:
         
         return unique_tickers
     
-    async def _analyze_ticker(self, ticker: str, query: str, max_iterations: int) -> TickerInsight:
+    async def _fetch_yahoo(self, method: Callable[..., T], *args: Any, cost: int = 1, **kwargs: Any) -> T:
+        """
+        Call a blocking Yahoo Finance tool method once the scheduler admits it.
+        
+        The worker thread inherits the request deadline, so the tool sizes its HTTP
+        timeouts from the remaining budget.
+        
+        Args:
+            method: YahooFinanceTool method to call
+            cost: Number of HTTP requests the method makes
+            
+        Returns:
+            Result of the method, computed in a worker thread
+            
+        Raises:
+            DeadlineExceeded: If the request deadline passes before the result is in
+        """
+        await within_deadline(self.scheduler.acquire("yahoo", cost=cost), name="yahoo admission")
+        return await within_deadline(asyncio.to_thread(method, *args, **kwargs), name=method.__name__)
+    
+    def _field_publisher(self, request_id: str, ticker: str, stage: str):
+        """Create a Gemini field callback that publishes completed fields as events."""
+        def on_field(name: str, value: Any) -> None:
+            self.events.publish(request_id, "field", {
+                "ticker": ticker,
+                "stage": stage,
+                "name": name,
+                "value": value
+            })
+        return on_field
+    
+    def _token_publisher(self, request_id: str, ticker: str, stage: str):
+        """Create a Gemini token callback that publishes streamed text as events."""
+        def on_token(name: str, text: str) -> None:
+            self.events.publish(request_id, "token", {
+                "ticker": ticker,
+                "stage": stage,
+                "name": name,
+                "text": text
+            })
+        return on_token
+    
+    def _publish_trace(self, request_id: str, trace: AgentTrace) -> None:
+        """Publish an agent completion event."""
+        self.events.publish(request_id, "agent_completed", {
+            "ticker": trace.ticker,
+            "agent_type": trace.agent_type,
+            "success": trace.success,
+            "latency_ms": trace.total_latency_ms,
+            "observation": trace.steps[-1].observation if trace.steps else ""
+        })
+    
+    async def _analyze_ticker(
+        self,
+        ticker: str,
+        query: str,
+        max_iterations: int,
+        request_id: str = ""
+    ) -> TickerInsight:
         """
         Analyze a single ticker using Yahoo Finance and Gemini.
         
@@ -72,6 +148,7 @@ class YahooFinanceOrchestrator:
             ticker: Stock ticker symbol
             query: Original user query
             max_iterations: Maximum iterations per agent
+            request_id: Request identifier used to publish progress events
             
         Returns:
             TickerInsight with complete analysis
@@ -83,13 +160,16 @@ class YahooFinanceOrchestrator:
         
         # Step 1: Fetch stock info
         step_start = time.time()
-        stock_info = self.yahoo_tool.get_stock_info(ticker)
+        try:
+            stock_info = await self._fetch_yahoo(self.yahoo_tool.get_stock_info, ticker, cost=2)
+        except DeadlineExceeded as e:
+            stock_info = {'error': str(e)}
         company_name = stock_info.get('company_name', ticker)
         
         if 'error' in stock_info:
             logger.error(f"Failed to fetch stock info for {ticker}", error=stock_info['error'])
             # Return minimal insight with error
-            return TickerInsight(
+            insight = TickerInsight(
                 ticker=ticker,
                 company_name=ticker,
                 stance=StanceType.HOLD,
@@ -102,10 +182,16 @@ class YahooFinanceOrchestrator:
                 sources=[],
                 agent_traces=[]
             )
+            self.events.publish(request_id, "insight", insight.model_dump(mode="json"))
+            return insight
         
         # Step 2: Fetch news (News Agent simulation)
         news_step_start = time.time()
-        news_articles = self.yahoo_tool.get_news(ticker, limit=10)
+        try:
+            news_articles = await self._fetch_yahoo(self.yahoo_tool.get_news, ticker, limit=10)
+        except DeadlineExceeded as e:
+            logger.warning(f"Skipping news for {ticker}", reason=str(e))
+            news_articles = []
         news_latency = (time.time() - news_step_start) * 1000
         
         # Convert news to sources
@@ -118,7 +204,11 @@ class YahooFinanceOrchestrator:
             ))
         
         # Summarize news using Gemini
-        news_summary = self.gemini_service.summarize_news(ticker, news_articles)
+        news_summary = await self.gemini_service.summarize_news(
+            ticker,
+            news_articles,
+            on_field=self._field_publisher(request_id, ticker, "news")
+        )
         
         # Create News Agent trace
         news_trace = AgentTrace(
@@ -138,14 +228,23 @@ class YahooFinanceOrchestrator:
             total_latency_ms=news_latency
         )
         agent_traces.append(news_trace)
+        self._publish_trace(request_id, news_trace)
         
         # Step 3: Fetch price data (Price Agent simulation)
         price_step_start = time.time()
-        price_data = self.yahoo_tool.get_price_history(ticker, period="1mo")
+        try:
+            price_data = await self._fetch_yahoo(self.yahoo_tool.get_price_history, ticker, period="1mo")
+        except DeadlineExceeded as e:
+            logger.warning(f"Skipping price history for {ticker}", reason=str(e))
+            price_data = {'ticker': ticker, 'current_price': stock_info.get('current_price') or 0, 'trend': 'neutral'}
         price_latency = (time.time() - price_step_start) * 1000
         
         # Analyze technical levels using Gemini
-        technical_analysis = self.gemini_service.analyze_support_resistance(ticker, price_data)
+        technical_analysis = await self.gemini_service.analyze_support_resistance(
+            ticker,
+            price_data,
+            on_field=self._field_publisher(request_id, ticker, "price")
+        )
         
         # Create Price Agent trace
         price_trace = AgentTrace(
@@ -165,18 +264,25 @@ class YahooFinanceOrchestrator:
             total_latency_ms=price_latency
         )
         agent_traces.append(price_trace)
+        self._publish_trace(request_id, price_trace)
         
         # Step 4: Fetch financial metrics
-        financial_metrics = self.yahoo_tool.get_financial_metrics(ticker)
+        try:
+            financial_metrics = await self._fetch_yahoo(self.yahoo_tool.get_financial_metrics, ticker, cost=2)
+        except DeadlineExceeded as e:
+            logger.warning(f"Skipping financial metrics for {ticker}", reason=str(e))
+            financial_metrics = {}
         
         # Step 5: Generate investment analysis using Gemini (Synthesis Agent)
         synthesis_start = time.time()
-        investment_analysis = self.gemini_service.generate_investment_analysis(
+        investment_analysis = await self.gemini_service.generate_investment_analysis(
             ticker=ticker,
             company_name=company_name,
             news_summary=news_summary,
             price_data=price_data,
-            financial_metrics=financial_metrics
+            financial_metrics=financial_metrics,
+            on_field=self._field_publisher(request_id, ticker, "synthesis"),
+            on_token=self._token_publisher(request_id, ticker, "synthesis")
         )
         synthesis_latency = (time.time() - synthesis_start) * 1000
         
@@ -198,6 +304,7 @@ class YahooFinanceOrchestrator:
             total_latency_ms=synthesis_latency
         )
         agent_traces.append(synthesis_trace)
+        self._publish_trace(request_id, synthesis_trace)
         
         # Map stance string to enum
         stance_map = {
@@ -241,6 +348,8 @@ class YahooFinanceOrchestrator:
             agent_traces=agent_traces
         )
         
+        self.events.publish(request_id, "insight", insight.model_dump(mode="json"))
+        
         logger.info(f"Completed analysis for {ticker}", stance=stance.value, confidence=confidence.value)
         return insight
     
@@ -257,12 +366,24 @@ class YahooFinanceOrchestrator:
         Args:
             query: Natural language query with stock tickers
             max_iterations: Maximum iterations per agent
-            timeout_seconds: Timeout for the entire analysis
+            timeout_seconds: Deadline for the entire analysis; every stage, tool call and
+                LLM call sizes its own timeout from what is left, and stages that cannot
+                finish in time fall back to data-only results
             request_id: Unique request identifier
             
         Returns:
             List of ticker insights
         """
+        with deadline_scope(timeout_seconds):
+            return await self._analyze(query, max_iterations, request_id)
+    
+    async def _analyze(
+        self,
+        query: str,
+        max_iterations: int,
+        request_id: str
+    ) -> List[TickerInsight]:
+        """Run the analysis workflow inside the request deadline."""
         start_time = time.time()
         
         logger.info("Starting Yahoo Finance stock analysis", 
@@ -271,15 +392,19 @@ class YahooFinanceOrchestrator:
         
         try:
             # Extract tickers from query
-            tickers = self._extract_tickers(query)
+            tickers = self.extract_tickers(query)
             
             if not tickers:
                 raise Exception("No valid stock tickers found in query. Please include stock ticker symbols (e.g., AAPL, MSFT, GOOGL).")
             
             logger.info("Extracted tickers", tickers=tickers, request_id=request_id)
+            self.events.publish(request_id, "started", {
+                "tickers": tickers,
+                "agents": ["news", "price", "synthesis"]
+            })
             
             # Analyze each ticker in parallel
-            tasks = [self._analyze_ticker(ticker, query, max_iterations) for ticker in tickers]
+            tasks = [self._analyze_ticker(ticker, query, max_iterations, request_id) for ticker in tickers]
             insights = await asyncio.gather(*tasks, return_exceptions=True)
             
             # Filter out any exceptions
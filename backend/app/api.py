@@ -1,120 +1,102 @@
 """
 API routes for the Stock Research Chatbot.
 """
-import uuid
+import asyncio
 import time
-from datetime import datetime
-from typing import Dict, Any
+import uuid
+from typing import Dict, Any, Optional, Union
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Header, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 import structlog
 
+from backend.app.jobs import FINISHED_STATUSES, AnalysisCancelled, JobQueueFull
 from backend.app.models import (
-    AnalysisRequest, 
-    AnalysisResponse, 
-    AnalysisStatus,
-    TickerInsight,
-    StanceType,
-    ConfidenceLevel
+    AnalysisJobAccepted,
+    AnalysisMode,
+    AnalysisRequest,
+    AnalysisResponse,
+    AnalysisStatus
 )
-from backend.agents.yahoo_finance_orchestrator import YahooFinanceOrchestrator
+from backend.app.container import get_container
 from backend.config.settings import get_settings
+from backend.services.agent_result_cache import get_agent_result_cache
+from backend.services.event_stream import get_event_bus, format_sse
+from backend.services.model_router import get_model_router
+from backend.services.scheduler import get_scheduler
+from backend.services.tool_memo import get_tool_memo_stats
+from backend.utils.circuit_breaker import get_breaker_registry
 
 logger = structlog.get_logger()
 router = APIRouter()
 
-# In-memory storage for analysis status (in production, use Redis or similar)
-analysis_status_store: Dict[str, Dict[str, Any]] = {}
+# Interval at which a stream for a not yet known request ID checks whether it has appeared
+STREAM_POLL_SECONDS = 0.2
 
 
-@router.post("/analyze", response_model=AnalysisResponse)
-async def analyze_stocks(request: AnalysisRequest) -> AnalysisResponse:
+@router.post(
+    "/analyze",
+    response_model=AnalysisResponse,
+    responses={202: {"model": AnalysisJobAccepted, "description": "Analysis queued as a background job"}}
+)
+async def analyze_stocks(
+    request: AnalysisRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(None)
+) -> Union[AnalysisResponse, JSONResponse]:
     """
     Analyze stocks based on natural language query.
     
     This endpoint triggers the multi-agent research process for the specified stocks.
+    With mode "async" the analysis is queued and 202 is returned at once with the
+    request_id; progress is then on /analyze/{request_id}/status (or /stream) and the
+    full AnalysisResponse on /analyze/{request_id} once the job completes. A sync
+    analysis is cancelled if the client disconnects before it finishes.
+    
+    A request for the same tickers, intent and options as a running analysis (or
+    one completed in the last few minutes) is served by that analysis instead of
+    starting another; send a new Idempotency-Key header to force a fresh one.
     """
-    request_id = str(uuid.uuid4())
-    start_time = time.time()
-    started_at = datetime.now()
+    request_id = request.request_id or str(uuid.uuid4())
+    jobs = get_container().jobs
     
     logger.info("Starting stock analysis", 
                 request_id=request_id, 
-                query=request.query)
+                query=request.query,
+                mode=request.mode.value)
+    
+    if request.mode == AnalysisMode.ASYNC:
+        try:
+            job = await jobs.submit(request_id, request, idempotency_key=idempotency_key)
+        except JobQueueFull as e:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Analysis queue is full: {str(e)}"
+            )
+        job_id = job["request_id"]
+        accepted = AnalysisJobAccepted(
+            request_id=job_id,
+            status=job["status"],
+            status_url=f"/api/v1/analyze/{job_id}/status",
+            result_url=f"/api/v1/analyze/{job_id}",
+            stream_url=f"/api/v1/analyze/{job_id}/stream",
+            deduplicated=job["deduplicated"]
+        )
+        return JSONResponse(status_code=202, content=accepted.model_dump(mode="json"))
     
     try:
-        # Initialize the Yahoo Finance orchestrator
-        orchestrator = YahooFinanceOrchestrator()
-        
-        # Update status
-        analysis_status_store[request_id] = {
-            "status": "processing",
-            "progress": 0.0,
-            "current_step": "Initializing analysis with Yahoo Finance",
-            "started_at": started_at
-        }
-        
-        # Run the analysis
-        insights = await orchestrator.analyze(
-            query=request.query,
-            max_iterations=request.max_iterations or 3,
-            timeout_seconds=request.timeout_seconds or 60,
-            request_id=request_id
+        return await jobs.run(
+            request_id,
+            request,
+            disconnected=http_request.is_disconnected,
+            idempotency_key=idempotency_key
         )
-        
-        # Calculate execution time
-        end_time = time.time()
-        total_latency_ms = (end_time - start_time) * 1000
-        
-        # Extract tickers and agents used
-        tickers_analyzed = [insight.ticker for insight in insights]
-        agents_used = list(set([
-            trace.agent_type 
-            for insight in insights 
-            for trace in insight.agent_traces
-        ]))
-        
-        # Create response
-        response = AnalysisResponse(
-            request_id=request_id,
-            query=request.query,
-            insights=insights,
-            total_latency_ms=total_latency_ms,
-            tickers_analyzed=tickers_analyzed,
-            agents_used=agents_used,
-            started_at=started_at,
-            completed_at=datetime.now()
+    except AnalysisCancelled as e:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Analysis cancelled: {str(e)}"
         )
-        
-        # Update final status
-        analysis_status_store[request_id] = {
-            "status": "completed",
-            "progress": 100.0,
-            "current_step": "Analysis complete",
-            "completed_at": datetime.now()
-        }
-        
-        logger.info("Stock analysis completed", 
-                    request_id=request_id,
-                    tickers_count=len(tickers_analyzed),
-                    latency_ms=total_latency_ms)
-        
-        return response
-        
     except Exception as e:
-        logger.error("Stock analysis failed", 
-                     request_id=request_id, 
-                     error=str(e))
-        
-        # Update error status
-        analysis_status_store[request_id] = {
-            "status": "failed",
-            "progress": 0.0,
-            "current_step": f"Error: {str(e)}",
-            "error": str(e)
-        }
-        
         if "No valid stock tickers found in query" in str(e):
             raise HTTPException(
                 status_code=422,
@@ -127,66 +109,122 @@ async def analyze_stocks(request: AnalysisRequest) -> AnalysisResponse:
             )
 
 
-
 @router.get("/analyze/{request_id}/status", response_model=AnalysisStatus)
 async def get_analysis_status(request_id: str) -> AnalysisStatus:
-    """Get the status of an ongoing analysis."""
-    if request_id not in analysis_status_store:
+    """Get the status and progress of an analysis."""
+    status_data = await get_container().jobs.status(request_id)
+    if status_data is None:
         raise HTTPException(
             status_code=404,
             detail="Analysis request not found"
         )
     
-    status_data = analysis_status_store[request_id]
-    
     return AnalysisStatus(
         request_id=request_id,
         status=status_data["status"],
-        progress=status_data["progress"],
+        progress=status_data.get("progress", 0.0),
         current_step=status_data.get("current_step"),
-        estimated_completion=status_data.get("estimated_completion")
+        estimated_completion=status_data.get("estimated_completion"),
+        error=status_data.get("error"),
+        work_avoided=status_data.get("work_avoided")
+    )
+
+
+@router.get("/analyze/{request_id}/stream")
+async def stream_analysis(
+    request_id: str,
+    last_event_id: Optional[str] = Header(None)
+) -> StreamingResponse:
+    """
+    Stream analysis progress as Server-Sent Events.
+    
+    Emits started, agent_completed, field, token and insight events while the analysis
+    runs, and ends with a complete (full AnalysisResponse), error or cancelled event. The stream may
+    be opened before the analysis is posted; earlier events are replayed. If no analysis
+    with this ID appears within a few seconds, 404 is returned.
+    """
+    events = get_event_bus()
+    jobs = get_container().jobs
+    last_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    
+    deadline = time.monotonic() + get_settings().analysis_stream_wait_seconds
+    while not events.has_events(request_id) and await jobs.status(request_id) is None:
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=404,
+                detail="Analysis request not found"
+            )
+        await asyncio.sleep(STREAM_POLL_SECONDS)
+    
+    async def event_source():
+        async for message in events.subscribe(request_id, last_event_id=last_id, heartbeat_seconds=15):
+            yield format_sse(message)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
 @router.get("/analyze/{request_id}")
 async def get_analysis_result(request_id: str) -> Dict[str, Any]:
-    """Get the result of a completed analysis."""
-    if request_id not in analysis_status_store:
+    """Get the full result of a completed analysis, or the status of one still running."""
+    jobs = get_container().jobs
+    status_data = await jobs.status(request_id)
+    if status_data is None:
         raise HTTPException(
             status_code=404,
             detail="Analysis request not found"
         )
     
-    status_data = analysis_status_store[request_id]
+    if status_data["status"] == "completed":
+        result = await jobs.result(request_id)
+        if result is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Analysis result has expired"
+            )
+        return result
     
-    if status_data["status"] != "completed":
+    if status_data["status"] == "failed":
         return {
             "request_id": request_id,
-            "status": status_data["status"],
-            "message": "Analysis not yet completed"
+            "status": "failed",
+            "error": status_data.get("error")
         }
     
-    # In a real implementation, you'd retrieve the full result from storage
     return {
         "request_id": request_id,
-        "status": "completed",
-        "message": "Analysis completed successfully"
+        "status": status_data["status"],
+        "progress": status_data.get("progress", 0.0),
+        "message": "Analysis not yet completed"
     }
 
 
 @router.delete("/analyze/{request_id}")
 async def cancel_analysis(request_id: str) -> Dict[str, str]:
-    """Cancel an ongoing analysis."""
-    if request_id not in analysis_status_store:
+    """
+    Cancel an ongoing analysis.
+    
+    A running analysis stops its agents, LLM calls and queued upstream requests;
+    the work this avoided is reported in the job status.
+    """
+    jobs = get_container().jobs
+    status_data = await jobs.status(request_id)
+    if status_data is None:
         raise HTTPException(
             status_code=404,
             detail="Analysis request not found"
         )
     
-    # Update status to cancelled
-    analysis_status_store[request_id]["status"] = "cancelled"
-    analysis_status_store[request_id]["current_step"] = "Analysis cancelled by user"
+    if status_data["status"] in FINISHED_STATUSES:
+        return {
+            "request_id": request_id,
+            "message": f"Analysis already {status_data['status']}"
+        }
     
+    await jobs.cancel(request_id)
     logger.info("Analysis cancelled", request_id=request_id)
     
     return {
@@ -221,3 +259,45 @@ async def list_available_agents() -> Dict[str, Any]:
             "Google Gemini AI (intelligent analysis and synthesis)"
         ]
     }
+
+
+@router.get("/internal/models")
+async def get_model_stats() -> Dict[str, Any]:
+    """Per-tier model routing statistics: calls, escalations, latency, tokens and estimated cost."""
+    return {"tiers": get_model_router().stats()}
+
+
+@router.get("/internal/upstreams")
+async def get_upstream_stats() -> Dict[str, Any]:
+    """Per-upstream scheduler statistics: available tokens, queue depth and waits by priority."""
+    return {"upstreams": get_scheduler().stats()}
+
+
+@router.get("/internal/breakers")
+async def get_breaker_stats() -> Dict[str, Any]:
+    """Circuit breaker state and recent failure rate per upstream."""
+    return {"breakers": get_breaker_registry().snapshot()}
+
+
+@router.get("/internal/agent-cache")
+async def get_agent_cache_stats() -> Dict[str, Any]:
+    """Cross-request agent result cache statistics: entries, hit rate and freshness windows."""
+    return {"agent_cache": get_agent_result_cache().stats()}
+
+
+@router.get("/internal/tool-memo")
+async def get_tool_memo_usage() -> Dict[str, Any]:
+    """Request-scoped tool memo statistics: hits, misses, and tool calls and time saved."""
+    return {"tool_memo": get_tool_memo_stats().snapshot()}
+
+
+@router.get("/internal/status-store")
+async def get_status_store_stats() -> Dict[str, Any]:
+    """Analysis status store backend, limits and size."""
+    return {"status_store": get_container().jobs.store.stats()}
+
+
+@router.get("/internal/jobs")
+async def get_job_stats() -> Dict[str, Any]:
+    """Analysis job workers, queue depth, and cancellations with the work they avoided."""
+    return {"jobs": get_container().jobs.stats()}
@@ -0,0 +1,105 @@
+"""
+Application container - Long-lived orchestrators, tools and LLM clients shared by all requests.
+"""
+import threading
+from typing import TYPE_CHECKING, Optional
+import structlog
+
+from backend.agents.yahoo_finance_orchestrator import YahooFinanceOrchestrator
+from backend.app.jobs import AnalysisJobManager
+from backend.config.settings import Settings, get_settings
+from backend.services.checkpoint_store import get_checkpoint_store
+from backend.services.gemini_service import GeminiService
+from backend.services.status_store import create_status_store
+from backend.tools.yahoo_finance_tool import YahooFinanceTool
+from backend.utils.api_client import ApiClient
+
+if TYPE_CHECKING:
+    from backend.agents.orchestrator import ResearchOrchestrator
+
+logger = structlog.get_logger()
+
+
+class AppContainer:
+    """
+    Components built once per application and handed to every request.
+
+    Constructing them is expensive (Gemini client setup, HTTP clients, compiled
+    LangGraph workflows, six research agents with their tool sessions), and their
+    caches and connection pools only pay off if they outlive a request. None of
+    them keeps per-request state on the instance, so they are safe to share
+    between concurrent requests.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.api_client = ApiClient()
+        self.yahoo_tool = YahooFinanceTool(api_client=self.api_client)
+        self.gemini_service = GeminiService()
+        self.yahoo_orchestrator = YahooFinanceOrchestrator(
+            yahoo_tool=self.yahoo_tool,
+            gemini_service=self.gemini_service
+        )
+        self.jobs = AnalysisJobManager(
+            self.yahoo_orchestrator,
+            workers=settings.analysis_job_workers,
+            queue_size=settings.analysis_job_queue_size,
+            store=create_status_store(settings),
+            cancel_poll_seconds=settings.analysis_cancel_poll_seconds,
+            dedup_window_seconds=settings.analysis_dedup_window_seconds
+        )
+        self._research_orchestrator: Optional["ResearchOrchestrator"] = None
+        self._lock = threading.Lock()
+
+    def research_orchestrator(self) -> "ResearchOrchestrator":
+        """
+        Get the LangGraph research orchestrator, building it on first use.
+
+        Its agents and graphs are only compiled once the multi-agent pipeline is
+        actually used, rather than on every application start.
+        """
+        with self._lock:
+            if self._research_orchestrator is None:
+                from backend.agents.orchestrator import ResearchOrchestrator
+                self._research_orchestrator = ResearchOrchestrator()
+            return self._research_orchestrator
+
+    async def aclose(self) -> None:
+        """Stop the job workers and release the sessions, caches and database connections held by the components."""
+        await self.jobs.aclose()
+        if self._research_orchestrator is not None:
+            await self._research_orchestrator.aclose()
+        get_checkpoint_store().close()
+
+
+# Container of the running application, created in the lifespan (or on first use)
+_container: Optional[AppContainer] = None
+_container_lock = threading.Lock()
+
+
+def init_container(settings: Optional[Settings] = None) -> AppContainer:
+    """Build the application container."""
+    global _container
+    with _container_lock:
+        _container = AppContainer(settings or get_settings())
+        logger.info("Application container built")
+        return _container
+
+
+def get_container() -> AppContainer:
+    """Get the application container, building it if the lifespan has not run (e.g. in tests)."""
+    global _container
+    with _container_lock:
+        if _container is None:
+            _container = AppContainer(get_settings())
+        return _container
+
+
+async def shutdown_container() -> None:
+    """Release the application container's resources."""
+    global _container
+    with _container_lock:
+        container, _container = _container, None
+    if container is not None:
+        await container.aclose()
+        logger.info("Application container closed")
@@ -0,0 +1,560 @@
+"""
+Analysis Jobs - Runs analysis requests in the background and tracks their progress and results.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import structlog
+
+from backend.agents.intent_router import get_intent_router
+from backend.agents.yahoo_finance_orchestrator import YahooFinanceOrchestrator
+from backend.app.models import AnalysisPriority, AnalysisRequest, AnalysisResponse
+from backend.services.event_stream import TERMINAL_EVENTS, AnalysisEventBus, get_event_bus
+from backend.services.scheduler import Priority, UpstreamScheduler, get_scheduler, scheduling_scope
+from backend.services.status_store import InMemoryStatusStore, StatusStore, StatusStoreError
+from backend.utils.resilience import cancellation_scope
+
+logger = structlog.get_logger()
+
+# Progress reported once the tickers are known, and the share of the bar filled by agent stages
+STARTED_PROGRESS = 5.0
+STAGES_PROGRESS = 90.0
+
+# Job states after which nothing is left to cancel
+FINISHED_STATUSES = {"completed", "failed", "cancelled"}
+
+
+class JobQueueFull(Exception):
+    """Raised when the analysis job queue has no room for another job."""
+
+
+class AnalysisCancelled(Exception):
+    """Raised by an inline analysis that was cancelled before it finished."""
+
+
+class AnalysisFailed(Exception):
+    """Raised to a request attached to an analysis that failed."""
+
+
+def request_key(
+    tickers: List[str],
+    intent: str,
+    request: AnalysisRequest,
+    idempotency_key: Optional[str] = None
+) -> str:
+    """
+    Get the key of the analysis a request asks for.
+
+    Requests for the same tickers (in any order or case), query intent and analysis
+    options share a key, as do their results. Scheduling priority and sync/async mode
+    do not change the result and are left out; a client-supplied idempotency key is
+    part of the key, so a new key asks for a fresh analysis.
+    """
+    normalized = {
+        "tickers": sorted({ticker.upper() for ticker in tickers}),
+        "intent": intent,
+        "max_iterations": request.max_iterations,
+        "timeout_seconds": request.timeout_seconds,
+        "idempotency_key": idempotency_key,
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ProgressTracker:
+    """
+    Progress of one analysis, derived from the events its orchestrator publishes.
+
+    The started event announces the tickers and agent stages; each agent_completed
+    event finishes one stage of a ticker, and an insight finishes the ticker outright
+    (including tickers whose data fetch failed before any agent ran).
+    """
+
+    def __init__(self):
+        self.tickers: List[str] = []
+        self.stages: List[str] = []
+        self.completed: Dict[str, Set[str]] = {}
+        self.finished: Set[str] = set()
+
+    def update(self, event: str, data: Dict[str, Any]) -> Optional[Tuple[float, str]]:
+        """
+        Fold an analysis event into the progress.
+
+        Returns:
+            (progress percentage, current step) if the event advanced the analysis, else None
+        """
+        if event == "started":
+            self.tickers = list(data.get("tickers", []))
+            self.stages = list(data.get("agents", []))
+            return self.progress(), f"Researching {', '.join(self.tickers)}"
+        if event == "agent_completed":
+            ticker, agent_type = data.get("ticker", ""), data.get("agent_type", "")
+            self.completed.setdefault(ticker, set()).add(agent_type)
+            return self.progress(), f"{agent_type.capitalize()} agent finished for {ticker}"
+        if event == "insight":
+            ticker = data.get("ticker", "")
+            self.finished.add(ticker)
+            return self.progress(), f"Insight ready for {ticker}"
+        return None
+
+    def counts(self) -> Tuple[int, int]:
+        """Get the number of finished stages and the total number of stages."""
+        per_ticker = max(len(self.stages), 1)
+        done = sum(
+            per_ticker if ticker in self.finished else min(len(self.completed.get(ticker, ())), per_ticker)
+            for ticker in self.tickers
+        )
+        return done, len(self.tickers) * per_ticker
+
+    def progress(self) -> float:
+        """Get the progress percentage."""
+        done, total = self.counts()
+        if not total:
+            return STARTED_PROGRESS
+        return round(STARTED_PROGRESS + STAGES_PROGRESS * done / total, 1)
+
+
+class AnalysisJobManager:
+    """
+    Runs analysis requests and keeps their status, progress and result.
+
+    Async requests are queued and run by a bounded pool of worker tasks, so the
+    POST returns as soon as the job is recorded; sync requests run the same way
+    but inline. While a job runs, its analysis events are folded into its progress
+    and current step, and the full AnalysisResponse (or the error) is kept for the
+    result endpoint once it finishes. Status and results live in the status store
+    (under "status:<id>" and "result:<id>"), so with a shared backend any worker
+    can answer for a job another worker runs.
+
+    Cancelling a job cancels its analysis task, and with it every agent stage, LLM
+    call and scheduler wait underneath; queued upstream requests are released at
+    once and blocking HTTP calls in worker threads stop at their next timeout
+    check. The request is also written under "cancel:<id>", which the worker
+    running the job polls, so a DELETE may land on any worker.
+
+    Identical requests are deduplicated: each job claims its request key under
+    "dedup:<key>", and a request whose key is claimed by a job still running, or
+    completed within the dedup window, attaches to that job instead of starting
+    another. A sync duplicate waits for the job, relaying its events to its own
+    request ID so a stream opened for that ID still follows the analysis.
+    """
+
+    def __init__(
+        self,
+        orchestrator: YahooFinanceOrchestrator,
+        workers: int = 4,
+        queue_size: int = 100,
+        events: Optional[AnalysisEventBus] = None,
+        store: Optional[StatusStore] = None,
+        scheduler: Optional[UpstreamScheduler] = None,
+        cancel_poll_seconds: float = 1.0,
+        dedup_window_seconds: int = 300
+    ):
+        self.orchestrator = orchestrator
+        self.workers = workers
+        self.queue_size = queue_size
+        self.events = events or get_event_bus()
+        self.store = store or InMemoryStatusStore()
+        self.scheduler = scheduler or get_scheduler()
+        self.cancel_poll_seconds = cancel_poll_seconds
+        self.dedup_window_seconds = dedup_window_seconds
+        # Jobs executing in this process
+        self._running: Dict[str, _RunningJob] = {}
+        # Requests in this process waiting on another request's job, per job
+        self._attached: Dict[str, int] = {}
+        # Requests served by an existing job instead of a new analysis
+        self.deduplicated = 0
+        # Cancelled jobs and the work their cancellation avoided, over all jobs
+        self.cancellations = {
+            "cancelled": 0, "stages_skipped": 0, "upstream_calls_dropped": 0, "budget_seconds_unused": 0.0
+        }
+        # Queue and worker tasks, created on the running event loop when first needed
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+    def _ensure_workers(self) -> asyncio.Queue:
+        """Get the job queue of the running event loop, starting the worker pool if needed."""
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._loop = loop
+            self._worker_tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        return self._queue
+
+    async def submit(
+        self,
+        request_id: str,
+        request: AnalysisRequest,
+        idempotency_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue an analysis to run in the background, unless a job for the same analysis exists.
+
+        Args:
+            request_id: Request identifier of the job
+            request: Analysis request
+            idempotency_key: Client-supplied key distinguishing otherwise identical requests
+
+        Returns:
+            Status of the queued or existing job, with its request_id and whether it was deduplicated
+
+        Raises:
+            JobQueueFull: If the queue is at capacity
+        """
+        queue = self._ensure_workers()
+        if queue.full():
+            raise JobQueueFull(f"{queue.qsize()} analyses are already queued")
+
+        status = await self._set_status(request_id, status="queued", progress=0.0,
+                                        current_step="Waiting for a worker", submitted_at=datetime.now())
+        existing_id = await self._claim(request_id, request, idempotency_key)
+        if existing_id is not None:
+            status = await self.status(existing_id) or {}
+            return {**status, "request_id": existing_id, "deduplicated": True}
+
+        queue.put_nowait((request_id, request))
+        logger.info("Analysis job queued", request_id=request_id, queued=queue.qsize())
+        return {**status, "request_id": request_id, "deduplicated": False}
+
+    async def run(
+        self,
+        request_id: str,
+        request: AnalysisRequest,
+        disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        idempotency_key: Optional[str] = None
+    ) -> AnalysisResponse:
+        """
+        Run an analysis inline, tracking it like a job, or wait for an existing job for the same analysis.
+
+        Args:
+            request_id: Request identifier of the job
+            request: Analysis request
+            disconnected: Checks whether the client has gone away; if it has, the analysis is cancelled
+            idempotency_key: Client-supplied key distinguishing otherwise identical requests
+
+        Returns:
+            The analysis response (that of the existing job if the request was deduplicated)
+
+        Raises:
+            AnalysisCancelled: If the analysis was cancelled
+            AnalysisFailed: If the existing job this request attached to failed
+            Exception: Whatever the analysis failed with (also recorded in the job status)
+        """
+        await self._set_status(request_id, status="queued", progress=0.0,
+                               current_step="Initializing analysis with Yahoo Finance", submitted_at=datetime.now())
+        existing_id = await self._claim(request_id, request, idempotency_key)
+        if existing_id is not None:
+            return await self._attach(existing_id, request_id)
+
+        watcher = asyncio.create_task(self._watch_disconnect(request_id, disconnected)) if disconnected else None
+        try:
+            return await self._execute(request_id, request)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    async def status(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Get the status of a job, or None if it is unknown or expired."""
+        return await self.store.get(f"status:{request_id}")
+
+    async def result(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Get the AnalysisResponse of a completed job (as JSON data), or None."""
+        return await self.store.get(f"result:{request_id}")
+
+    async def cancel(self, request_id: str, reason: str = "Analysis cancelled by user") -> Optional[Dict[str, Any]]:
+        """
+        Cancel a job: a queued job is skipped, a running one is stopped wherever it runs.
+
+        Args:
+            request_id: Request identifier of the job
+            reason: Why the job was cancelled, shown as its current step
+
+        Returns:
+            Status of the job (unchanged if it had already finished), or None if it is unknown
+        """
+        status = await self.status(request_id)
+        if status is None or status.get("status") in FINISHED_STATUSES:
+            return status
+
+        await self.store.set(f"cancel:{request_id}", {"reason": reason, "requested_at": datetime.now()})
+        status = await self._set_status(request_id, status="cancelled", current_step=reason)
+        job = self._running.get(request_id)
+        if job is not None:
+            self._cancel_running(request_id, job, reason)
+        return status
+
+    def stats(self) -> Dict[str, Any]:
+        """Get worker pool usage and cancellation counters."""
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": len(self._running),
+            "deduplicated": self.deduplicated,
+            "cancellations": {
+                name: round(value, 1) if isinstance(value, float) else value
+                for name, value in self.cancellations.items()
+            },
+        }
+
+    async def aclose(self) -> None:
+        """Stop the worker pool; queued jobs are abandoned."""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queue = None
+        await self.store.close()
+
+    async def _worker(self) -> None:
+        """Run queued jobs one at a time."""
+        while True:
+            request_id, request = await self._queue.get()
+            try:
+                if await self.store.get(f"cancel:{request_id}"):
+                    self.cancellations["cancelled"] += 1
+                    continue
+                await self._execute(request_id, request)
+            except Exception:
+                # Already recorded in the job status and published as an error event
+                pass
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, request_id: str, request: AnalysisRequest) -> AnalysisResponse:
+        """Run an analysis, recording its progress and outcome."""
+        start_time = time.time()
+        started_at = datetime.now()
+        job = _RunningJob(request.timeout_seconds or 60)
+        self._running[request_id] = job
+        await self._set_status(request_id, status="processing", progress=0.0,
+                               current_step="Extracting tickers", started_at=started_at)
+        tracker = asyncio.create_task(self._track_progress(request_id, job))
+
+        try:
+            # Upstream calls are scheduled by priority and shared fairly per request; the
+            # analysis runs in its own task so that cancelling it reaches every call it makes
+            priority = Priority.BATCH if request.priority == AnalysisPriority.BATCH else Priority.INTERACTIVE
+            with scheduling_scope(priority, caller=request_id), cancellation_scope() as cancelled:
+                job.cancelled = cancelled
+                job.task = asyncio.ensure_future(self.orchestrator.analyze(
+                    query=request.query,
+                    max_iterations=request.max_iterations or 3,
+                    timeout_seconds=request.timeout_seconds or 60,
+                    request_id=request_id
+                ))
+            insights = await job.task
+        except asyncio.CancelledError:
+            if job.cancel_reason is None:
+                # This job itself was cancelled (e.g. on shutdown), not the analysis
+                raise
+            await self._record_cancellation(request_id, job)
+            raise AnalysisCancelled(job.cancel_reason) from None
+        except Exception as e:
+            logger.error("Stock analysis failed",
+                         request_id=request_id,
+                         error=str(e))
+            await self._set_status(request_id, status="failed", current_step=f"Error: {str(e)}",
+                                   error=str(e), completed_at=datetime.now())
+            self.events.publish(request_id, "error", {"detail": str(e)})
+            raise
+        finally:
+            tracker.cancel()
+            self._running.pop(request_id, None)
+
+        total_latency_ms = (time.time() - start_time) * 1000
+        response = AnalysisResponse(
+            request_id=request_id,
+            query=request.query,
+            insights=insights,
+            total_latency_ms=total_latency_ms,
+            tickers_analyzed=[insight.ticker for insight in insights],
+            agents_used=list(set([
+                trace.agent_type
+                for insight in insights
+                for trace in insight.agent_traces
+            ])),
+            started_at=started_at,
+            completed_at=datetime.now()
+        )
+        await self.store.set(f"result:{request_id}", response.model_dump(mode="json"))
+        await self._set_status(request_id, status="completed", progress=100.0, current_step="Analysis complete",
+                               completed_at=datetime.now())
+        self.events.publish(request_id, "complete", response.model_dump(mode="json"))
+
+        logger.info("Stock analysis completed",
+                    request_id=request_id,
+                    tickers_count=len(response.tickers_analyzed),
+                    latency_ms=total_latency_ms)
+        return response
+
+    def _cancel_running(self, request_id: str, job: "_RunningJob", reason: str) -> None:
+        """Cancel the task tree of a job running in this process and free its queued upstream requests."""
+        if job.cancel_reason is not None:
+            return
+        job.cancel_reason = reason
+        if job.cancelled is not None:
+            job.cancelled.set()
+        if job.task is not None:
+            job.task.cancel()
+        job.upstream_calls_dropped = self.scheduler.release(request_id)
+
+    async def _record_cancellation(self, request_id: str, job: "_RunningJob") -> None:
+        """Record a cancelled job's status and the work its cancellation avoided."""
+        done, total = job.progress.counts()
+        work_avoided = {
+            "stages_skipped": total - done,
+            "stages_total": total,
+            "upstream_calls_dropped": job.upstream_calls_dropped,
+            "budget_seconds_unused": round(max(job.timeout_seconds - (time.monotonic() - job.started), 0.0), 1),
+        }
+        self.cancellations["cancelled"] += 1
+        for name in ("stages_skipped", "upstream_calls_dropped", "budget_seconds_unused"):
+            self.cancellations[name] += work_avoided[name]
+
+        await self._set_status(request_id, status="cancelled", current_step=job.cancel_reason,
+                               work_avoided=work_avoided, completed_at=datetime.now())
+        self.events.publish(request_id, "cancelled", {"reason": job.cancel_reason, "work_avoided": work_avoided})
+        logger.info("Analysis cancelled", request_id=request_id, reason=job.cancel_reason, **work_avoided)
+
+    async def _track_progress(self, request_id: str, job: "_RunningJob") -> None:
+        """
+        Update a running job's progress and current step from its analysis events.
+
+        Between events it checks for a cancellation requested through the store, which
+        is how a DELETE handled by another worker reaches this one.
+        """
+        async for message in self.events.subscribe(request_id, heartbeat_seconds=self.cancel_poll_seconds):
+            try:
+                cancel = await self.store.get(f"cancel:{request_id}")
+                if cancel:
+                    self._cancel_running(request_id, job, cancel.get("reason", "Analysis cancelled"))
+                    return
+
+                update = job.progress.update(message["event"], message["data"]) if message else None
+                if update is not None:
+                    progress, current_step = update
+                    await self._set_status(request_id, progress=progress, current_step=current_step)
+            except StatusStoreError as e:
+                # Progress is best-effort; the final status is written by the job itself
+                logger.warning("Failed to record analysis progress", request_id=request_id, error=str(e))
+
+    async def _watch_disconnect(self, request_id: str, disconnected: Callable[[], Awaitable[bool]]) -> None:
+        """Cancel an inline analysis once its client has gone away."""
+        while not await disconnected():
+            await asyncio.sleep(self.cancel_poll_seconds)
+        if self._attached.get(request_id):
+            logger.info("Client disconnected, analysis kept for attached requests", request_id=request_id)
+            return
+        logger.info("Client disconnected, cancelling analysis", request_id=request_id)
+        await self.cancel(request_id, reason="Client disconnected")
+
+    async def _claim(self, request_id: str, request: AnalysisRequest, idempotency_key: Optional[str]) -> Optional[str]:
+        """
+        Claim a request's analysis for a new job, or find the job already serving it.
+
+        The request's status must already be recorded, so that a duplicate arriving
+        right after the claim finds the job in flight. It is deleted again if the
+        request attaches to an existing job.
+
+        Returns:
+            Request ID of a running or recently completed job for the same analysis, or
+            None if the caller should start the analysis (the claim is then its own)
+        """
+        if self.dedup_window_seconds <= 0:
+            return None
+        plan = get_intent_router().route(request.query, request.max_iterations or 3)
+        tickers = self.orchestrator.extract_tickers(request.query)
+        key = f"dedup:{request_key(tickers, plan.intent, request, idempotency_key)}"
+        claim = {"request_id": request_id}
+
+        try:
+            if await self.store.add(key, claim):
+                return None
+            existing = await self.store.get(key) or {}
+            existing_id = existing.get("request_id")
+            if existing_id is not None and await self._reusable(existing_id):
+                if existing_id != request_id:
+                    await self.store.delete(f"status:{request_id}")
+                self.deduplicated += 1
+                logger.info("Duplicate analysis request attached to existing job",
+                            request_id=request_id, existing_request_id=existing_id)
+                return existing_id
+            # The earlier job failed, was cancelled or is too old; this request takes over the key
+            await self.store.set(key, claim)
+        except StatusStoreError as e:
+            # Deduplication is an optimization; without the store the request just runs
+            logger.warning("Failed to deduplicate analysis request", request_id=request_id, error=str(e))
+        return None
+
+    async def _reusable(self, request_id: str) -> bool:
+        """Whether a job is still running, or completed within the dedup window with its result kept."""
+        status = await self.status(request_id)
+        if status is None:
+            return False
+        if status["status"] not in FINISHED_STATUSES:
+            return True
+        if status["status"] != "completed" or not status.get("completed_at"):
+            return False
+        age = datetime.now() - datetime.fromisoformat(status["completed_at"])
+        return age.total_seconds() <= self.dedup_window_seconds and await self.result(request_id) is not None
+
+    async def _attach(self, job_id: str, request_id: str) -> AnalysisResponse:
+        """
+        Wait for another request's job and return its result.
+
+        Events of the job are relayed to this request's ID. The job's own worker may
+        run in another process, whose events do not reach this one; the store is then
+        checked between events, every `cancel_poll_seconds`.
+        """
+        relay = request_id != job_id
+        self._attached[job_id] = self._attached.get(job_id, 0) + 1
+        try:
+            status = await self.status(job_id)
+            if status is not None and status["status"] not in FINISHED_STATUSES:
+                async for message in self.events.subscribe(job_id, heartbeat_seconds=self.cancel_poll_seconds):
+                    if message is not None and message["event"] not in TERMINAL_EVENTS:
+                        if relay:
+                            self.events.publish(request_id, message["event"], message["data"])
+                        continue
+                    status = await self.status(job_id)
+                    if status is None or status["status"] in FINISHED_STATUSES:
+                        break
+                status = await self.status(job_id)
+            result = await self.result(job_id) if status and status["status"] == "completed" else None
+        finally:
+            self._attached[job_id] -= 1
+            if not self._attached[job_id]:
+                del self._attached[job_id]
+
+        if result is not None:
+            if relay:
+                self.events.publish(request_id, "complete", result)
+            return AnalysisResponse.model_validate(result)
+        if status is not None and status["status"] == "cancelled":
+            if relay:
+                self.events.publish(request_id, "cancelled", {"reason": status.get("current_step")})
+            raise AnalysisCancelled(status.get("current_step") or "Analysis cancelled")
+        error = (status or {}).get("error") or "Analysis result is no longer available"
+        if relay:
+            self.events.publish(request_id, "error", {"detail": error})
+        raise AnalysisFailed(error)
+
+    async def _set_status(self, request_id: str, **fields: Any) -> Dict[str, Any]:
+        return await self.store.update(f"status:{request_id}", **fields)
+
+
+class _RunningJob:
+    """Handles of a job executing in this process, used to cancel it and account for the work avoided."""
+
+    def __init__(self, timeout_seconds: float):
+        self.timeout_seconds = timeout_seconds
+        self.started = time.monotonic()
+        self.progress = ProgressTracker()
+        self.task: Optional[asyncio.Future] = None
+        self.cancelled: Optional[threading.Event] = None
+        self.cancel_reason: Optional[str] = None
+        self.upstream_calls_dropped = 0
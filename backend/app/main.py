@@ -13,6 +13,7 @@ import structlog
 
 from backend.config.settings import get_settings
 from backend.app.api import router as api_router
+from backend.app.container import init_container, shutdown_container
 from backend.app.models import AnalysisRequest, AnalysisResponse
 
 
@@ -46,10 +47,12 @@ async def lifespan(app: FastAPI):
                 app_env=settings.app_env, 
                 log_level=settings.log_level)
     
-    # Initialize any startup tasks here
+    # Long-lived orchestrators, tools and LLM clients shared by all requests
+    init_container(settings)
     yield
     
     logger.info("Shutting down Stock Research Chatbot API")
+    await shutdown_container()
 
 
 # Create FastAPI application
@@ -88,11 +88,26 @@ class TickerInsight(BaseModel):
     analysis_timestamp: datetime = Field(default_factory=datetime.now, description="Analysis completion time")
 
 
+class AnalysisPriority(str, Enum):
+    """Scheduling class of an analysis request."""
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+
+
+class AnalysisMode(str, Enum):
+    """How an analysis request is answered."""
+    SYNC = "sync"
+    ASYNC = "async"
+
+
 class AnalysisRequest(BaseModel):
     """Request model for stock analysis."""
     query: str = Field(..., description="Natural language query with tickers and analysis request")
     max_iterations: Optional[int] = Field(3, description="Maximum iterations per agent")
     timeout_seconds: Optional[int] = Field(30, description="Timeout for the entire analysis")
+    request_id: Optional[str] = Field(None, description="Client-supplied request identifier, so the event stream can be opened before posting")
+    priority: AnalysisPriority = Field(AnalysisPriority.INTERACTIVE, description="Scheduling class; batch work only uses spare upstream capacity")
+    mode: AnalysisMode = Field(AnalysisMode.SYNC, description="sync returns the analysis; async queues a job and returns its request_id at once")
 
 
 class AnalysisResponse(BaseModel):
@@ -126,3 +141,17 @@ class AnalysisStatus(BaseModel):
     progress: float = Field(..., description="Progress percentage (0-100)")
     current_step: Optional[str] = Field(None, description="Current processing step")
     estimated_completion: Optional[datetime] = Field(None, description="Estimated completion time")
+    error: Optional[str] = Field(None, description="Error message of a failed analysis")
+    work_avoided: Optional[Dict[str, Any]] = Field(
+        None, description="Stages, upstream calls and time budget a cancellation saved"
+    )
+
+
+class AnalysisJobAccepted(BaseModel):
+    """Response model for an analysis queued as a background job."""
+    request_id: str = Field(..., description="Request identifier of the job")
+    status: str = Field(..., description="Job status at submission")
+    status_url: str = Field(..., description="Progress of the job")
+    result_url: str = Field(..., description="Full AnalysisResponse once the job completes")
+    stream_url: str = Field(..., description="Server-Sent Events of the job")
+    deduplicated: bool = Field(False, description="Whether an existing job for the same analysis was returned")
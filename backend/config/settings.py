@@ -17,8 +17,95 @@ class Settings(BaseSettings):
     
     # Agent Configuration
     max_iterations: int = 3
+    # Reason and act in one function-calling LLM call per iteration (otherwise text ReAct)
+    agent_tool_calling_enabled: bool = True
+    agent_max_tool_calls: int = 3
+    # Share tool results between the agents of a request, keyed by (tool, normalized query, ticker)
+    tool_memo_enabled: bool = True
+    
+    # Agent Result Cache Configuration (cross-request, freshness window per agent type)
+    agent_cache_enabled: bool = True
+    agent_cache_max_entries: int = 1000
+    agent_cache_ttl_news_seconds: int = 600
+    agent_cache_ttl_price_seconds: int = 300
+    agent_cache_ttl_earnings_seconds: int = 6 * 3600
+    agent_cache_ttl_insider_seconds: int = 6 * 3600
+    agent_cache_ttl_filings_seconds: int = 24 * 3600
+    agent_cache_ttl_patents_seconds: int = 24 * 3600
+    # Renew stale results whose input fingerprint (sources, latest filing, price bucket) is unchanged
+    delta_refresh_enabled: bool = True
+    fingerprint_price_bucket_pct: float = 1.0
     request_timeout: int = 30
     rate_limit_requests_per_minute: int = 60
+    # (ticker, agent) research pairs run at once by the research orchestrator
+    max_concurrent_agents: int = 8
+    # Run only the agents a query's intent needs; general queries run the default agents
+    intent_routing_enabled: bool = True
+    default_research_agents: str = "news,filings,earnings,insider,patents,price"
+    
+    # Upstream Scheduler Configuration (rate_limit_requests_per_minute is the Gemini key quota)
+    yahoo_requests_per_minute: int = 120
+    sec_requests_per_minute: int = 300
+    upstream_burst_size: int = 10
+    batch_capacity_reserve: float = 0.2
+    
+    # Model Tier Configuration
+    model_fast: str = "gemini-2.5-flash-lite"
+    model_standard: str = "gemini-2.5-flash"
+    model_strong: str = "gemini-2.5-pro"
+    synthesis_escalation_enabled: bool = True
+    
+    # LLM Resilience Configuration (hedging and retries)
+    llm_hedging_enabled: bool = True
+    llm_hedge_percentile: float = 95.0
+    llm_hedge_initial_delay_seconds: float = 4.0
+    llm_retry_attempts: int = 3
+    llm_retry_base_delay_seconds: float = 0.5
+    llm_retry_max_delay_seconds: float = 8.0
+    
+    # Circuit Breaker Configuration (per upstream)
+    breaker_window_size: int = 20
+    breaker_min_calls: int = 5
+    breaker_failure_threshold: float = 0.5
+    breaker_open_seconds: float = 30.0
+    
+    # Request Deadline Configuration
+    # Remaining budget needed to start an LLM stage or ReAct iteration with no latency history
+    deadline_min_stage_seconds: float = 2.0
+    # Part of the request budget held back from research so partial findings can be synthesized
+    partial_synthesis_reserve_seconds: float = 5.0
+    
+    # Prompt Budget Configuration (tokens, estimated locally)
+    prompt_token_budget: int = 3000
+    observation_token_budget: int = 500
+    synthesis_findings_token_budget: int = 4000
+    prompt_recent_findings: int = 3
+    
+    # Context Cache Configuration (Gemini explicit caching of stable prompt prefixes)
+    context_cache_enabled: bool = True
+    context_cache_ttl_seconds: int = 3600
+    context_cache_min_tokens: int = 1024
+    
+    # Research Checkpoint Configuration (SQLite, keyed by request ID)
+    checkpoint_enabled: bool = True
+    checkpoint_db_path: str = "./data/checkpoints.db"
+    checkpoint_retention_hours: int = 24
+    
+    # Analysis Job Configuration (POST /analyze with mode "async")
+    analysis_job_workers: int = 4
+    analysis_job_queue_size: int = 100
+    analysis_cancel_poll_seconds: float = 1.0
+    # Identical requests attach to a running job, or to one completed this recently (0 disables)
+    analysis_dedup_window_seconds: int = 300
+    # How long a stream for an unknown request ID waits for the analysis to appear before answering 404
+    analysis_stream_wait_seconds: float = 10.0
+    
+    # Status Store Configuration (analysis status and results; "memory" or "redis")
+    status_store_backend: str = "memory"
+    status_store_redis_url: str = "redis://localhost:6379/0"
+    status_store_key_prefix: str = "analysis:"
+    status_store_ttl_seconds: int = 3600
+    status_store_max_entries: int = 10000
     
     # Vector Database Configuration
     chroma_persist_directory: str = "./data/chroma_db"
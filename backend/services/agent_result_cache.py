@@ -0,0 +1,225 @@
+"""
+Agent Result Cache - Cross-request memo of research agent results with per-agent freshness windows.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+import structlog
+
+from backend.config.settings import Settings, get_settings
+
+logger = structlog.get_logger()
+
+CacheKey = Tuple[str, str, str]
+
+
+def input_signature(agent_results: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Get a signature of the inputs a ticker's insight is synthesized from.
+
+    Each agent contributes its input fingerprint, or a hash of its summary if it has none.
+    """
+    parts = sorted(
+        (agent_name, result.get("fingerprint") or hashlib.sha256(
+            str(result.get("summary", "")).encode("utf-8")
+        ).hexdigest())
+        for agent_name, result in agent_results.items()
+    )
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+class _CachedResult:
+    """Stored result of one agent run and the freshness bucket it was made in."""
+
+    def __init__(self, result: Dict[str, Any], bucket: int, stored_at: float):
+        self.result = result
+        self.bucket = bucket
+        self.stored_at = stored_at
+
+
+class AgentResultCache:
+    """
+    Results of research agent runs, shared across requests.
+
+    Entries are keyed by (agent type, ticker, query intent) and stamped with the
+    freshness bucket they were made in: time divided into windows of the agent's
+    TTL, so slow-moving sources (filings, patents) stay valid for a day while
+    price and news expire within minutes. A result is served only within its own
+    bucket; once the bucket rolls over the entry is stale and the agent runs again.
+    The newest entry per key is kept after it goes stale, so a refresh whose
+    input fingerprint is unchanged can renew it instead of re-running the agent.
+
+    Synthesized insights are kept per (ticker, intent) with the input signature
+    they were made from, so synthesis is skipped when no agent input changed. An
+    insight expires after the TTL of its most volatile input agent, so it is never
+    older than the freshness rules allow for its inputs. The least recently used
+    entries of each kind are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, ttl_seconds: Dict[str, int], default_ttl_seconds: int = 900, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.default_ttl_seconds = default_ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, _CachedResult]" = OrderedDict()
+        # (ticker, intent) -> (input signature, insight, expires at)
+        self._insights: "OrderedDict[Tuple[str, str], Tuple[str, Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "AgentResultCache":
+        """Create a cache with the per-agent TTLs from the application settings."""
+        return cls({
+            "news": settings.agent_cache_ttl_news_seconds,
+            "price": settings.agent_cache_ttl_price_seconds,
+            "earnings": settings.agent_cache_ttl_earnings_seconds,
+            "insider": settings.agent_cache_ttl_insider_seconds,
+            "filings": settings.agent_cache_ttl_filings_seconds,
+            "patents": settings.agent_cache_ttl_patents_seconds,
+        }, max_entries=settings.agent_cache_max_entries)
+
+    def ttl_for(self, agent_type: str) -> int:
+        """Get the freshness window of an agent's results in seconds."""
+        return self.ttl_seconds.get(agent_type, self.default_ttl_seconds)
+
+    def bucket_for(self, agent_type: str, now: Optional[float] = None) -> int:
+        """Get the current freshness bucket of an agent."""
+        now = time.time() if now is None else now
+        return int(now // max(self.ttl_for(agent_type), 1))
+
+    @staticmethod
+    def key(agent_type: str, ticker: str, intent: str) -> CacheKey:
+        """Get the cache key of an agent run."""
+        return agent_type, ticker.upper(), intent or "general"
+
+    def get(self, agent_type: str, ticker: str, intent: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached result that is still within its freshness bucket.
+
+        Returns:
+            Copy of the cached result with "cached" set, or None
+        """
+        key = self.key(agent_type, ticker, intent)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.bucket != self.bucket_for(agent_type):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return self._copy(entry.result, cached=True)
+
+    def get_stale(self, agent_type: str, ticker: str, intent: str) -> Optional[Dict[str, Any]]:
+        """Get the newest result for a key whatever its age (copy), or None."""
+        with self._lock:
+            entry = self._entries.get(self.key(agent_type, ticker, intent))
+        return self._copy(entry.result, cached=True) if entry else None
+
+    def renew(self, agent_type: str, ticker: str, intent: str) -> None:
+        """Move a stale entry into the current freshness bucket, e.g. after its inputs were found unchanged."""
+        with self._lock:
+            entry = self._entries.get(self.key(agent_type, ticker, intent))
+            if entry is not None:
+                entry.bucket = self.bucket_for(agent_type)
+                entry.stored_at = time.time()
+
+    def get_insight(self, ticker: str, intent: str, signature: str) -> Optional[Any]:
+        """Get the insight last synthesized for a ticker if it was made from the same inputs and has not expired."""
+        with self._lock:
+            stored = self._insights.get((ticker.upper(), intent or "general"))
+        if stored is None or stored[0] != signature or stored[2] <= time.time():
+            return None
+        return stored[1].model_copy(deep=True)
+
+    def put_insight(
+        self,
+        ticker: str,
+        intent: str,
+        signature: str,
+        insight: Any,
+        agent_types: Iterable[str] = ()
+    ) -> None:
+        """
+        Store the insight synthesized for a ticker and the signature of its inputs.
+
+        Args:
+            ticker: Ticker the insight is about
+            intent: Intent of the query it was synthesized for
+            signature: Signature of the agent inputs it was synthesized from
+            insight: Synthesized insight
+            agent_types: Agents whose results it was synthesized from; the shortest of their TTLs applies
+        """
+        ttl = min((self.ttl_for(agent_type) for agent_type in agent_types), default=self.default_ttl_seconds)
+        key = (ticker.upper(), intent or "general")
+        with self._lock:
+            self._insights[key] = (signature, insight.model_copy(deep=True), time.time() + ttl)
+            self._insights.move_to_end(key)
+            while len(self._insights) > self.max_entries:
+                self._insights.popitem(last=False)
+
+    def put(self, agent_type: str, ticker: str, intent: str, result: Dict[str, Any]) -> None:
+        """
+        Store a successful agent result.
+
+        Args:
+            agent_type: Research agent type
+            ticker: Ticker researched
+            intent: Intent of the query the agent ran for
+            result: Result with findings, sources, summary and trace
+        """
+        if "error" in result:
+            return
+        key = self.key(agent_type, ticker, intent)
+        entry = _CachedResult(self._copy(result), self.bucket_for(agent_type), time.time())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self._insights.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit, miss and size counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "insights": len(self._insights),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "ttl_seconds": dict(self.ttl_seconds),
+            }
+
+    @staticmethod
+    def _copy(result: Dict[str, Any], cached: bool = False) -> Dict[str, Any]:
+        """Copy a result so callers never mutate a cached trace or findings list."""
+        copied = dict(result)
+        if hasattr(copied.get("trace"), "model_copy"):
+            copied["trace"] = copied["trace"].model_copy(deep=True)
+        for field in ("findings", "sources"):
+            if isinstance(copied.get(field), list):
+                copied[field] = list(copied[field])
+        if cached:
+            copied["cached"] = True
+        else:
+            copied.pop("cached", None)
+        return copied
+
+
+# Global agent result cache instance
+agent_result_cache = AgentResultCache.from_settings(get_settings())
+
+
+def get_agent_result_cache() -> AgentResultCache:
+    """Get the cross-request agent result cache."""
+    return agent_result_cache
@@ -0,0 +1,186 @@
+"""
+Research Checkpoints - SQLite store of per-node research results, so retried or resumed analyses skip finished work.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+import structlog
+
+from backend.app.models import AgentTrace, TickerInsight
+from backend.config.settings import Settings, get_settings
+
+logger = structlog.get_logger()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agent_results (
+    request_id TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    agent_name TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (request_id, ticker, agent_name)
+);
+CREATE TABLE IF NOT EXISTS insights (
+    request_id TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    insight TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (request_id, ticker)
+);
+CREATE INDEX IF NOT EXISTS agent_results_created_at ON agent_results (created_at);
+CREATE INDEX IF NOT EXISTS insights_created_at ON insights (created_at);
+"""
+
+
+def _to_json(value: Any) -> Any:
+    """json.dumps hook for pydantic models (traces, sources) inside agent results."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Cannot checkpoint value of type {type(value).__name__}")
+
+
+class CheckpointStore:
+    """
+    Completed agent results and synthesized insights of research runs, keyed by request ID.
+
+    Only successful work is stored: an agent result carrying an error (failed, or
+    skipped because of the deadline) is never checkpointed, so a retry with the same
+    request ID re-runs exactly the agents that did not succeed. Rows expire after the
+    retention period; expired rows are deleted when the database is opened and then
+    on writes, at most once per `prune_interval_seconds`, so a long-running process
+    keeps the file bounded.
+    """
+
+    def __init__(self, path: str, retention_seconds: int = 86400, prune_interval_seconds: float = 60.0):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self.prune_interval_seconds = prune_interval_seconds
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pruned_at = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "CheckpointStore":
+        """Create a store using the checkpoint settings."""
+        return cls(settings.checkpoint_db_path, retention_seconds=settings.checkpoint_retention_hours * 3600)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use (caller holds the lock)."""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.executescript(_SCHEMA)
+            self._prune()
+        return self._connection
+
+    def _connect_for_write(self) -> sqlite3.Connection:
+        """Open the database for a write, pruning it if the last prune is older than the interval (caller holds the lock)."""
+        connection = self._connect()
+        if time.time() - self._pruned_at >= self.prune_interval_seconds:
+            self._prune()
+        return connection
+
+    def _prune(self) -> None:
+        """Delete expired checkpoints (caller holds the lock)."""
+        self._pruned_at = time.time()
+        cutoff = self._pruned_at - self.retention_seconds
+        with self._connection:
+            self._connection.execute("DELETE FROM agent_results WHERE created_at < ?", (cutoff,))
+            self._connection.execute("DELETE FROM insights WHERE created_at < ?", (cutoff,))
+
+    def save_agent_result(self, request_id: str, ticker: str, agent_name: str, result: Dict[str, Any]) -> None:
+        """
+        Checkpoint an agent result, unless it carries an error.
+
+        Args:
+            request_id: Analysis request identifier
+            ticker: Ticker the agent researched
+            agent_name: Research agent name
+            result: Result returned by the agent's research()
+        """
+        if not request_id or "error" in result:
+            return
+        payload = json.dumps(result, default=_to_json)
+        with self._lock:
+            connection = self._connect_for_write()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO agent_results VALUES (?, ?, ?, ?, ?)",
+                    (request_id, ticker, agent_name, payload, time.time())
+                )
+
+    def load_agent_results(self, request_id: str, ticker: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the checkpointed agent results of a ticker.
+
+        Returns:
+            Agent name -> result, with traces restored as AgentTrace objects
+        """
+        if not request_id:
+            return {}
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT agent_name, result FROM agent_results WHERE request_id = ? AND ticker = ?",
+                (request_id, ticker)
+            ).fetchall()
+
+        results = {}
+        for agent_name, payload in rows:
+            result = json.loads(payload)
+            if isinstance(result.get("trace"), dict):
+                result["trace"] = AgentTrace.model_validate(result["trace"])
+            results[agent_name] = result
+        return results
+
+    def save_insight(self, request_id: str, insight: TickerInsight) -> None:
+        """Checkpoint the synthesized insight of a ticker."""
+        if not request_id:
+            return
+        payload = insight.model_dump_json()
+        with self._lock:
+            connection = self._connect_for_write()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO insights VALUES (?, ?, ?, ?)",
+                    (request_id, insight.ticker, payload, time.time())
+                )
+
+    def load_insight(self, request_id: str, ticker: str) -> Optional[TickerInsight]:
+        """Get the checkpointed insight of a ticker, if any."""
+        if not request_id:
+            return None
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT insight FROM insights WHERE request_id = ? AND ticker = ?",
+                (request_id, ticker)
+            ).fetchone()
+        return TickerInsight.model_validate_json(row[0]) if row else None
+
+    def delete(self, request_id: str) -> None:
+        """Delete every checkpoint of a request."""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM agent_results WHERE request_id = ?", (request_id,))
+                connection.execute("DELETE FROM insights WHERE request_id = ?", (request_id,))
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+# Global checkpoint store instance
+checkpoint_store = CheckpointStore.from_settings(get_settings())
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """Get the research checkpoint store."""
+    return checkpoint_store
@@ -0,0 +1,186 @@
+"""
+Analysis Event Stream - Per-request event channels for pushing progress and partial insights to clients.
+"""
+import asyncio
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import structlog
+
+logger = structlog.get_logger()
+
+# Events after which no further events are published for a request
+TERMINAL_EVENTS = {"complete", "error", "cancelled"}
+
+# Streamed text deltas; the only events dropped when a request's history is full
+EVICTABLE_EVENTS = {"token"}
+
+
+class _Channel:
+    """Event history and live subscribers for a single analysis request."""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+        self.next_id = 1
+        self.closed = False
+        self.updated_at = time.time()
+
+
+class AnalysisEventBus:
+    """
+    In-process publish/subscribe bus keyed by request ID.
+
+    Publishing is thread-safe and never blocks, so it can be called from LLM streaming
+    callbacks. Events are kept for a while after publication, which lets a client
+    subscribe before or after the analysis starts and still see every event. Beyond
+    `max_events_per_request` the oldest token events are dropped; state events
+    (started, agent_completed, field, insight, ...) are always kept, so a late or
+    resuming subscriber can rebuild the analysis state.
+    """
+
+    def __init__(self, max_events_per_request: int = 2000, retention_seconds: int = 600):
+        self.max_events_per_request = max_events_per_request
+        self.retention_seconds = retention_seconds
+        self._channels: Dict[str, _Channel] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, request_id: str, event: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Publish an event for a request.
+
+        Args:
+            request_id: Analysis request identifier
+            event: Event name (e.g. "agent_completed", "field", "token", "complete")
+            data: JSON-serializable event payload
+        """
+        if not request_id:
+            return
+
+        with self._lock:
+            self._prune()
+            channel = self._channels.setdefault(request_id, _Channel())
+            if channel.closed:
+                return
+
+            message = {"id": channel.next_id, "event": event, "data": data or {}}
+            channel.next_id += 1
+            channel.updated_at = time.time()
+            channel.events.append(message)
+            if len(channel.events) > self.max_events_per_request:
+                self._evict(channel)
+            if event in TERMINAL_EVENTS:
+                channel.closed = True
+
+            subscribers = list(channel.subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                # Subscriber's event loop has already shut down
+                pass
+
+    async def subscribe(
+        self,
+        request_id: str,
+        last_event_id: int = 0,
+        heartbeat_seconds: Optional[float] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Iterate over the events of a request, replaying any already published.
+
+        Args:
+            request_id: Analysis request identifier
+            last_event_id: Skip events up to and including this ID (for reconnects)
+            heartbeat_seconds: If set, yield None whenever no event arrives for this long
+
+        Yields:
+            Event dictionaries with id, event and data keys; iteration ends after a terminal event
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        with self._lock:
+            self._prune()
+            channel = self._channels.setdefault(request_id, _Channel())
+            channel.updated_at = time.time()
+            backlog = [message for message in channel.events if message["id"] > last_event_id]
+            closed = channel.closed
+            if not closed:
+                channel.subscribers.append((loop, queue))
+
+        try:
+            for message in backlog:
+                yield message
+                if message["event"] in TERMINAL_EVENTS:
+                    return
+
+            if closed:
+                return
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+
+                yield message
+                if message["event"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            with self._lock:
+                if (loop, queue) in channel.subscribers:
+                    channel.subscribers.remove((loop, queue))
+
+    def has_events(self, request_id: str) -> bool:
+        """Whether anything was ever published for a request (within the retention window)."""
+        with self._lock:
+            channel = self._channels.get(request_id)
+            return channel is not None and (bool(channel.events) or channel.closed)
+
+    @staticmethod
+    def _evict(channel: _Channel) -> None:
+        """Drop the oldest evictable event of a full channel (caller holds the lock)."""
+        for index, message in enumerate(channel.events):
+            if message["event"] in EVICTABLE_EVENTS:
+                del channel.events[index]
+                return
+
+    def _prune(self) -> None:
+        """Drop channels that have not been touched within the retention window."""
+        cutoff = time.time() - self.retention_seconds
+        expired = [
+            request_id for request_id, channel in self._channels.items()
+            if channel.updated_at < cutoff and not channel.subscribers
+        ]
+        for request_id in expired:
+            del self._channels[request_id]
+
+
+def format_sse(message: Optional[Dict[str, Any]]) -> str:
+    """
+    Format an event as a Server-Sent Events frame.
+
+    Args:
+        message: Event from AnalysisEventBus.subscribe, or None for a keep-alive
+
+    Returns:
+        SSE frame text
+    """
+    if message is None:
+        return ": keep-alive\n\n"
+
+    data = json.dumps(message["data"], default=str)
+    return f"id: {message['id']}\nevent: {message['event']}\ndata: {data}\n\n"
+
+
+# Global event bus instance
+event_bus = AnalysisEventBus()
+
+
+def get_event_bus() -> AnalysisEventBus:
+    """Get the analysis event bus."""
+    return event_bus
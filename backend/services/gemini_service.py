@@ -1,27 +1,79 @@
 """
 Improved Gemini AI Service - Enhanced prompts for detailed, specific analysis.
 """
+import asyncio
 import google.generativeai as genai
-import json
 import os
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, AsyncIterator, Optional, Callable, Tuple
 import structlog
 from dotenv import load_dotenv
 
+from backend.config.settings import get_settings
+from backend.services.model_router import ModelRouter, STANDARD, TIERS, get_model_router
+from backend.services.scheduler import get_scheduler
+from backend.utils.circuit_breaker import get_breaker
+from backend.utils.resilience import (
+    DeadlineExceeded, LatencyTracker, ResiliencePolicy, has_time_for, within_deadline
+)
+from backend.utils.structured_output import IncrementalJSONParser, schema_errors
+from backend.utils.token_budget import CHARS_PER_TOKEN, estimate_tokens
+
 load_dotenv()
 
 logger = structlog.get_logger()
 
+# Callback invoked with (field_name, value) as soon as a top-level response field closes
+FieldCallback = Callable[[str, Any], None]
+
+# Callback invoked with (field_name, text_delta) while a top-level string field is streaming
+TokenCallback = Callable[[str, str], None]
+
+NEWS_SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "sentiment": {"type": "string"},
+        "key_points": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["summary", "sentiment", "key_points"]
+}
+
+INVESTMENT_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rationale": {"type": "string"},
+        "key_drivers": {"type": "array", "items": {"type": "string"}},
+        "risks": {"type": "array", "items": {"type": "string"}},
+        "catalysts": {"type": "array", "items": {"type": "string"}},
+        "stance": {"type": "string"},
+        "confidence": {"type": "string"},
+        "confidence_rationale": {"type": "string"}
+    },
+    "required": ["rationale", "key_drivers", "risks", "catalysts", "stance", "confidence", "confidence_rationale"]
+}
+
+SUPPORT_RESISTANCE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "support_levels": {"type": "array", "items": {"type": "number"}},
+        "resistance_levels": {"type": "array", "items": {"type": "number"}},
+        "technical_summary": {"type": "string"}
+    },
+    "required": ["support_levels", "resistance_levels", "technical_summary"]
+}
+
 
 class GeminiService:
     """Service for interacting with Google's Gemini AI API with enhanced prompts."""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, router: Optional[ModelRouter] = None):
         """
         Initialize Gemini service.
         
         Args:
             api_key: Gemini API key (defaults to GEMINI_API_KEY env var)
+            router: Model router choosing the model tier per task (defaults to the global router)
         """
         self.api_key = api_key or os.getenv('GEMINI_API_KEY') 
 
@@ -29,15 +81,189 @@ class GeminiService:
             logger.warning("GEMINI_API_KEY not found, some features may not work")
         
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self.settings = get_settings()
+        self.router = router or get_model_router()
+        self.models = {tier: genai.GenerativeModel(self.router.model_for(tier)) for tier in TIERS}
+        self.resilience = ResiliencePolicy.for_llm(self.settings)
+        self.scheduler = get_scheduler()
+        self.breaker = get_breaker("gemini")
+        self.first_chunk_latency = {tier: LatencyTracker() for tier in TIERS}
+    
+    async def _generate_json(
+        self,
+        prompt: str,
+        schema: Dict[str, Any],
+        on_field: Optional[FieldCallback] = None,
+        on_token: Optional[TokenCallback] = None,
+        tier: str = STANDARD
+    ) -> Dict[str, Any]:
+        """
+        Generate a schema-constrained JSON response, parsing it while it streams.
+        
+        Args:
+            prompt: Prompt to send
+            schema: Response schema the model output is constrained to
+            on_field: Optional callback for each top-level field as soon as it closes
+            on_token: Optional callback for streamed text of string fields still being generated
+            tier: Model tier to run the call on
+            
+        Returns:
+            Parsed response object
+            
+        Raises:
+            ValueError: If the response is incomplete or does not match the schema
+            DeadlineExceeded: If the call cannot finish before the request deadline
+        """
+        expected_seconds = self.expected_seconds(tier)
+        if not has_time_for(expected_seconds):
+            raise DeadlineExceeded(f"Skipping {tier} call, it usually takes {expected_seconds:.1f}s")
+        
+        start_time = time.time()
+        usage = None
+        output_chars = 0
+        success = False
+        parser = IncrementalJSONParser()
+        
+        async def consume() -> None:
+            nonlocal usage, output_chars
+            # Hedge and retry on time to first chunk; once text streams in, the attempt is kept
+            first_chunk, chunks = await self.resilience.call(
+                lambda: self._open_stream(tier, prompt, schema),
+                self.first_chunk_latency[tier],
+                name=f"gemini:{tier}"
+            )
+            
+            streamed_lengths: Dict[str, int] = {}
+            async for chunk in self._iterate_stream(first_chunk, chunks):
+                text = self._chunk_text(chunk)
+                output_chars += len(text)
+                usage = self._usage_tokens(chunk) or usage
+                for key, value in parser.feed(text):
+                    if on_field:
+                        on_field(key, value)
+                
+                partial = parser.partial_field() if on_token else None
+                if partial:
+                    key, text = partial
+                    sent = streamed_lengths.get(key, 0)
+                    if len(text) > sent:
+                        on_token(key, text[sent:])
+                        streamed_lengths[key] = len(text)
+        
+        try:
+            await within_deadline(consume(), name=f"gemini:{tier}")
+            
+            result = parser.result()
+            errors = schema_errors(result, schema)
+            if errors:
+                raise ValueError(f"Response did not match schema: {'; '.join(errors)}")
+            
+            success = True
+            return result
+        
+        finally:
+            input_tokens, output_tokens = usage or (estimate_tokens(prompt), output_chars // CHARS_PER_TOKEN)
+            self.router.record(
+                tier,
+                latency_ms=(time.time() - start_time) * 1000,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                success=success
+            )
+    
+    def expected_seconds(self, tier: str) -> float:
+        """
+        Get the time a call on a tier should be given before it is started.
+        
+        Uses the tier's median latency once calls have been recorded, and never less
+        than the configured minimum stage budget.
+        """
+        median_ms = self.router.latency_percentile(tier, 50)
+        minimum = self.settings.deadline_min_stage_seconds
+        return max(median_ms / 1000, minimum) if median_ms is not None else minimum
+    
+    async def _open_stream(
+        self,
+        tier: str,
+        prompt: str,
+        schema: Dict[str, Any]
+    ) -> Tuple[Any, AsyncIterator[Any]]:
+        """
+        Start a streamed generation and wait for its first chunk, through the Gemini circuit breaker.
+        
+        Returns:
+            Tuple of (first chunk or None for an empty stream, iterator over the remaining chunks)
+        """
+        self.breaker.before_call()
+        try:
+            await self.scheduler.acquire("gemini")
+            response = await self.models[tier].generate_content_async(
+                prompt,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "response_schema": schema
+                },
+                stream=True
+            )
+            
+            chunks = response.__aiter__()
+            try:
+                first_chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                first_chunk = None
+        except asyncio.CancelledError:
+            # Lost a hedge race or the request was abandoned: not an upstream failure
+            self.breaker.record_abandoned()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        
+        self.breaker.record_success()
+        return first_chunk, chunks
+    
+    @staticmethod
+    async def _iterate_stream(first_chunk: Any, chunks: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """Iterate over a stream opened by _open_stream."""
+        if first_chunk is None:
+            return
+        yield first_chunk
+        async for chunk in chunks:
+            yield chunk
+    
+    @staticmethod
+    def _usage_tokens(chunk: Any) -> Optional[Tuple[int, int]]:
+        """Get (prompt, output) token counts reported on a streamed chunk, if any."""
+        usage = getattr(chunk, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None)
+        output_tokens = getattr(usage, "candidates_token_count", None)
+        if isinstance(prompt_tokens, int) and isinstance(output_tokens, int) and prompt_tokens:
+            return prompt_tokens, output_tokens
+        return None
+    
+    @staticmethod
+    def _chunk_text(chunk: Any) -> str:
+        """Get the text of a streamed chunk (chunks without parts carry no text)."""
+        try:
+            return chunk.text or ""
+        except ValueError:
+            return ""
     
-    def summarize_news(self, ticker: str, news_articles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def summarize_news(
+        self,
+        ticker: str,
+        news_articles: List[Dict[str, Any]],
+        on_field: Optional[FieldCallback] = None,
+        on_token: Optional[TokenCallback] = None
+    ) -> Dict[str, Any]:
         """
         Summarize news articles using Gemini with enhanced prompts.
         
         Args:
             ticker: Stock ticker symbol
             news_articles: List of news articles
+            on_field: Optional callback for each response field as soon as it is complete
+            on_token: Optional callback for text of response fields as it streams
             
         Returns:
             Dictionary containing summary, sentiment, and key points
@@ -81,16 +307,10 @@ Provide your analysis in JSON format:
 Respond with ONLY the JSON, no additional text."""
         
         try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Extract JSON from response
-            if '```json' in result_text:
-                result_text = result_text.split('```json')[1].split('```')[0].strip()
-            elif '```' in result_text:
-                result_text = result_text.split('```')[1].split('```')[0].strip()
-            
-            result = json.loads(result_text)
+            result = await self._generate_json(
+                prompt, NEWS_SUMMARY_SCHEMA, on_field, on_token,
+                tier=self.router.tier_for("news_summary")
+            )
             logger.info(f"Successfully summarized news for {ticker}")
             return result
             
@@ -103,13 +323,15 @@ Respond with ONLY the JSON, no additional text."""
                 'key_points': [article['title'] for article in news_articles[:5]]
             }
     
-    def generate_investment_analysis(
+    async def generate_investment_analysis(
         self,
         ticker: str,
         company_name: str,
         news_summary: Dict[str, Any],
         price_data: Dict[str, Any],
-        financial_metrics: Dict[str, Any]
+        financial_metrics: Dict[str, Any],
+        on_field: Optional[FieldCallback] = None,
+        on_token: Optional[TokenCallback] = None
     ) -> Dict[str, Any]:
         """
         Generate comprehensive investment analysis using Gemini with enhanced prompts.
@@ -120,6 +342,8 @@ Respond with ONLY the JSON, no additional text."""
             news_summary: Summarized news data
             price_data: Price and technical data
             financial_metrics: Financial metrics
+            on_field: Optional callback for each response field as soon as it is complete
+            on_token: Optional callback for text of response fields as it streams
             
         Returns:
             Dictionary containing detailed investment analysis
@@ -244,16 +468,7 @@ Provide your analysis in JSON format:
 Respond with ONLY the JSON, no additional text."""
         
         try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Extract JSON from response
-            if '```json' in result_text:
-                result_text = result_text.split('```json')[1].split('```')[0].strip()
-            elif '```' in result_text:
-                result_text = result_text.split('```')[1].split('```')[0].strip()
-            
-            result = json.loads(result_text)
+            result = await self._generate_analysis_with_escalation(ticker, prompt, on_field, on_token)
             logger.info(f"Successfully generated investment analysis for {ticker}")
             return result
             
@@ -319,13 +534,58 @@ Respond with ONLY the JSON, no additional text."""
                 'confidence_rationale': f'Confidence level is {confidence} based on the {trend} price trend, {sentiment} news sentiment, and {abs(price_change):.1f}% price movement. The analysis incorporates available financial metrics {revenue_growth_text}, though some uncertainty remains regarding near-term catalysts and market conditions.'
             }
     
-    def analyze_support_resistance(self, ticker: str, price_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _generate_analysis_with_escalation(
+        self,
+        ticker: str,
+        prompt: str,
+        on_field: Optional[FieldCallback] = None,
+        on_token: Optional[TokenCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate the investment analysis, escalating to a stronger model when needed.
+        
+        The first pass runs on the synthesis tier. It is repeated on the next stronger
+        tier only if the response fails the schema check or reports low confidence.
+        Fields of the second pass replace those of the first, but its text is not
+        streamed token by token again.
+        """
+        tier = self.router.tier_for("investment_analysis")
+        stronger_tier = self.router.escalation_tier(tier)
+        if not self.settings.synthesis_escalation_enabled:
+            stronger_tier = None
+        
+        try:
+            result = await self._generate_json(prompt, INVESTMENT_ANALYSIS_SCHEMA, on_field, on_token, tier=tier)
+        except ValueError as e:
+            if not stronger_tier:
+                raise
+            self.router.record_escalation(tier, reason=str(e))
+            return await self._generate_json(prompt, INVESTMENT_ANALYSIS_SCHEMA, on_field, tier=stronger_tier)
+        
+        if stronger_tier and str(result.get('confidence', '')).lower() == 'low':
+            self.router.record_escalation(tier, reason="low confidence")
+            try:
+                return await self._generate_json(prompt, INVESTMENT_ANALYSIS_SCHEMA, on_field, tier=stronger_tier)
+            except Exception as e:
+                logger.warning(f"Escalated analysis failed for {ticker}, keeping first pass", error=str(e))
+        
+        return result
+    
+    async def analyze_support_resistance(
+        self,
+        ticker: str,
+        price_data: Dict[str, Any],
+        on_field: Optional[FieldCallback] = None,
+        on_token: Optional[TokenCallback] = None
+    ) -> Dict[str, Any]:
         """
         Analyze support and resistance levels using Gemini.
         
         Args:
             ticker: Stock ticker symbol
             price_data: Price history data
+            on_field: Optional callback for each response field as soon as it is complete
+            on_token: Optional callback for text of response fields as it streams
             
         Returns:
             Dictionary containing support/resistance analysis
@@ -352,16 +612,10 @@ Provide technical analysis in JSON format:
 Respond with ONLY the JSON, no additional text."""
         
         try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Extract JSON from response
-            if '```json' in result_text:
-                result_text = result_text.split('```json')[1].split('```')[0].strip()
-            elif '```' in result_text:
-                result_text = result_text.split('```')[1].split('```')[0].strip()
-            
-            result = json.loads(result_text)
+            result = await self._generate_json(
+                prompt, SUPPORT_RESISTANCE_SCHEMA, on_field, on_token,
+                tier=self.router.tier_for("support_resistance")
+            )
             logger.info(f"Successfully analyzed support/resistance for {ticker}")
             return result
             
@@ -0,0 +1,315 @@
+"""
+LLM Gateway - Single entry point for chat model calls, with Gemini context caching of stable prompt prefixes.
+"""
+import asyncio
+import hashlib
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import structlog
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from backend.config.settings import get_settings
+from backend.services.model_router import ModelRouter, get_model_router
+from backend.services.scheduler import UpstreamScheduler, get_scheduler
+from backend.utils.circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+from backend.utils.resilience import DeadlineExceeded, LatencyTracker, ResiliencePolicy
+from backend.utils.token_budget import estimate_tokens
+
+logger = structlog.get_logger()
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    # Errors the provider returns for a cached content handle it no longer accepts
+    CACHE_REJECTION_ERRORS: Tuple[type, ...] = (
+        google_exceptions.NotFound,
+        google_exceptions.InvalidArgument,
+        google_exceptions.FailedPrecondition,
+        google_exceptions.PermissionDenied,
+    )
+except ImportError:
+    CACHE_REJECTION_ERRORS = ()
+
+
+def is_cache_rejection(error: Exception) -> bool:
+    """
+    Whether a cached call failed because of the cache itself (missing, expired or unsupported).
+
+    Chat model wrappers may re-raise provider errors as generic exceptions, so the
+    message is checked as well. An open breaker, a passed deadline (or a cancelled
+    request) and a timeout are never cache rejections.
+    """
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded, asyncio.TimeoutError)):
+        return False
+    if isinstance(error, CACHE_REJECTION_ERRORS):
+        return True
+    message = str(error).lower()
+    return "cache" in message or "cached_content" in message
+
+
+class _CacheEntry:
+    """Handle of a provider-side cached prompt prefix."""
+
+    def __init__(self, name: Optional[str], expires_at: float, tokens: int):
+        self.name = name
+        self.expires_at = expires_at
+        self.tokens = tokens
+
+
+class ContextCache:
+    """
+    Lifecycle of Gemini explicit context caches, keyed by a hash of the prefix text.
+
+    A cache is created the first time a prefix is seen, reused until shortly before
+    its TTL runs out, and then recreated. Prefixes below the provider's minimum size,
+    or that fail to register, are remembered as uncacheable for one TTL period so the
+    creation call is not retried on every request.
+    """
+
+    # Stop using a handle this long before it expires, so in-flight calls don't race the TTL
+    REFRESH_MARGIN_SECONDS = 60
+
+    def __init__(self, model_name: str, ttl_seconds: int = 3600, min_tokens: int = 1024):
+        self.model_name = model_name
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def prefix_key(prefix: str) -> str:
+        """Get the cache key of a prompt prefix."""
+        return hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+    async def get_handle(self, prefix: str) -> Optional[str]:
+        """
+        Get the name of a cached content resource holding the prefix, creating it if needed.
+
+        Args:
+            prefix: Stable prompt prefix (sent as the system instruction)
+
+        Returns:
+            Cached content name, or None if the prefix is not cached
+        """
+        key = self.prefix_key(prefix)
+        entry = self._entries.get(key)
+        if entry and entry.expires_at > time.time():
+            return entry.name
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if entry and entry.expires_at > time.time():
+                return entry.name
+
+            tokens = estimate_tokens(prefix)
+            name = None
+            if tokens >= self.min_tokens:
+                name = await self._create(prefix)
+
+            retry_after = self.ttl_seconds - self.REFRESH_MARGIN_SECONDS
+            self._entries[key] = _CacheEntry(name, time.time() + max(retry_after, 1), tokens)
+            return name
+
+    def invalidate(self, prefix: str) -> None:
+        """Forget the handle of a prefix, e.g. after the provider rejected it."""
+        self._entries.pop(self.prefix_key(prefix), None)
+
+    async def close(self) -> None:
+        """Delete every cache created by this instance."""
+        names = [entry.name for entry in self._entries.values() if entry.name]
+        self._entries.clear()
+        for name in names:
+            try:
+                await asyncio.to_thread(self._delete, name)
+            except Exception as e:
+                logger.warning("Failed to delete context cache", cache=name, error=str(e))
+
+    async def _create(self, prefix: str) -> Optional[str]:
+        """Register a prefix with Gemini explicit context caching."""
+        try:
+            from google.generativeai import caching
+        except ImportError:
+            logger.warning("Context caching not supported by installed google-generativeai")
+            return None
+
+        try:
+            cached = await asyncio.to_thread(
+                caching.CachedContent.create,
+                model=f"models/{self.model_name}",
+                system_instruction=prefix,
+                ttl=timedelta(seconds=self.ttl_seconds)
+            )
+        except Exception as e:
+            logger.warning("Failed to create context cache", model=self.model_name, error=str(e))
+            return None
+
+        logger.info("Created context cache", model=self.model_name, cache=cached.name)
+        return cached.name
+
+    @staticmethod
+    def _delete(name: str) -> None:
+        from google.generativeai import caching
+        caching.CachedContent.get(name).delete()
+
+
+class LLMGateway:
+    """
+    Wraps a chat model so that every call goes through one place.
+
+    Callers put the byte-stable part of a prompt (system prompt, tool descriptions,
+    output format) in a leading SystemMessage and the per-call part after it. When
+    context caching is enabled and the prefix is large enough, the SystemMessage is
+    replaced by a reference to a provider-side cache and only the suffix is sent.
+
+    Calls are hedged and retried according to the gateway's resilience policy, and
+    fail fast without reaching the provider while its circuit breaker is open.
+    """
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        model_name: str,
+        context_cache: Optional[ContextCache] = None,
+        tier: Optional[str] = None,
+        router: Optional[ModelRouter] = None,
+        resilience: Optional[ResiliencePolicy] = None,
+        scheduler: Optional[UpstreamScheduler] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.llm = llm
+        self.model_name = model_name
+        self.context_cache = context_cache
+        self.tier = tier
+        self.router = router
+        # Without a policy every call is made exactly once
+        self.resilience = resilience or ResiliencePolicy(hedging_enabled=False, max_attempts=1)
+        self.latency = LatencyTracker()
+        self.scheduler = scheduler
+        self.breaker = breaker
+        self.stats = {"calls": 0, "cached_calls": 0, "cached_prefix_tokens": 0}
+
+    async def ainvoke(self, messages: List[BaseMessage], **kwargs: Any) -> Any:
+        """
+        Invoke the chat model, using a cached prefix when one is available.
+
+        Args:
+            messages: Prompt messages, stable SystemMessage first
+            **kwargs: Extra arguments passed through to the chat model
+
+        Returns:
+            Model response message
+
+        Raises:
+            Exception: Whatever the model call failed with; only a rejected cache is retried with the full prompt
+        """
+        self.stats["calls"] += 1
+        start_time = time.time()
+        response = None
+
+        try:
+            # Gemini does not accept tool declarations alongside cached content, so tool calls send the full prompt
+            if self.context_cache and messages and isinstance(messages[0], SystemMessage) and "tools" not in kwargs:
+                prefix = messages[0].content
+                handle = await self.context_cache.get_handle(prefix)
+                if handle:
+                    try:
+                        response = await self._call(messages[1:], cached_content=handle, **kwargs)
+                        self.stats["cached_calls"] += 1
+                        self.stats["cached_prefix_tokens"] += estimate_tokens(prefix)
+                        return response
+                    except Exception as e:
+                        # Anything but a rejected cache would fail the full prompt too
+                        if not is_cache_rejection(e):
+                            raise
+                        logger.warning("Cached call failed, resending full prompt", cache=handle, error=str(e))
+                        self.context_cache.invalidate(prefix)
+
+            response = await self._call(messages, **kwargs)
+            return response
+        finally:
+            self._record(messages, response, start_time)
+
+    async def _call(self, messages: List[BaseMessage], **kwargs: Any) -> Any:
+        """Call the chat model with hedging and retries, each attempt admitted by the breaker and scheduler."""
+        async def invoke() -> Any:
+            if self.breaker:
+                self.breaker.before_call()
+            try:
+                if self.scheduler:
+                    await self.scheduler.acquire("gemini")
+                response = await self.llm.ainvoke(messages, **kwargs)
+            except asyncio.CancelledError:
+                # Lost a hedge race or the request was abandoned: not an upstream failure
+                if self.breaker:
+                    self.breaker.record_abandoned()
+                raise
+            except Exception:
+                if self.breaker:
+                    self.breaker.record_failure()
+                raise
+            if self.breaker:
+                self.breaker.record_success()
+            return response
+
+        return await self.resilience.call(invoke, self.latency, name=f"llm:{self.model_name}")
+
+    def _record(self, messages: List[BaseMessage], response: Any, start_time: float) -> None:
+        """Record latency and token usage of a call with the model router."""
+        if not (self.router and self.tier):
+            return
+
+        usage = getattr(response, "usage_metadata", None)
+        if isinstance(usage, dict) and usage.get("input_tokens"):
+            input_tokens = usage["input_tokens"]
+            output_tokens = usage.get("output_tokens", 0)
+        else:
+            input_tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+            output_tokens = estimate_tokens(str(getattr(response, "content", "") or ""))
+
+        self.router.record(
+            self.tier,
+            latency_ms=(time.time() - start_time) * 1000,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            success=response is not None
+        )
+
+    async def aclose(self) -> None:
+        """Release provider-side resources held by the gateway."""
+        if self.context_cache:
+            await self.context_cache.close()
+
+
+def create_gateway(llm: BaseChatModel, model_name: str, tier: Optional[str] = None) -> LLMGateway:
+    """
+    Create a gateway for a chat model using the context cache settings.
+
+    Args:
+        llm: Chat model to wrap
+        model_name: Gemini model name the chat model calls
+        tier: Model tier of the chat model, for per-tier stats in the model router
+
+    Returns:
+        Configured LLM gateway
+    """
+    settings = get_settings()
+    context_cache = None
+    if settings.context_cache_enabled:
+        context_cache = ContextCache(
+            model_name,
+            ttl_seconds=settings.context_cache_ttl_seconds,
+            min_tokens=settings.context_cache_min_tokens
+        )
+    return LLMGateway(
+        llm,
+        model_name,
+        context_cache,
+        tier=tier,
+        router=get_model_router(),
+        resilience=ResiliencePolicy.for_llm(settings),
+        scheduler=get_scheduler(),
+        breaker=get_breaker("gemini")
+    )
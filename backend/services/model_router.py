@@ -0,0 +1,160 @@
+"""
+Model Router - Tiered model selection per task, with per-tier latency, token and cost accounting.
+"""
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+import structlog
+
+from backend.config.settings import Settings, get_settings
+
+logger = structlog.get_logger()
+
+# Model tiers, cheapest first
+FAST = "fast"
+STANDARD = "standard"
+STRONG = "strong"
+TIERS = [FAST, STANDARD, STRONG]
+
+# Tier used for each kind of LLM call
+TASK_TIERS = {
+    "news_summary": FAST,
+    "support_resistance": FAST,
+    "reasoning": FAST,
+    "summary": FAST,
+    "investment_analysis": STANDARD,
+    "synthesis": STANDARD,
+}
+
+# USD per million (input, output) tokens, used for cost estimates in the stats
+MODEL_PRICING = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+
+class _TierStats:
+    """Running counters for one model tier."""
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.failures = 0
+        self.escalations = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self.latencies_ms: Deque[float] = deque(maxlen=window)
+
+
+class ModelRouter:
+    """
+    Maps tasks to model tiers and records how each tier performs.
+
+    High-volume calls go to the fast tier; synthesis starts on the standard tier
+    and is escalated to the strong tier only when its first answer is unusable.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None, latency_window: int = 200):
+        settings = settings or get_settings()
+        self.tier_models = {
+            FAST: settings.model_fast,
+            STANDARD: settings.model_standard,
+            STRONG: settings.model_strong,
+        }
+        self._stats = {tier: _TierStats(latency_window) for tier in TIERS}
+        self._lock = threading.Lock()
+
+    def tier_for(self, task: str) -> str:
+        """Get the tier a task runs on (standard for unknown tasks)."""
+        return TASK_TIERS.get(task, STANDARD)
+
+    def model_for(self, tier: str) -> str:
+        """Get the model name configured for a tier."""
+        return self.tier_models[tier]
+
+    def escalation_tier(self, tier: str) -> Optional[str]:
+        """Get the next stronger tier, or None if the tier is already the strongest."""
+        index = TIERS.index(tier)
+        return TIERS[index + 1] if index + 1 < len(TIERS) else None
+
+    def record(
+        self,
+        tier: str,
+        latency_ms: float,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        success: bool = True
+    ) -> None:
+        """
+        Record the outcome of one model call.
+
+        Args:
+            tier: Tier the call ran on
+            latency_ms: Wall-clock latency of the call
+            input_tokens: Prompt tokens
+            output_tokens: Generated tokens
+            success: Whether the call produced a usable response
+        """
+        input_price, output_price = MODEL_PRICING.get(self.tier_models[tier], (0.0, 0.0))
+        with self._lock:
+            stats = self._stats[tier]
+            stats.calls += 1
+            stats.failures += 0 if success else 1
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cost_usd += (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+            stats.latencies_ms.append(latency_ms)
+
+    def record_escalation(self, from_tier: str, reason: str) -> None:
+        """Record that a call on a tier was escalated to a stronger one."""
+        with self._lock:
+            self._stats[from_tier].escalations += 1
+        logger.info("Escalating to stronger model", from_tier=from_tier, reason=reason)
+
+    def latency_percentile(self, tier: str, percentile: float) -> Optional[float]:
+        """
+        Get a latency percentile over the recent calls of a tier.
+
+        Args:
+            tier: Model tier
+            percentile: Percentile between 0 and 100
+
+        Returns:
+            Latency in milliseconds, or None if no calls were recorded yet
+        """
+        with self._lock:
+            latencies = sorted(self._stats[tier].latencies_ms)
+        if not latencies:
+            return None
+        index = min(int(len(latencies) * percentile / 100), len(latencies) - 1)
+        return latencies[index]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get per-tier call, latency, token and cost statistics."""
+        result = {}
+        for tier in TIERS:
+            with self._lock:
+                stats = self._stats[tier]
+                snapshot = {
+                    "model": self.tier_models[tier],
+                    "calls": stats.calls,
+                    "failures": stats.failures,
+                    "escalations": stats.escalations,
+                    "input_tokens": stats.input_tokens,
+                    "output_tokens": stats.output_tokens,
+                    "cost_usd": round(stats.cost_usd, 6),
+                }
+            snapshot["latency_p50_ms"] = self.latency_percentile(tier, 50)
+            snapshot["latency_p95_ms"] = self.latency_percentile(tier, 95)
+            result[tier] = snapshot
+        return result
+
+
+# Global model router instance
+model_router = ModelRouter()
+
+
+def get_model_router() -> ModelRouter:
+    """Get the model router."""
+    return model_router
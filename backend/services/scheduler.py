@@ -0,0 +1,274 @@
+"""
+Upstream Scheduler - Token-bucket rate limiting per upstream with priority classes and fair sharing.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+import structlog
+
+from backend.config.settings import Settings, get_settings
+
+logger = structlog.get_logger()
+
+
+class Priority(IntEnum):
+    """Scheduling classes; lower values are served first."""
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+# Priority class and caller of the work running in the current context
+_current_priority: ContextVar[Priority] = ContextVar("scheduler_priority", default=Priority.INTERACTIVE)
+_current_caller: ContextVar[str] = ContextVar("scheduler_caller", default="")
+
+
+@contextmanager
+def scheduling_scope(priority: Priority, caller: str) -> Iterator[None]:
+    """
+    Set the priority class and caller used by upstream calls inside the block.
+
+    Args:
+        priority: Scheduling class of the work
+        caller: Caller identity used for fair sharing (e.g. the analysis request ID)
+    """
+    priority_token = _current_priority.set(priority)
+    caller_token = _current_caller.set(caller)
+    try:
+        yield
+    finally:
+        _current_caller.reset(caller_token)
+        _current_priority.reset(priority_token)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at a fixed rate."""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self) -> None:
+        """Add the tokens accrued since the last update."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def wait_time(self, level: float) -> float:
+        """Seconds until the bucket holds at least `level` tokens."""
+        self.refill()
+        if self.tokens >= level:
+            return 0.0
+        return (level - self.tokens) / self.rate_per_second
+
+
+class _Upstream:
+    """Bucket, wait queues and counters of one upstream."""
+
+    def __init__(self, name: str, requests_per_minute: int, burst: int, batch_reserve: float):
+        self.name = name
+        self.bucket = TokenBucket(requests_per_minute / 60.0, max(burst, 1))
+        # Tokens batch work must leave in the bucket, so interactive arrivals rarely wait
+        self.batch_reserve = batch_reserve * self.bucket.capacity
+        # Per priority: caller -> FIFO of (cost, future); callers are served round-robin
+        self.queues: Dict[Priority, "OrderedDict[str, Deque[Tuple[float, asyncio.Future]]]"] = {
+            priority: OrderedDict() for priority in Priority
+        }
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.granted = {priority: 0 for priority in Priority}
+        self.waited_seconds = {priority: 0.0 for priority in Priority}
+
+    def has_waiters(self) -> bool:
+        """Whether any caller is still waiting."""
+        return self.next_waiter() is not None
+
+    def required_level(self, priority: Priority, cost: float) -> float:
+        """Tokens the bucket must hold before a call of this class and cost is admitted."""
+        reserve = self.batch_reserve if priority == Priority.BATCH else 0.0
+        return min(cost + reserve, self.bucket.capacity)
+
+    def next_waiter(self) -> Optional[Tuple[Priority, str]]:
+        """Get the priority and caller of the next waiter: best class, then round-robin."""
+        for priority in Priority:
+            queue = self.queues[priority]
+            while queue:
+                caller, waiters = next(iter(queue.items()))
+                while waiters and waiters[0][1].done():
+                    waiters.popleft()
+                if waiters:
+                    return priority, caller
+                del queue[caller]
+        return None
+
+
+class UpstreamScheduler:
+    """
+    Admission control for calls to rate-limited upstreams (Gemini key, Yahoo host, SEC).
+
+    Each upstream has a token bucket sized from its per-minute quota. Callers that
+    find the bucket empty wait in a queue per priority class: interactive work is
+    always served before batch work, and batch work may not dig into a small reserve
+    of tokens kept for interactive arrivals. Within a class, waiting callers are
+    served round-robin so one large job cannot starve the others.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[int, int]], batch_reserve: float = 0.2):
+        """
+        Args:
+            limits: Upstream name -> (requests per minute, burst size)
+            batch_reserve: Fraction of each bucket reserved for interactive work
+        """
+        self._upstreams = {
+            name: _Upstream(name, rpm, burst, batch_reserve)
+            for name, (rpm, burst) in limits.items()
+        }
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "UpstreamScheduler":
+        """Create a scheduler with the upstream quotas from the application settings."""
+        burst = settings.upstream_burst_size
+        return cls({
+            "gemini": (settings.rate_limit_requests_per_minute, burst),
+            "yahoo": (settings.yahoo_requests_per_minute, burst),
+            "sec": (settings.sec_requests_per_minute, burst),
+        }, batch_reserve=settings.batch_capacity_reserve)
+
+    async def acquire(
+        self,
+        upstream: str,
+        cost: float = 1.0,
+        priority: Optional[Priority] = None,
+        caller: Optional[str] = None
+    ) -> None:
+        """
+        Wait until a call to an upstream may be made.
+
+        Args:
+            upstream: Upstream name; unknown upstreams are not rate limited
+            cost: Number of requests the call will make
+            priority: Scheduling class (defaults to the current scheduling scope)
+            caller: Caller identity for fair sharing (defaults to the current scheduling scope)
+        """
+        state = self._upstreams.get(upstream)
+        if state is None:
+            return
+
+        priority = _current_priority.get() if priority is None else priority
+        caller = _current_caller.get() if caller is None else caller
+        cost = min(cost, state.bucket.capacity)
+
+        # Fast path: nobody is queued and there is capacity to spare
+        if not state.has_waiters() and state.bucket.wait_time(state.required_level(priority, cost)) == 0:
+            state.bucket.tokens -= cost
+            state.granted[priority] += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        state.queues[priority].setdefault(caller, deque()).append((cost, future))
+        if state.dispatcher is None or state.dispatcher.done() or state.dispatcher.get_loop() is not loop:
+            state.wakeup = asyncio.Event()
+            state.dispatcher = asyncio.create_task(self._dispatch(state))
+        else:
+            state.wakeup.set()
+
+        start_time = time.monotonic()
+        try:
+            await future
+        finally:
+            if future.cancelled():
+                # Let the dispatcher drop the abandoned request instead of waiting on its behalf
+                state.wakeup.set()
+        state.waited_seconds[priority] += time.monotonic() - start_time
+
+    async def _dispatch(self, state: _Upstream) -> None:
+        """Grant tokens to queued callers in priority and round-robin order."""
+        while True:
+            head = state.next_waiter()
+            if head is None:
+                return
+            priority, caller = head
+            cost, future = state.queues[priority][caller][0]
+
+            delay = state.bucket.wait_time(state.required_level(priority, cost))
+            if delay > 0:
+                # Re-evaluate when tokens have accrued or the queue changed (new or abandoned requests)
+                state.wakeup.clear()
+                try:
+                    await asyncio.wait_for(state.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            state.queues[priority][caller].popleft()
+            if future.done():
+                continue
+            state.bucket.tokens -= cost
+            state.granted[priority] += 1
+            future.set_result(None)
+
+            # Move the caller to the back of its class for round-robin sharing
+            waiters = state.queues[priority].pop(caller)
+            if waiters:
+                state.queues[priority][caller] = waiters
+
+    def release(self, caller: str) -> int:
+        """
+        Drop every queued request of a caller at once, e.g. when its analysis is cancelled.
+
+        The waiting calls are cancelled and the next callers in line are admitted
+        without waiting for the abandoned requests to reach the head of the queue.
+
+        Returns:
+            Number of queued requests dropped
+        """
+        dropped = 0
+        for state in self._upstreams.values():
+            for priority in Priority:
+                waiters = state.queues[priority].pop(caller, None)
+                for _, future in waiters or ():
+                    if not future.done():
+                        future.cancel()
+                        dropped += 1
+            if state.wakeup is not None:
+                state.wakeup.set()
+        if dropped:
+            logger.info("Released queued upstream requests", caller=caller, dropped=dropped)
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        """Get per-upstream bucket level, queue depth and wait statistics."""
+        result = {}
+        for name, state in self._upstreams.items():
+            state.bucket.refill()
+            result[name] = {
+                "requests_per_minute": round(state.bucket.rate_per_second * 60),
+                "available_tokens": round(state.bucket.tokens, 2),
+                "queued": {
+                    priority.name.lower(): sum(len(waiters) for waiters in state.queues[priority].values())
+                    for priority in Priority
+                },
+                "granted": {priority.name.lower(): state.granted[priority] for priority in Priority},
+                "avg_wait_ms": {
+                    priority.name.lower(): round(
+                        state.waited_seconds[priority] * 1000 / state.granted[priority], 1
+                    ) if state.granted[priority] else 0.0
+                    for priority in Priority
+                },
+            }
+        return result
+
+
+# Global scheduler instance
+scheduler = UpstreamScheduler.from_settings(get_settings())
+
+
+def get_scheduler() -> UpstreamScheduler:
+    """Get the upstream scheduler."""
+    return scheduler
@@ -0,0 +1,359 @@
+"""
+Status Store - Bounded, TTL-evicting key/value store for analysis status and results, in-process or on Redis.
+"""
+import asyncio
+import json
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+import structlog
+
+from backend.config.settings import Settings
+
+logger = structlog.get_logger()
+
+# Serialized values at least this large are zlib-compressed
+COMPRESS_MIN_BYTES = 512
+
+_JSON = b"j"
+_ZLIB = b"z"
+
+
+def encode_value(value: Dict[str, Any]) -> bytes:
+    """Serialize a value as compact JSON, compressed if it is large (datetimes become ISO strings)."""
+    payload = json.dumps(value, separators=(",", ":"), default=_to_json).encode("utf-8")
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        return _ZLIB + zlib.compress(payload)
+    return _JSON + payload
+
+
+def decode_value(data: bytes) -> Dict[str, Any]:
+    """Deserialize a value made by encode_value."""
+    marker, payload = data[:1], data[1:]
+    if marker == _ZLIB:
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+def _to_json(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Cannot store value of type {type(value).__name__}")
+
+
+class StatusStoreError(Exception):
+    """Raised when the store backend fails or rejects a command."""
+
+
+class StatusStore(ABC):
+    """
+    Key/value store of analysis status and results.
+
+    Every entry expires after the TTL, and the oldest entries are evicted once the
+    store holds `max_entries`, so memory stays bounded however many requests are
+    made. Values are dictionaries, stored as compact serialized JSON.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a value, or None if it is missing or expired."""
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a value, restarting its TTL."""
+        pass
+
+    @abstractmethod
+    async def add(self, key: str, value: Dict[str, Any]) -> bool:
+        """
+        Store a value only if the key holds none, atomically across all users of the store.
+
+        Returns:
+            True if the value was stored
+        """
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Delete a value."""
+        pass
+
+    async def update(self, key: str, **fields: Any) -> Dict[str, Any]:
+        """
+        Merge fields into a value (creating it if missing).
+
+        Returns:
+            The updated value
+        """
+        value = await self.get(key) or {}
+        value.update(fields)
+        await self.set(key, value)
+        return value
+
+    async def close(self) -> None:
+        """Release the backend connection, if any."""
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Get the backend name, limits and size."""
+        pass
+
+
+class InMemoryStatusStore(StatusStore):
+    """Status store in the memory of this process (not shared between workers)."""
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 10000):
+        super().__init__(ttl_seconds, max_entries)
+        # key -> (expires_at, encoded value), oldest write first
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+        return decode_value(entry[1])
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        self._store(key, encode_value(value), only_new=False)
+
+    async def add(self, key: str, value: Dict[str, Any]) -> bool:
+        return self._store(key, encode_value(value), only_new=True)
+
+    def _store(self, key: str, data: bytes, only_new: bool) -> bool:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if only_new and entry is not None and entry[0] > now:
+                return False
+            self._entries[key] = (now + self.ttl_seconds, data)
+            self._entries.move_to_end(key)
+            # Entries share one TTL, so the expired ones are at the front
+            while self._entries and next(iter(self._entries.values()))[0] <= now:
+                self._entries.popitem(last=False)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": sum(len(data) for _, data in self._entries.values()),
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+            }
+
+
+class RedisStatusStore(StatusStore):
+    """
+    Status store on a Redis server (or anything speaking its protocol), shared by all workers and nodes.
+
+    Values are set with an expiry, and a sorted-set index of keys by write time
+    enforces the size cap: each write trims index entries older than the TTL and
+    deletes the oldest keys beyond `max_entries`. Commands of one operation are
+    pipelined on a single connection per event loop.
+    """
+
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        ttl_seconds: int = 3600,
+        max_entries: int = 10000,
+        key_prefix: str = "analysis:",
+        timeout_seconds: float = 2.0
+    ):
+        super().__init__(ttl_seconds, max_entries)
+        self.url = url
+        self.key_prefix = key_prefix
+        self.timeout_seconds = timeout_seconds
+        self._index = f"{key_prefix}index"
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        (data,) = await self._execute([["GET", self._key(key)]])
+        return decode_value(data) if data is not None else None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        await self._write(["SET", self._key(key), encode_value(value), "EX", str(self.ttl_seconds)])
+
+    async def add(self, key: str, value: Dict[str, Any]) -> bool:
+        stored = await self._write(["SET", self._key(key), encode_value(value), "NX", "EX", str(self.ttl_seconds)])
+        return stored is not None
+
+    async def _write(self, command: List[Any]) -> Any:
+        """
+        Run a write command pipelined with the index upkeep: trim keys past the TTL, evict the oldest beyond the cap.
+
+        Returns:
+            Reply of the write command
+        """
+        now = time.time()
+        key = command[1]
+        replies = await self._execute([
+            command,
+            ["ZADD", self._index, repr(now), key],
+            ["ZREMRANGEBYSCORE", self._index, "-inf", repr(now - self.ttl_seconds)],
+            ["ZCARD", self._index],
+        ])
+        excess = replies[-1] - self.max_entries
+        if excess > 0:
+            (popped,) = await self._execute([["ZPOPMIN", self._index, str(excess)]])
+            evicted = popped[::2]
+            if evicted:
+                await self._execute([["DEL", *evicted]])
+        return replies[0]
+
+    async def delete(self, key: str) -> None:
+        await self._execute([["DEL", self._key(key)], ["ZREM", self._index, self._key(key)]])
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        self._reader = self._writer = None
+
+    def stats(self) -> Dict[str, Any]:
+        parsed = urlparse(self.url)
+        return {
+            "backend": "redis",
+            "server": f"{parsed.hostname or 'localhost'}:{parsed.port or 6379}",
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+        }
+
+    def _key(self, key: str) -> str:
+        return f"{self.key_prefix}{key}"
+
+    async def _execute(self, commands: List[List[Any]]) -> List[Any]:
+        """
+        Send commands in one pipeline and read their replies.
+
+        Raises:
+            StatusStoreError: If the connection fails or a command returns an error
+        """
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            # Connections and locks belong to the event loop that made them
+            self._lock = asyncio.Lock()
+            self._loop = loop
+            self._reader = self._writer = None
+
+        async with self._lock:
+            try:
+                if self._writer is None or self._writer.is_closing():
+                    await asyncio.wait_for(self._connect(), timeout=self.timeout_seconds)
+                self._writer.write(b"".join(_encode_command(command) for command in commands))
+                await self._writer.drain()
+                replies = [
+                    await asyncio.wait_for(_read_reply(self._reader), timeout=self.timeout_seconds)
+                    for _ in commands
+                ]
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                self._drop_connection()
+                raise StatusStoreError(f"Status store unavailable: {e}") from e
+            except asyncio.CancelledError:
+                # Replies may still be in flight; the connection cannot be reused
+                self._drop_connection()
+                raise
+
+        for reply in replies:
+            if isinstance(reply, StatusStoreError):
+                raise reply
+        return replies
+
+    def _drop_connection(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _connect(self) -> None:
+        """Open the connection, authenticating and selecting the database given in the URL."""
+        parsed = urlparse(self.url)
+        self._reader, self._writer = await asyncio.open_connection(parsed.hostname or "localhost", parsed.port or 6379)
+        setup = []
+        if parsed.password:
+            credentials = [unquote(parsed.username), unquote(parsed.password)] if parsed.username else [unquote(parsed.password)]
+            setup.append(["AUTH", *credentials])
+        if parsed.path.strip("/"):
+            setup.append(["SELECT", parsed.path.strip("/")])
+        for command in setup:
+            self._writer.write(_encode_command(command))
+            await self._writer.drain()
+            reply = await _read_reply(self._reader)
+            if isinstance(reply, StatusStoreError):
+                raise reply
+
+
+def _encode_command(command: List[Any]) -> bytes:
+    """Encode a command as a RESP array of bulk strings."""
+    parts = [b"*%d\r\n" % len(command)]
+    for arg in command:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def _read_reply(reader: asyncio.StreamReader) -> Any:
+    """Read one RESP reply; error replies are returned as StatusStoreError instances."""
+    line = await reader.readuntil(b"\r\n")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode("utf-8")
+    if kind == b"-":
+        return StatusStoreError(body.decode("utf-8"))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        count = int(body)
+        if count < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(count)]
+    raise StatusStoreError(f"Unexpected reply from status store: {line!r}")
+
+
+def create_status_store(settings: Settings) -> StatusStore:
+    """Create the status store configured in the settings ("memory" or "redis")."""
+    if settings.status_store_backend == "redis":
+        return RedisStatusStore(
+            settings.status_store_redis_url,
+            ttl_seconds=settings.status_store_ttl_seconds,
+            max_entries=settings.status_store_max_entries,
+            key_prefix=settings.status_store_key_prefix
+        )
+    return InMemoryStatusStore(
+        ttl_seconds=settings.status_store_ttl_seconds,
+        max_entries=settings.status_store_max_entries
+    )
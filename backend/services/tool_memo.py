@@ -0,0 +1,185 @@
+"""
+Tool Memo - Request-scoped memo of tool results shared by all research agents of an analysis.
+"""
+import asyncio
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+import structlog
+
+logger = structlog.get_logger()
+
+# Words that do not change what a search returns, dropped when normalizing queries
+FILLER_WORDS = {
+    "a", "an", "and", "the", "of", "for", "on", "in", "to", "about", "with", "by", "from",
+    "stock", "stocks", "share", "shares", "company", "latest", "recent", "current", "info", "information",
+}
+
+MemoKey = Tuple[str, Tuple[str, ...], str]
+
+
+def normalize_query(query: str, ticker: str = "") -> Tuple[str, ...]:
+    """
+    Normalize a tool query so near-duplicate phrasings share one memo entry.
+
+    Case, punctuation, word order, repeated words, filler words and the ticker
+    itself (already part of the key) are ignored.
+    """
+    words = re.findall(r"[a-z0-9]+(?:-[a-z0-9]+)*", query.lower())
+    ignored = FILLER_WORDS | {ticker.lower()}
+    return tuple(sorted({word for word in words if word not in ignored}))
+
+
+class _MemoEntry:
+    """Result of one tool call, or the pending call other agents wait on."""
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.latency_ms = 0.0
+
+
+class ToolMemoStats:
+    """Hit, miss and time-saved counters per tool, aggregated over all requests."""
+
+    def __init__(self):
+        self._tools: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, tool: str, hit: bool, saved_ms: float = 0.0) -> None:
+        """Record a memo lookup."""
+        with self._lock:
+            counters = self._tools.setdefault(tool, {"hits": 0, "misses": 0, "saved_ms": 0.0})
+            counters["hits" if hit else "misses"] += 1
+            counters["saved_ms"] += saved_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get per-tool counters, hit rates and the calls and time saved."""
+        with self._lock:
+            tools = {tool: dict(counters) for tool, counters in self._tools.items()}
+        for counters in tools.values():
+            lookups = counters["hits"] + counters["misses"]
+            counters["hit_rate"] = round(counters["hits"] / lookups, 3) if lookups else 0.0
+            counters["saved_ms"] = round(counters["saved_ms"], 1)
+        return {
+            "tools": tools,
+            "calls_saved": sum(counters["hits"] for counters in tools.values()),
+            "time_saved_ms": round(sum(counters["saved_ms"] for counters in tools.values()), 1),
+        }
+
+
+class ToolMemo:
+    """
+    Tool results of one analysis request, keyed by (tool, normalized query, ticker).
+
+    Agents researching the same ticker issue overlapping searches; the first call
+    runs the tool and every later or concurrent call with an equivalent query gets
+    its result. Failed calls are not memoized: waiting callers run the tool
+    themselves instead.
+    """
+
+    def __init__(self, stats: Optional[ToolMemoStats] = None):
+        self.stats = stats
+        self._entries: Dict[MemoKey, _MemoEntry] = {}
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+
+    @staticmethod
+    def key(tool: str, query: str, ticker: str) -> MemoKey:
+        """Get the memo key of a tool call."""
+        return tool, normalize_query(query, ticker), ticker.upper()
+
+    async def get_or_run(
+        self,
+        tool: str,
+        query: str,
+        ticker: str,
+        run: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        Get the memoized result of a tool call, running it if no equivalent call was made.
+
+        Args:
+            tool: Tool name
+            query: Tool query
+            ticker: Stock ticker
+            run: Factory making the actual tool call
+
+        Returns:
+            Tool result
+        """
+        key = self.key(tool, query, ticker)
+        while key in self._entries:
+            entry = self._entries[key]
+            result = await asyncio.shield(entry.future)
+            if result is not None:
+                self._record(tool, hit=True, saved_ms=entry.latency_ms)
+                return result
+
+        entry = _MemoEntry(asyncio.get_running_loop().create_future())
+        self._entries[key] = entry
+        self._record(tool, hit=False)
+        start_time = time.time()
+        try:
+            result = await run()
+        except BaseException:
+            self._discard(key, entry)
+            raise
+
+        entry.latency_ms = (time.time() - start_time) * 1000
+        if isinstance(result, dict) and result.get("error"):
+            self._discard(key, entry)
+        elif not entry.future.done():
+            entry.future.set_result(result)
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        """Get the lookups of this request and the tool time they saved."""
+        return {"hits": self.hits, "misses": self.misses, "saved_ms": round(self.saved_ms, 1)}
+
+    def _record(self, tool: str, hit: bool, saved_ms: float = 0.0) -> None:
+        if hit:
+            self.hits += 1
+            self.saved_ms += saved_ms
+        else:
+            self.misses += 1
+        if self.stats:
+            self.stats.record(tool, hit, saved_ms)
+
+    def _discard(self, key: MemoKey, entry: _MemoEntry) -> None:
+        """Forget a failed call, releasing its waiters to run the tool themselves."""
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+        if not entry.future.done():
+            entry.future.set_result(None)
+
+
+# Memo of the analysis request being processed, if any
+_current_memo: ContextVar[Optional[ToolMemo]] = ContextVar("tool_memo", default=None)
+
+# Global memo statistics
+tool_memo_stats = ToolMemoStats()
+
+
+@contextmanager
+def tool_memo_scope() -> Iterator[ToolMemo]:
+    """Share one tool memo between the tool calls (and tasks created) inside the block."""
+    memo = ToolMemo(tool_memo_stats)
+    token = _current_memo.set(memo)
+    try:
+        yield memo
+    finally:
+        _current_memo.reset(token)
+
+
+def current_tool_memo() -> Optional[ToolMemo]:
+    """Get the tool memo of the current request, or None outside a memo scope."""
+    return _current_memo.get()
+
+
+def get_tool_memo_stats() -> ToolMemoStats:
+    """Get the aggregated tool memo statistics."""
+    return tool_memo_stats
@@ -3,8 +3,10 @@ Test suite for research agents and tools.
 """
 import pytest
 import asyncio
+import time
 from unittest.mock import Mock, patch, AsyncMock
 
+from backend.agents.intent_router import IntentRouter
 from backend.agents.news_agent import NewsAgent
 from backend.agents.filings_agent import FilingsAgent
 from backend.agents.price_agent import PriceAgent
@@ -12,7 +14,11 @@ from backend.agents.synthesis_agent import SynthesisAgent
 from backend.tools.web_search_tool import WebSearchTool
 from backend.tools.stock_data_tool import StockDataTool
 from backend.tools.sec_edgar_tool import SECEdgarTool
-from backend.app.models import TickerInsight, StanceType, ConfidenceLevel
+from backend.app.models import AgentStep, TickerInsight, StanceType, ConfidenceLevel
+from backend.services.agent_result_cache import AgentResultCache, get_agent_result_cache
+from backend.services.model_router import STANDARD, ModelRouter
+from backend.utils.resilience import deadline_scope
+from backend.utils.token_budget import estimate_tokens
 
 
 class TestAgents:
@@ -70,6 +76,41 @@ class TestAgents:
         assert "analyst" in action_input.lower()
         assert "AAPL" in action_input
     
+    @pytest.mark.asyncio
+    async def test_reasoning_prompt_stays_within_budget(self):
+        """Test that the ReAct prompt size is bounded however many findings accumulate."""
+        self.mock_llm.ainvoke.return_value = Mock(content="Search for more news")
+        findings = [
+            {"observation": f"Observation {i}. " + "Lots of detail. " * 200}
+            for i in range(30)
+        ]
+        steps = [
+            AgentStep(step_number=i + 1, thought="Thinking " * 50, action="web_search: AAPL", observation="Result " * 100)
+            for i in range(30)
+        ]
+        context = {"ticker": "AAPL", "query": "Analyze AAPL", "findings": findings, "iteration": 31}
+        
+        await self.news_agent._reason(context, steps)
+        
+        messages = self.mock_llm.ainvoke.call_args.args[0]
+        prompt_tokens = sum(estimate_tokens(message.content) for message in messages)
+        assert prompt_tokens <= self.news_agent.settings.prompt_token_budget
+        assert "Observation 29." in messages[1].content
+    
+    @pytest.mark.asyncio
+    async def test_reasoning_prompt_has_stable_prefix(self):
+        """Test that the system message is byte-identical across tickers and iterations."""
+        self.mock_llm.ainvoke.return_value = Mock(content="Search for more news")
+        prefixes = []
+        for ticker, iteration in [("AAPL", 1), ("MSFT", 2)]:
+            context = {"ticker": ticker, "query": f"Analyze {ticker}", "findings": [], "iteration": iteration}
+            await self.news_agent._reason(context, [])
+            prefixes.append(self.mock_llm.ainvoke.call_args.args[0][0].content)
+        
+        assert prefixes[0] == prefixes[1]
+        assert "web_search" in prefixes[0]
+        assert "AAPL" not in prefixes[0]
+    
     @pytest.mark.asyncio
     async def test_synthesis_agent_stance_parsing(self):
         """Test synthesis agent stance parsing."""
@@ -140,6 +181,38 @@ class TestAgents:
         assert "Strong fundamentals" in recommendation["rationale"]
 
 
+class TestIntentRouter:
+    """Test cases for query intent routing."""
+    
+    def setup_method(self):
+        """Set up a router with all agents as the default."""
+        self.agents = ["news", "filings", "earnings", "insider", "patents", "price"]
+        self.router = IntentRouter(self.agents)
+    
+    def test_focused_query_runs_only_its_agents(self):
+        """Test that a technical question runs only the price agent with a smaller budget."""
+        plan = self.router.route("What's the technical setup on TSLA?", 3, available=self.agents)
+        
+        assert plan.intent == "technical"
+        assert plan.agents == ["price"]
+        assert plan.max_iterations == 2
+    
+    def test_multiple_intents_are_combined(self):
+        """Test that agents of every matched intent run, in orchestrator order."""
+        plan = self.router.route("Any insider selling or news on NVDA?", 3, available=self.agents)
+        
+        assert plan.agents == ["news", "insider"]
+    
+    def test_general_query_runs_default_agents(self):
+        """Test that broad or unmatched queries run the default agents with the requested budget."""
+        for query in ["Should I buy AAPL?", "AAPL MSFT"]:
+            plan = self.router.route(query, 3, available=self.agents)
+            
+            assert plan.intent == "general"
+            assert plan.agents == self.agents
+            assert plan.max_iterations == 3
+
+
 class TestTools:
     """Test cases for research tools."""
     
@@ -234,6 +307,9 @@ class TestIntegration:
     
     def setup_method(self):
         """Set up integration test environment."""
+        # Every test researches from scratch
+        get_agent_result_cache().clear()
+        
         self.mock_llm = Mock()
         self.mock_llm.ainvoke = AsyncMock()
         
@@ -263,13 +339,147 @@ class TestIntegration:
             assert len(result["trace"].steps) > 0
             assert "findings" in result
     
+    @pytest.mark.asyncio
+    async def test_function_calling_reasons_and_acts_in_one_call(self):
+        """Test that tool calls come back with the thought and finish_research ends with the summary."""
+        news_agent = NewsAgent(self.mock_llm)
+        news_agent.result_cache = None
+        self.mock_llm.ainvoke.side_effect = [
+            Mock(content="Need headlines and earnings coverage.", tool_calls=[
+                {"name": "web_search", "args": {"query": "AAPL earnings news"}, "id": "1"},
+                {"name": "web_search", "args": {"query": "AAPL guidance"}, "id": "2"},
+            ]),
+            Mock(content="", tool_calls=[
+                {"name": "finish_research", "args": {"summary": "Earnings beat expectations."}, "id": "3"},
+            ]),
+        ]
+        
+        with patch.object(news_agent.tools[0], 'execute', new=AsyncMock(return_value={
+            "observation": "Found recent earnings news for AAPL",
+            "sources": []
+        })) as mock_execute:
+            result = await news_agent.research("AAPL", "Analyze AAPL earnings", max_iterations=3)
+        
+        # Two reason+act calls and no separate summary call; both searches ran in the first iteration
+        assert self.mock_llm.ainvoke.await_count == 2
+        assert "tools" in self.mock_llm.ainvoke.call_args.kwargs
+        assert [call.args[0] for call in mock_execute.await_args_list] == ["AAPL earnings news", "AAPL guidance"]
+        assert len(result["trace"].steps) == 1
+        assert "[web_search]" in result["trace"].steps[0].observation
+        assert result["summary"] == "Earnings beat expectations."
+    
+    @pytest.mark.asyncio
+    async def test_iteration_runs_named_tools_concurrently(self):
+        """Test that every tool named in a thought runs in the same iteration, concurrently."""
+        filings_agent = FilingsAgent(self.mock_llm)
+        running = []
+        peak = []
+        
+        async def execute(query, ticker):
+            running.append(query)
+            peak.append(len(running))
+            await asyncio.sleep(0.05)
+            running.remove(query)
+            return {"observation": f"result for {query}", "sources": []}
+        
+        thought = "Check sec_edgar for the 10-K and web_search for coverage of the filing."
+        actions = await filings_agent._plan_actions(thought, {"ticker": "AAPL"})
+        with patch.object(filings_agent.tools[0], 'execute', new=execute), \
+                patch.object(filings_agent.tools[1], 'execute', new=execute):
+            action, observation, _ = await filings_agent._execute_actions(actions, "AAPL")
+        
+        assert [name for name, _ in actions] == ["sec_edgar", "web_search"]
+        assert max(peak) == 2
+        assert "[sec_edgar]" in observation and "[web_search]" in observation
+        assert action.startswith("sec_edgar:")
+    
+    @pytest.mark.asyncio
+    async def test_fresh_result_reused_across_requests(self):
+        """Test that a second request for the same ticker and intent reuses the cached research."""
+        news_agent = NewsAgent(self.mock_llm)
+        news_agent.result_cache = AgentResultCache({"news": 600})
+        
+        with patch.object(news_agent.tools[0], 'execute', new=AsyncMock(return_value={
+            "observation": "Found recent earnings news for AAPL",
+            "sources": []
+        })):
+            first = await news_agent.research("AAPL", "Should I buy AAPL?", max_iterations=1)
+            calls = self.mock_llm.ainvoke.await_count
+            second = await news_agent.research("AAPL", "Is AAPL a good investment?", max_iterations=1)
+            other_intent = await news_agent.research("AAPL", "Latest AAPL news headlines", max_iterations=1)
+        
+        assert second["cached"] is True
+        assert second["findings"] == first["findings"]
+        assert second["trace"] is not first["trace"]
+        assert "cached" not in other_intent
+        assert self.mock_llm.ainvoke.await_count > calls
+        assert news_agent.result_cache.stats()["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_stale_result_renewed_when_inputs_unchanged(self):
+        """Test that an expired result is reused without a ReAct run if the input fingerprint is unchanged."""
+        news_agent = NewsAgent(self.mock_llm)
+        news_agent.result_cache = AgentResultCache({"news": 600})
+        search = AsyncMock(return_value={
+            "observation": "Found recent earnings news for AAPL",
+            "sources": [{"url": "https://example.com/aapl-earnings"}]
+        })
+        
+        with patch.object(news_agent.tools[0], 'execute', new=search):
+            first = await news_agent.research("AAPL", "Should I buy AAPL?", max_iterations=1)
+            news_agent.result_cache.ttl_seconds["news"] = 1
+            news_agent.result_cache._entries[("news", "AAPL", "general")].bucket -= 1
+            calls = self.mock_llm.ainvoke.await_count
+            renewed = await news_agent.research("AAPL", "Should I buy AAPL?", max_iterations=1)
+            assert self.mock_llm.ainvoke.await_count == calls
+            
+            search.return_value = {"observation": "New headline", "sources": [{"url": "https://example.com/new"}]}
+            news_agent.result_cache._entries[("news", "AAPL", "general")].bucket -= 1
+            changed = await news_agent.research("AAPL", "Should I buy AAPL?", max_iterations=1)
+        
+        assert first["fingerprint"]
+        assert renewed["unchanged"] is True
+        assert renewed["findings"] == first["findings"]
+        assert "unchanged" not in changed
+        assert changed["fingerprint"] != first["fingerprint"]
+        assert self.mock_llm.ainvoke.await_count > calls
+    
+    def test_insight_expires_with_most_volatile_input(self):
+        """Test that a reused insight is never older than the shortest TTL of its input agents."""
+        cache = AgentResultCache({"news": 60, "filings": 86400})
+        insight = TickerInsight(
+            ticker="AAPL",
+            summary="Strong quarter",
+            stance=StanceType.BUY,
+            confidence=ConfidenceLevel.HIGH,
+            rationale="Growth"
+        )
+        cache.put_insight("AAPL", "general", "sig", insight, agent_types=["news", "filings"])
+        
+        assert cache.get_insight("AAPL", "general", "sig").summary == "Strong quarter"
+        assert cache.get_insight("AAPL", "general", "other-sig") is None
+        with patch("backend.services.agent_result_cache.time.time", return_value=time.time() + 61):
+            assert cache.get_insight("AAPL", "general", "sig") is None
+    
+    @pytest.mark.asyncio
+    async def test_research_stops_near_deadline(self):
+        """Test that no ReAct iteration is started when the request deadline is too close."""
+        news_agent = NewsAgent(self.mock_llm)
+        
+        with deadline_scope(0.5):
+            result = await news_agent.research("AAPL", "Analyze AAPL earnings", max_iterations=3)
+        
+        self.mock_llm.ainvoke.assert_not_awaited()
+        assert result["trace"].success is True
+        assert result["trace"].steps == []
+    
     @pytest.mark.asyncio
     async def test_synthesis_with_mock_data(self):
         """Test synthesis agent with mock agent results."""
         synthesis_agent = SynthesisAgent(self.mock_llm)
         
-        # Mock LLM responses for analysis and recommendation
-        analysis_response = Mock(content="""
+        # Mock LLM response with the analysis and the recommendation
+        self.mock_llm.ainvoke.return_value = Mock(content="""
         SUMMARY: Strong performance with good prospects.
         KEY_DRIVERS:
         - Revenue growth
@@ -278,16 +488,11 @@ class TestIntegration:
         - Competition
         CATALYSTS:
         - New products
-        """)
-        
-        recommendation_response = Mock(content="""
         STANCE: BUY
         CONFIDENCE: HIGH
         RATIONALE: Strong fundamentals support buy recommendation.
         """)
         
-        self.mock_llm.ainvoke.side_effect = [analysis_response, recommendation_response]
-        
         # Mock agent results
         agent_results = {
             "news": {
@@ -311,6 +516,92 @@ class TestIntegration:
         assert "Strong performance" in insight.summary
         assert len(insight.key_drivers) > 0
         assert len(insight.risks) > 0
+        assert insight.catalysts == ["New products"]
+        assert self.mock_llm.ainvoke.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_failed_synthesis_keeps_partial_findings(self):
+        """Test that a failed synthesis falls back to the findings instead of discarding them."""
+        synthesis_agent = SynthesisAgent(self.mock_llm)
+        self.mock_llm.ainvoke.side_effect = TimeoutError("deadline")
+        
+        agent_results = {
+            "news": {
+                "summary": "Earnings beat expectations.",
+                "findings": [{"observation": "Positive earnings news"}],
+                "sources": [{"url": "https://example.com", "title": "News"}]
+            },
+            "price": {
+                "error": "Request deadline reached",
+                "findings": [{"observation": "Price up 4% this week"}],
+                "sources": []
+            },
+            "filings": {"error": "Skipped: request deadline reached"}
+        }
+        
+        insight = await synthesis_agent.synthesize("AAPL", agent_results, "Analyze AAPL")
+        
+        assert "Earnings beat expectations." in insight.summary
+        assert "Price up 4% this week" in insight.summary
+        assert insight.stance == StanceType.HOLD
+        assert insight.confidence == ConfidenceLevel.LOW
+        assert [source.url for source in insight.sources] == ["https://example.com"]
+    
+    @pytest.mark.asyncio
+    async def test_synthesis_escalates_low_confidence(self):
+        """Test that a low-confidence first pass is redone with the escalation model."""
+        analysis = """
+        SUMMARY: Mixed signals.
+        KEY_DRIVERS:
+        - Services growth
+        RISKS:
+        - Competition
+        """
+        
+        escalation_llm = Mock()
+        escalation_llm.ainvoke = AsyncMock(return_value=Mock(
+            content=analysis + "STANCE: SELL\nCONFIDENCE: MEDIUM\nRATIONALE: Risks outweigh drivers."
+        ))
+        self.mock_llm.ainvoke.return_value = Mock(
+            content=analysis + "STANCE: HOLD\nCONFIDENCE: LOW\nRATIONALE: Unclear outlook."
+        )
+        router = ModelRouter()
+        synthesis_agent = SynthesisAgent(self.mock_llm, escalation_llm=escalation_llm, tier=STANDARD, router=router)
+        
+        agent_results = {"news": {"findings": [{"observation": "Mixed earnings"}], "sources": []}}
+        insight = await synthesis_agent.synthesize("AAPL", agent_results, "Analyze AAPL")
+        
+        assert escalation_llm.ainvoke.await_count == 1
+        assert router.stats()[STANDARD]["escalations"] == 1
+        assert insight.stance == StanceType.SELL
+        assert insight.confidence == ConfidenceLevel.MEDIUM
+    
+    @pytest.mark.asyncio
+    async def test_synthesis_uses_context_built_as_agents_complete(self):
+        """Test that synthesis consumes findings added to its context in completion order."""
+        self.mock_llm.ainvoke.return_value = Mock(
+            content="SUMMARY: Solid.\nSTANCE: BUY\nCONFIDENCE: HIGH\nRATIONALE: Strong demand."
+        )
+        synthesis_agent = SynthesisAgent(self.mock_llm)
+        agent_results = {
+            "news": {"findings": [{"observation": "Strong demand"}],
+                     "sources": [{"url": "https://example.com/a", "title": "A"}]},
+            "price": {"findings": [{"observation": "Uptrend"}],
+                      "sources": [{"url": "https://example.com/a", "title": "A"}]},
+        }
+        
+        context = synthesis_agent.new_context()
+        context.add("price", agent_results["price"])
+        context.add("price", agent_results["price"])
+        assert "price" in context and "news" not in context
+        
+        insight = await synthesis_agent.synthesize("AAPL", agent_results, "Analyze AAPL", context=context)
+        
+        prompt = self.mock_llm.ainvoke.call_args[0][0][1].content
+        assert prompt.index("[PRICE] Uptrend") < prompt.index("[NEWS] Strong demand")
+        assert len(insight.sources) == 1
+        assert insight.stance == StanceType.BUY
+        assert "agent" not in agent_results["news"]["findings"][0]
 
 
 if __name__ == "__main__":
@@ -3,12 +3,16 @@ Test suite for the Stock Research Chatbot API.
 """
 import pytest
 import asyncio
+import time
 from unittest.mock import Mock, patch, AsyncMock
 from fastapi.testclient import TestClient
 
+from backend.app.container import get_container
 from backend.app.main import app
 from backend.app.models import AnalysisRequest, TickerInsight, StanceType, ConfidenceLevel
+from backend.config.settings import get_settings
 from backend.agents.yahoo_finance_orchestrator import YahooFinanceOrchestrator
+from backend.services.event_stream import get_event_bus
 
 
 class TestAPI:
@@ -101,6 +105,163 @@ class TestAPI:
         data = response.json()
         assert "not found" in data["detail"].lower()
     
+    def test_stream_analysis_events(self):
+        """Test that analysis events for a client-supplied request ID are streamed as SSE."""
+        request_id = "stream-test-id"
+        
+        with patch.object(get_container().yahoo_orchestrator, "analyze", AsyncMock(return_value=[])):
+            response = self.client.post(
+                "/api/v1/analyze",
+                json={"query": "Analyze AAPL", "request_id": request_id}
+            )
+        
+        assert response.status_code == 200
+        assert response.json()["request_id"] == request_id
+        
+        stream = self.client.get(f"/api/v1/analyze/{request_id}/stream")
+        assert stream.status_code == 200
+        assert stream.headers["content-type"].startswith("text/event-stream")
+        assert "event: complete" in stream.text
+        assert request_id in stream.text
+    
+    def test_stream_for_unknown_request_not_found(self):
+        """Test that a stream for an ID no analysis ever used answers 404 instead of idling forever."""
+        with patch.object(get_settings(), "analysis_stream_wait_seconds", 0.2):
+            response = self.client.get("/api/v1/analyze/never-posted-id/stream")
+        
+        assert response.status_code == 404
+    
+    def test_requests_share_app_container(self):
+        """Test that the lifespan builds one container whose orchestrator serves every request."""
+        with TestClient(app) as client:
+            container = get_container()
+            assert container.yahoo_orchestrator.yahoo_tool.api_client is container.api_client
+            
+            with patch.object(container.yahoo_orchestrator, "analyze", AsyncMock(return_value=[])) as analyze:
+                for query in ("Analyze AAPL", "Analyze MSFT"):
+                    response = client.post("/api/v1/analyze", json={"query": query})
+                    assert response.status_code == 200
+            
+            assert analyze.await_count == 2
+            assert get_container() is container
+    
+    def test_async_analysis_job_reports_progress_and_result(self):
+        """Test that an async analysis returns at once and its result is served when the job completes."""
+        request_id = "async-job-test-id"
+        progress_seen = []
+        
+        async def analyze(query, max_iterations, timeout_seconds, request_id):
+            events = get_event_bus()
+            events.publish(request_id, "started", {"tickers": ["AAPL"], "agents": ["news", "price"]})
+            events.publish(request_id, "agent_completed", {"ticker": "AAPL", "agent_type": "news"})
+            await asyncio.sleep(0.05)
+            progress_seen.append((await get_container().jobs.status(request_id))["progress"])
+            return []
+        
+        with TestClient(app) as client:
+            with patch.object(get_container().yahoo_orchestrator, "analyze", side_effect=analyze):
+                response = client.post(
+                    "/api/v1/analyze",
+                    json={"query": "Analyze AAPL", "request_id": request_id, "mode": "async"}
+                )
+                assert response.status_code == 202
+                assert response.json()["result_url"] == f"/api/v1/analyze/{request_id}"
+                
+                for _ in range(100):
+                    status = client.get(f"/api/v1/analyze/{request_id}/status").json()
+                    if status["status"] == "completed":
+                        break
+                    time.sleep(0.01)
+            
+            assert status["progress"] == 100.0
+            assert progress_seen == [50.0]
+            result = client.get(f"/api/v1/analyze/{request_id}").json()
+            assert result["request_id"] == request_id
+            assert result["query"] == "Analyze AAPL"
+    
+    def test_duplicate_requests_share_one_analysis(self):
+        """Test that identical requests attach to one job unless a new idempotency key is sent."""
+        async def analyze(query, max_iterations, timeout_seconds, request_id):
+            await asyncio.sleep(0.2)
+            return []
+        
+        with TestClient(app) as client:
+            with patch.object(get_container().yahoo_orchestrator, "analyze", side_effect=analyze) as mocked:
+                first = client.post(
+                    "/api/v1/analyze",
+                    json={"query": "Analyze AAPL and MSFT", "request_id": "dedup-first", "mode": "async"}
+                ).json()
+                duplicate = client.post(
+                    "/api/v1/analyze",
+                    json={"query": "analyze MSFT, AAPL", "request_id": "dedup-second", "mode": "async"}
+                ).json()
+                assert first["deduplicated"] is False
+                assert duplicate["request_id"] == "dedup-first"
+                assert duplicate["deduplicated"] is True
+                
+                # A sync duplicate waits for the job, and its own stream follows it
+                response = client.post(
+                    "/api/v1/analyze",
+                    json={"query": "Analyze AAPL and MSFT", "request_id": "dedup-sync"}
+                )
+                assert response.json()["request_id"] == "dedup-first"
+                assert "event: complete" in client.get("/api/v1/analyze/dedup-sync/stream").text
+                assert mocked.await_count == 1
+                
+                fresh = client.post(
+                    "/api/v1/analyze",
+                    json={"query": "Analyze AAPL and MSFT", "mode": "async"},
+                    headers={"Idempotency-Key": "retry-2"}
+                ).json()
+                assert fresh["deduplicated"] is False
+                for _ in range(100):
+                    if client.get(fresh["status_url"]).json()["status"] == "completed":
+                        break
+                    time.sleep(0.01)
+                assert mocked.await_count == 2
+            
+            assert client.get("/api/v1/internal/jobs").json()["jobs"]["deduplicated"] == 2
+    
+    def test_cancel_stops_running_analysis(self):
+        """Test that cancelling a running job cancels its analysis and reports the work avoided."""
+        request_id = "cancel-job-test-id"
+        analysis_cancelled = asyncio.Event()
+        
+        async def analyze(query, max_iterations, timeout_seconds, request_id):
+            get_event_bus().publish(request_id, "started", {"tickers": ["AAPL"], "agents": ["news", "price"]})
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                analysis_cancelled.set()
+                raise
+            return []
+        
+        with TestClient(app) as client:
+            with patch.object(get_container().yahoo_orchestrator, "analyze", side_effect=analyze):
+                client.post(
+                    "/api/v1/analyze",
+                    json={"query": "Analyze AAPL", "request_id": request_id, "mode": "async"}
+                )
+                for _ in range(100):
+                    if client.get(f"/api/v1/analyze/{request_id}/status").json()["status"] == "processing":
+                        break
+                    time.sleep(0.01)
+                
+                response = client.delete(f"/api/v1/analyze/{request_id}")
+                assert response.json()["message"] == "Analysis cancelled successfully"
+                for _ in range(100):
+                    status = client.get(f"/api/v1/analyze/{request_id}/status").json()
+                    if status["work_avoided"]:
+                        break
+                    time.sleep(0.01)
+            
+            assert analysis_cancelled.is_set()
+            assert status["status"] == "cancelled"
+            assert status["work_avoided"]["stages_skipped"] == 2
+            assert status["work_avoided"]["budget_seconds_unused"] > 0
+            assert client.get("/api/v1/internal/jobs").json()["jobs"]["cancellations"]["cancelled"] >= 1
+            assert client.delete(f"/api/v1/analyze/{request_id}").json()["message"] == "Analysis already cancelled"
+    
     def test_cancel_analysis_not_found(self):
         """Test cancelling non-existent analysis."""
         response = self.client.delete("/api/v1/analyze/nonexistent-id")
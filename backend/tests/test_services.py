@@ -0,0 +1,897 @@
+"""
+Test suite for services and shared utilities.
+"""
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from unittest.mock import Mock, AsyncMock, patch
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from backend.app.models import AgentTrace, ConfidenceLevel, StanceType, TickerInsight
+from backend.services.checkpoint_store import CheckpointStore
+from backend.services.event_stream import AnalysisEventBus, format_sse
+from backend.services.gemini_service import GeminiService, NEWS_SUMMARY_SCHEMA
+from backend.services.llm_gateway import ContextCache, LLMGateway
+from backend.services.model_router import FAST, STANDARD, STRONG, ModelRouter
+from backend.services.scheduler import Priority, UpstreamScheduler
+from backend.services.status_store import (
+    InMemoryStatusStore, RedisStatusStore, StatusStoreError, _encode_command, _read_reply, decode_value, encode_value
+)
+from backend.services.tool_memo import ToolMemo, ToolMemoStats, current_tool_memo, tool_memo_scope
+from backend.tools.yahoo_finance_tool import YahooFinanceTool
+from backend.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from backend.utils.resilience import (
+    DeadlineExceeded, RequestCancelled, ResiliencePolicy, cancellation_scope, deadline_scope, hedged,
+    remaining_time, retry_with_backoff, timeout_for, within_deadline
+)
+from backend.utils.structured_output import IncrementalJSONParser, schema_errors
+from backend.utils.token_budget import compact_entries, estimate_tokens, truncate_to_tokens
+
+
+class _StreamedResponse:
+    """Async iterable standing in for a streamed Gemini response."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield Mock(text=chunk)
+
+
+def _streaming_model(chunks):
+    """Create a mock Gemini model that streams the given text chunks."""
+    model = Mock()
+    model.generate_content_async = AsyncMock(return_value=_StreamedResponse(chunks))
+    return model
+
+
+class TestStructuredOutput:
+    """Test cases for the incremental JSON parser and schema checks."""
+
+    def test_fields_emitted_as_they_close(self):
+        """Test that top-level fields are returned by the chunk that completes them."""
+        parser = IncrementalJSONParser()
+
+        assert parser.feed('```json\n{"summary": "Strong qu') == []
+        assert parser.feed('arter", "sentiment"') == [("summary", "Strong quarter")]
+        assert parser.feed(': "positive", "key_points": ["a", ') == [("sentiment", "positive")]
+        assert parser.feed('"b"], "score": 4.5}\n```') == [("key_points", ["a", "b"]), ("score", 4.5)]
+
+        assert parser.complete
+        assert parser.result() == {
+            "summary": "Strong quarter",
+            "sentiment": "positive",
+            "key_points": ["a", "b"],
+            "score": 4.5
+        }
+
+    def test_braces_and_escapes_inside_strings(self):
+        """Test that structural characters inside strings are ignored."""
+        parser = IncrementalJSONParser()
+        fields = parser.feed('{"text": "a } \\" ] {", "nested": {"x": [1, {"y": "}"}]}}')
+
+        assert fields == [("text", 'a } " ] {'), ("nested", {"x": [1, {"y": "}"}]})]
+        assert parser.complete
+
+    def test_partial_field_decodes_streaming_string(self):
+        """Test access to the text of a string field that is still streaming."""
+        parser = IncrementalJSONParser()
+        parser.feed('{"rationale": "Caf\\u00')
+
+        assert parser.partial_field() == ("rationale", "Caf")
+
+        parser.feed('e9 \\"pricing\\" power')
+        assert parser.partial_field() == ("rationale", 'Caf\u00e9 "pricing" power')
+
+        parser.feed('", "stance": "buy"}')
+        assert parser.partial_field() is None
+
+    def test_incomplete_result_raises(self):
+        """Test that a truncated response is reported as incomplete."""
+        parser = IncrementalJSONParser()
+        parser.feed('{"summary": "cut off')
+
+        with pytest.raises(ValueError):
+            parser.result()
+
+    def test_schema_errors(self):
+        """Test schema validation of parsed responses."""
+        valid = {"summary": "ok", "sentiment": "neutral", "key_points": ["x"]}
+        assert schema_errors(valid, NEWS_SUMMARY_SCHEMA) == []
+
+        invalid = {"summary": "ok", "key_points": [1]}
+        errors = schema_errors(invalid, NEWS_SUMMARY_SCHEMA)
+        assert any("sentiment" in error for error in errors)
+        assert any("key_points[0]" in error for error in errors)
+
+
+class TestGeminiService:
+    """Test cases for the Gemini service."""
+
+    def setup_method(self):
+        """Set up the service with a placeholder key and its own model router."""
+        self.router = ModelRouter()
+        self.service = GeminiService(api_key="test-key", router=self.router)
+        self.service.breaker = CircuitBreaker("gemini")
+        self.articles = [{
+            "title": "AAPL beats estimates",
+            "publisher": "Yahoo Finance",
+            "published_at": "2024-10-08",
+            "snippet": "Strong quarter"
+        }]
+
+    @pytest.mark.asyncio
+    async def test_llm_stage_skipped_near_deadline(self):
+        """Test that a call is not started when the deadline leaves too little time, using the fallback."""
+        self.service.models[FAST] = _streaming_model(['{"summary": "x"}'])
+
+        with deadline_scope(0.5):
+            result = await self.service.summarize_news("AAPL", self.articles)
+
+        self.service.models[FAST].generate_content_async.assert_not_awaited()
+        assert result["key_points"] == ["AAPL beats estimates"]
+
+    @pytest.mark.asyncio
+    async def test_summarize_news_streams_fields(self):
+        """Test that completed fields are emitted while the response streams."""
+        self.service.models[FAST] = _streaming_model([
+            '{"summary": "Solid quarter.", ',
+            '"sentiment": "positive", "key_points": ["Beat"]}'
+        ])
+        emitted = []
+
+        result = await self.service.summarize_news(
+            "AAPL", self.articles, on_field=lambda key, value: emitted.append(key)
+        )
+
+        assert result["summary"] == "Solid quarter."
+        assert emitted == ["summary", "sentiment", "key_points"]
+
+        call_kwargs = self.service.models[FAST].generate_content_async.call_args.kwargs
+        assert call_kwargs["stream"] is True
+        assert call_kwargs["generation_config"]["response_schema"] == NEWS_SUMMARY_SCHEMA
+
+    @pytest.mark.asyncio
+    async def test_streamed_text_forwarded_as_tokens(self):
+        """Test that text of string fields is forwarded while it streams."""
+        self.service.models[FAST] = _streaming_model([
+            '{"summary": "Solid ',
+            'quarter.", "sentiment": "posi',
+            'tive", "key_points": []}'
+        ])
+        tokens = []
+
+        await self.service.summarize_news(
+            "AAPL", self.articles, on_token=lambda key, text: tokens.append((key, text))
+        )
+
+        assert tokens == [("summary", "Solid "), ("sentiment", "posi")]
+
+    @pytest.mark.asyncio
+    async def test_summarize_news_schema_mismatch_falls_back(self):
+        """Test that a response missing required fields uses the fallback."""
+        self.service.models[FAST] = _streaming_model(['{"summary": "Only a summary"}'])
+
+        result = await self.service.summarize_news("AAPL", self.articles)
+
+        assert result["sentiment"] == "neutral"
+        assert result["key_points"] == ["AAPL beats estimates"]
+
+
+    @pytest.mark.asyncio
+    async def test_low_confidence_analysis_escalates(self):
+        """Test that a low-confidence first pass is redone on the strong tier."""
+        analysis = {
+            "rationale": "Thesis.", "key_drivers": [], "risks": [], "catalysts": [],
+            "stance": "hold", "confidence_rationale": "Because."
+        }
+        self.service.models[STANDARD] = _streaming_model([json.dumps({**analysis, "confidence": "low"})])
+        self.service.models[STRONG] = _streaming_model([json.dumps({**analysis, "confidence": "high"})])
+
+        result = await self.service.generate_investment_analysis(
+            "AAPL", "Apple Inc.", {"summary": "ok"}, {"current_price": 100.0}, {}
+        )
+
+        assert result["confidence"] == "high"
+        stats = self.router.stats()
+        assert stats[STANDARD]["escalations"] == 1
+        assert stats[STANDARD]["calls"] == 1
+        assert stats[STRONG]["calls"] == 1
+        assert stats[STRONG]["cost_usd"] > 0
+
+    @pytest.mark.asyncio
+    async def test_confident_analysis_stays_on_standard_tier(self):
+        """Test that a usable first pass is not escalated."""
+        self.service.models[STANDARD] = _streaming_model([json.dumps({
+            "rationale": "Thesis.", "key_drivers": [], "risks": [], "catalysts": [],
+            "stance": "buy", "confidence": "medium", "confidence_rationale": "Because."
+        })])
+        self.service.models[STRONG] = _streaming_model([])
+
+        result = await self.service.generate_investment_analysis(
+            "AAPL", "Apple Inc.", {"summary": "ok"}, {"current_price": 100.0}, {}
+        )
+
+        assert result["stance"] == "buy"
+        self.service.models[STRONG].generate_content_async.assert_not_awaited()
+
+
+    @pytest.mark.asyncio
+    async def test_failed_stream_open_is_retried(self):
+        """Test that a transient error opening the stream is retried instead of falling back."""
+        model = _streaming_model(['{"summary": "Solid quarter.", "sentiment": "positive", "key_points": []}'])
+        model.generate_content_async.side_effect = [Exception("503 unavailable"), model.generate_content_async.return_value]
+        self.service.models[FAST] = model
+        self.service.resilience = ResiliencePolicy(hedging_enabled=False, base_delay=0.01)
+
+        result = await self.service.summarize_news("AAPL", self.articles)
+
+        assert result["summary"] == "Solid quarter."
+        assert model.generate_content_async.await_count == 2
+
+
+class TestResilience:
+    """Test cases for hedged calls, retries and request deadlines."""
+
+    @pytest.mark.asyncio
+    async def test_hedged_call_takes_faster_duplicate(self):
+        """Test that a duplicate is started after the hedge delay and the first result wins."""
+        delays = [1.0, 0.0]
+        started = []
+
+        async def operation():
+            delay = delays[len(started)]
+            started.append(delay)
+            await asyncio.sleep(delay)
+            return delay
+
+        result = await asyncio.wait_for(hedged(operation, hedge_delay=0.05), timeout=0.5)
+
+        assert result == 0.0
+        assert started == [1.0, 0.0]
+
+    @pytest.mark.asyncio
+    async def test_fast_call_is_not_hedged(self):
+        """Test that no duplicate is started when the call finishes before the hedge delay."""
+        operation = AsyncMock(return_value="ok")
+
+        assert await hedged(operation, hedge_delay=0.5) == "ok"
+        assert operation.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_succeeds_after_transient_failure(self):
+        """Test jittered retries of a failing operation."""
+        operation = AsyncMock(side_effect=[ConnectionError("reset"), "ok"])
+
+        assert await retry_with_backoff(operation, base_delay=0.01) == "ok"
+        assert operation.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_no_retry_past_deadline(self):
+        """Test that a retry whose backoff would outlast the request deadline is skipped."""
+        operation = AsyncMock(side_effect=ConnectionError("reset"))
+
+        with deadline_scope(0.5), patch("backend.utils.resilience.backoff_delay", return_value=1.0):
+            with pytest.raises(ConnectionError):
+                await retry_with_backoff(operation)
+
+        assert operation.await_count == 1
+
+    def test_deadline_scope_only_tightens(self):
+        """Test that nested deadlines never extend the outer one."""
+        assert remaining_time() is None
+        with deadline_scope(1):
+            with deadline_scope(60):
+                assert remaining_time() <= 1
+        assert remaining_time() is None
+
+    def test_timeout_sized_from_deadline(self):
+        """Test that call timeouts are capped by the remaining budget."""
+        assert timeout_for(10) == 10
+        with deadline_scope(3):
+            assert 2.5 < timeout_for(10) <= 3
+        with deadline_scope(0.1):
+            with pytest.raises(DeadlineExceeded):
+                timeout_for(10)
+
+    def test_cancelled_request_stops_before_next_call(self):
+        """Test that calls made in worker threads stop once their request is cancelled."""
+        with cancellation_scope() as cancelled:
+            assert timeout_for(10) == 10
+            cancelled.set()
+            with pytest.raises(RequestCancelled):
+                timeout_for(10)
+        assert timeout_for(10) == 10
+
+    @pytest.mark.asyncio
+    async def test_call_cut_off_at_deadline(self):
+        """Test that a slow call is abandoned when the request deadline passes."""
+        with deadline_scope(0.05):
+            with pytest.raises(DeadlineExceeded):
+                await within_deadline(asyncio.sleep(1), name="slow")
+
+
+class TestUpstreamScheduler:
+    """Test cases for the priority-aware upstream scheduler."""
+
+    def setup_method(self):
+        """Set up a scheduler with one fast-refilling, single-token upstream."""
+        self.scheduler = UpstreamScheduler({"gemini": (1200, 1)}, batch_reserve=0.0)
+
+    async def _grant_order(self, requests):
+        order = []
+
+        async def request(priority, caller, label):
+            await self.scheduler.acquire("gemini", priority=priority, caller=caller)
+            order.append(label)
+
+        # Drain the bucket so every request below has to queue
+        await self.scheduler.acquire("gemini")
+        await asyncio.gather(*(request(*spec) for spec in requests))
+        return order
+
+    @pytest.mark.asyncio
+    async def test_interactive_served_before_batch(self):
+        """Test that queued interactive work overtakes batch work queued earlier."""
+        order = await self._grant_order([
+            (Priority.BATCH, "job", "batch-1"),
+            (Priority.BATCH, "job", "batch-2"),
+            (Priority.INTERACTIVE, "user", "interactive"),
+        ])
+
+        assert order == ["interactive", "batch-1", "batch-2"]
+
+    @pytest.mark.asyncio
+    async def test_callers_share_fairly(self):
+        """Test that callers in the same class are served round-robin."""
+        order = await self._grant_order([
+            (Priority.BATCH, "big-job", "big-1"),
+            (Priority.BATCH, "big-job", "big-2"),
+            (Priority.BATCH, "big-job", "big-3"),
+            (Priority.BATCH, "small-job", "small-1"),
+        ])
+
+        assert order == ["big-1", "small-1", "big-2", "big-3"]
+
+    @pytest.mark.asyncio
+    async def test_batch_leaves_reserve_for_interactive(self):
+        """Test that batch work cannot take the tokens reserved for interactive work."""
+        scheduler = UpstreamScheduler({"yahoo": (60, 5)}, batch_reserve=0.4)
+        for _ in range(3):
+            await scheduler.acquire("yahoo", priority=Priority.BATCH)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.acquire("yahoo", priority=Priority.BATCH), timeout=0.05)
+        await asyncio.wait_for(scheduler.acquire("yahoo", priority=Priority.INTERACTIVE), timeout=0.05)
+
+        assert scheduler.stats()["yahoo"]["granted"] == {"interactive": 1, "batch": 3}
+
+    @pytest.mark.asyncio
+    async def test_release_drops_queued_requests_of_caller(self):
+        """Test that releasing a cancelled caller frees its place in the queue at once."""
+        scheduler = UpstreamScheduler({"gemini": (6, 1)}, batch_reserve=0.0)
+        await scheduler.acquire("gemini")
+        abandoned = [
+            asyncio.create_task(scheduler.acquire("gemini", caller="cancelled-job")) for _ in range(3)
+        ]
+        other = asyncio.create_task(scheduler.acquire("gemini", caller="other-job"))
+        await asyncio.sleep(0)
+
+        assert scheduler.release("cancelled-job") == 3
+        await asyncio.sleep(0)
+        assert all(task.cancelled() for task in abandoned)
+        assert scheduler.stats()["gemini"]["queued"]["interactive"] == 1
+        other.cancel()
+
+
+class TestCircuitBreaker:
+    """Test cases for upstream circuit breakers."""
+
+    def setup_method(self):
+        """Set up a breaker that opens at a 50% failure rate over 4 calls."""
+        self.breaker = CircuitBreaker("test", window_size=4, min_calls=4, failure_threshold=0.5, open_seconds=30)
+
+    def _trip(self):
+        for _ in range(2):
+            self.breaker.record_success()
+        for _ in range(2):
+            self.breaker.record_failure()
+
+    def test_opens_on_failure_rate(self):
+        """Test that the circuit opens once the window's failure rate hits the threshold."""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        assert self.breaker.state == CLOSED
+
+        self.breaker.record_success()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        assert self.breaker.state == OPEN
+
+        with pytest.raises(CircuitOpenError):
+            self.breaker.before_call()
+        assert self.breaker.snapshot()["rejected_calls"] == 1
+
+    def test_half_open_probe(self):
+        """Test that one probe is let through after the open period and decides the next state."""
+        self._trip()
+        self.breaker._opened_at -= 30
+        assert self.breaker.state == HALF_OPEN
+
+        self.breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            self.breaker.before_call()
+
+        self.breaker.record_failure()
+        assert self.breaker.state == OPEN
+
+        self.breaker._opened_at -= 30
+        self.breaker.before_call()
+        self.breaker.record_success()
+        assert self.breaker.state == CLOSED
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_not_retried(self):
+        """Test that an open circuit fails fast instead of being retried."""
+        operation = AsyncMock(side_effect=CircuitOpenError("gemini", 10))
+
+        with pytest.raises(CircuitOpenError):
+            await retry_with_backoff(operation, max_attempts=3, base_delay=0, give_up_on=(CircuitOpenError,))
+
+        assert operation.await_count == 1
+
+    def test_yahoo_serves_stale_cache_when_open(self):
+        """Test that the Yahoo tool serves its last good response while the circuit is open."""
+        tool = YahooFinanceTool()
+        tool.breaker = self.breaker
+        cached = {"ticker": "ZZZT", "current_price": 10.0}
+        tool._set_cached(("stock_info", "ZZZT"), cached)
+        tool.cache[("stock_info", "ZZZT")] = (tool.cache[("stock_info", "ZZZT")][0] - tool.cache_duration * 2, cached)
+        self._trip()
+
+        with patch.object(tool.api_client, "call_api") as call_api:
+            assert tool.get_stock_info("ZZZT") == cached
+            call_api.assert_not_called()
+
+        with patch.object(tool.api_client, "call_api") as call_api:
+            result = tool.get_stock_info("ZZZU")
+            call_api.assert_not_called()
+        assert "error" in result
+
+
+class TestCheckpointStore:
+    """Test cases for research checkpoints."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.store = CheckpointStore(":memory:")
+
+    def teardown_method(self):
+        """Close the test database."""
+        self.store.close()
+
+    def test_agent_result_round_trip(self):
+        """Test that agent results are restored with their traces."""
+        result = {"findings": ["Revenue up 10%"], "trace": AgentTrace(agent_type="news", ticker="AAPL")}
+
+        self.store.save_agent_result("req-1", "AAPL", "news", result)
+        restored = self.store.load_agent_results("req-1", "AAPL")
+
+        assert restored["news"]["findings"] == ["Revenue up 10%"]
+        assert isinstance(restored["news"]["trace"], AgentTrace)
+        assert self.store.load_agent_results("req-2", "AAPL") == {}
+
+    def test_errored_result_not_saved(self):
+        """Test that failed or skipped agents are not checkpointed, so retries re-run them."""
+        self.store.save_agent_result("req-1", "AAPL", "news", {"error": "Skipped: request deadline reached"})
+        self.store.save_agent_result("", "AAPL", "sec", {"findings": []})
+
+        assert self.store.load_agent_results("req-1", "AAPL") == {}
+        assert self.store.load_agent_results("", "AAPL") == {}
+
+    def test_insight_round_trip_and_delete(self):
+        """Test that insights are restored and deleted with their request."""
+        insight = TickerInsight(
+            ticker="AAPL",
+            summary="Strong quarter",
+            stance=StanceType.BUY,
+            confidence=ConfidenceLevel.HIGH,
+            rationale="Growth"
+        )
+
+        self.store.save_insight("req-1", insight)
+        assert self.store.load_insight("req-1", "AAPL").summary == "Strong quarter"
+
+        self.store.delete("req-1")
+        assert self.store.load_insight("req-1", "AAPL") is None
+
+    def test_expired_checkpoints_pruned(self, tmp_path):
+        """Test that checkpoints older than the retention period are dropped on open."""
+        path = str(tmp_path / "checkpoints.db")
+        store = CheckpointStore(path, retention_seconds=0)
+        store.save_agent_result("req-1", "AAPL", "news", {"findings": []})
+        store.close()
+
+        assert CheckpointStore(path, retention_seconds=0).load_agent_results("req-1", "AAPL") == {}
+
+    def test_expired_checkpoints_pruned_while_open(self, tmp_path):
+        """Test that a long-lived store keeps pruning expired checkpoints as it writes."""
+        store = CheckpointStore(str(tmp_path / "checkpoints.db"), retention_seconds=60, prune_interval_seconds=0)
+        store.save_agent_result("req-1", "AAPL", "news", {"findings": []})
+
+        with patch("backend.services.checkpoint_store.time.time", return_value=time.time() + 61):
+            store.save_agent_result("req-2", "AAPL", "news", {"findings": []})
+
+        assert store.load_agent_results("req-1", "AAPL") == {}
+        assert "news" in store.load_agent_results("req-2", "AAPL")
+        store.close()
+
+
+class _RedisStandIn:
+    """Local server speaking enough of the Redis protocol for the status store."""
+
+    def __init__(self):
+        self.values = {}
+        self.index = {}
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                # latin-1 keeps compressed values byte-for-byte
+                command = [arg.decode("latin-1") for arg in await _read_reply(reader)]
+                writer.write(self._reply(self._handle(command[0].upper(), command[1:])))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    def _handle(self, name, args):
+        if name == "SET":
+            if "NX" in args[2:] and args[0] in self.values:
+                return None
+            self.values[args[0]] = args[1]
+            return "OK"
+        if name == "GET":
+            return self.values.get(args[0])
+        if name == "DEL":
+            return sum(self.values.pop(key, None) is not None for key in args)
+        if name == "ZADD":
+            self.index[args[2]] = float(args[1])
+            return 1
+        if name == "ZREM":
+            return int(self.index.pop(args[1], None) is not None)
+        if name == "ZREMRANGEBYSCORE":
+            expired = [key for key, score in self.index.items() if score <= float(args[2])]
+            for key in expired:
+                del self.index[key]
+            return len(expired)
+        if name == "ZCARD":
+            return len(self.index)
+        if name == "ZPOPMIN":
+            popped = sorted(self.index.items(), key=lambda item: item[1])[:int(args[1])]
+            for key, _ in popped:
+                del self.index[key]
+            return [value for key, score in popped for value in (key, str(score))]
+        if name == "SELECT":
+            return "OK"
+        return StatusStoreError(f"ERR unknown command '{name}'")
+
+    def _reply(self, value) -> bytes:
+        if isinstance(value, StatusStoreError):
+            return f"-{value}\r\n".encode()
+        if value is None:
+            return b"$-1\r\n"
+        if value == "OK":
+            return b"+OK\r\n"
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        if isinstance(value, list):
+            return _encode_command(value)
+        data = value.encode("latin-1")
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+class TestStatusStore:
+    """Test cases for the analysis status store."""
+
+    def test_values_are_compact_and_round_trip(self):
+        """Test that values survive serialization and large ones are compressed."""
+        small = {"status": "queued", "progress": 0.0}
+        large = {"insights": [{"summary": "Strong demand for data center products. " * 5}] * 20}
+
+        assert decode_value(encode_value(small)) == small
+        assert decode_value(encode_value(large)) == large
+        assert len(encode_value(large)) < len(json.dumps(large)) / 5
+
+    @pytest.mark.asyncio
+    async def test_memory_store_expires_and_caps_entries(self):
+        """Test that the in-process store drops expired entries and the oldest beyond the cap."""
+        store = InMemoryStatusStore(ttl_seconds=60, max_entries=2)
+        for key in ("a", "b", "c"):
+            await store.set(key, {"key": key})
+
+        assert await store.get("a") is None
+        assert (await store.update("c", progress=50.0)) == {"key": "c", "progress": 50.0}
+        assert store.stats()["entries"] == 2
+
+        with patch("backend.services.status_store.time.time", return_value=time.time() + 61):
+            assert await store.get("b") is None
+
+    @pytest.mark.asyncio
+    async def test_add_only_stores_new_keys(self):
+        """Test that add keeps an existing value until it expires."""
+        store = InMemoryStatusStore(ttl_seconds=60)
+        assert await store.add("dedup:1", {"request_id": "first"})
+        assert not await store.add("dedup:1", {"request_id": "second"})
+        assert await store.get("dedup:1") == {"request_id": "first"}
+
+        with patch("backend.services.status_store.time.time", return_value=time.time() + 61):
+            assert await store.add("dedup:1", {"request_id": "third"})
+
+    @pytest.mark.asyncio
+    async def test_redis_store_against_local_server(self):
+        """Test the Redis-protocol store's values, TTL and size cap against a local stand-in."""
+        server = _RedisStandIn()
+        port = await server.start()
+        store = RedisStatusStore(f"redis://127.0.0.1:{port}/0", ttl_seconds=60, max_entries=2, key_prefix="t:")
+        try:
+            await store.set("status:1", {"status": "processing", "progress": 5.0})
+            assert await store.update("status:1", progress=50.0) == {"status": "processing", "progress": 50.0}
+            assert await store.get("status:1") == {"status": "processing", "progress": 50.0}
+            assert await store.get("status:missing") is None
+
+            await store.set("status:2", {"status": "queued"})
+            await store.set("result:1", {"insights": [{"summary": "x" * 2000}]})
+            assert await store.get("status:1") is None
+            assert sorted(server.index) == ["t:result:1", "t:status:2"]
+            assert (await store.get("result:1"))["insights"][0]["summary"] == "x" * 2000
+
+            await store.delete("status:2")
+            assert await store.get("status:2") is None
+
+            assert await store.add("dedup:1", {"request_id": "first"})
+            assert not await store.add("dedup:1", {"request_id": "second"})
+            assert await store.get("dedup:1") == {"request_id": "first"}
+        finally:
+            await store.close()
+            await server.stop()
+
+    @pytest.mark.asyncio
+    async def test_redis_store_unavailable(self):
+        """Test that an unreachable server raises a store error."""
+        store = RedisStatusStore("redis://127.0.0.1:1/0", timeout_seconds=0.5)
+        with pytest.raises(StatusStoreError):
+            await store.get("status:1")
+
+
+class TestToolMemo:
+    """Test cases for the request-scoped tool memo."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.stats = ToolMemoStats()
+        self.memo = ToolMemo(self.stats)
+        self.calls = []
+
+    async def _search(self, query):
+        self.calls.append(query)
+        await asyncio.sleep(0.01)
+        return {"observation": f"results for {query}", "sources": []}
+
+    @pytest.mark.asyncio
+    async def test_near_duplicate_queries_share_result(self):
+        """Test that rephrased queries for the same tool and ticker run the tool once."""
+        first = await self.memo.get_or_run("web_search", "AAPL recent news earnings", "AAPL",
+                                           lambda: self._search("a"))
+        second = await self.memo.get_or_run("web_search", "Earnings news, AAPL stock", "AAPL",
+                                            lambda: self._search("b"))
+        await self.memo.get_or_run("web_search", "AAPL earnings news", "MSFT", lambda: self._search("c"))
+
+        assert first is second
+        assert self.calls == ["a", "c"]
+        assert self.memo.summary()["hits"] == 1
+        assert self.stats.snapshot()["calls_saved"] == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_wait_for_one_call(self):
+        """Test that concurrent equivalent calls share the in-flight call."""
+        results = await asyncio.gather(*(
+            self.memo.get_or_run("web_search", "AAPL insider trading", "AAPL", lambda: self._search("q"))
+            for _ in range(3)
+        ))
+
+        assert self.calls == ["q"]
+        assert results[0] is results[1] is results[2]
+
+    @pytest.mark.asyncio
+    async def test_failed_call_not_memoized(self):
+        """Test that a failing tool call is retried by the next caller."""
+        async def failing():
+            raise RuntimeError("search down")
+
+        with pytest.raises(RuntimeError):
+            await self.memo.get_or_run("web_search", "AAPL news", "AAPL", failing)
+        result = await self.memo.get_or_run("web_search", "AAPL news", "AAPL", lambda: self._search("retry"))
+
+        assert result["observation"] == "results for retry"
+
+    def test_memo_scoped_to_block(self):
+        """Test that the memo is only visible inside its scope."""
+        with tool_memo_scope() as memo:
+            assert current_tool_memo() is memo
+        assert current_tool_memo() is None
+
+
+class TestAnalysisEventBus:
+    """Test cases for the per-request analysis event bus."""
+
+    def setup_method(self):
+        """Set up a fresh event bus."""
+        self.bus = AnalysisEventBus()
+
+    async def _collect(self, request_id, **kwargs):
+        return [message async for message in self.bus.subscribe(request_id, **kwargs)]
+
+    @pytest.mark.asyncio
+    async def test_full_history_drops_tokens_first(self):
+        """Test that a long token stream does not push state events out of the replay history."""
+        bus = AnalysisEventBus(max_events_per_request=5)
+        bus.publish("req-3", "started", {"tickers": ["AAPL"]})
+        for index in range(10):
+            bus.publish("req-3", "token", {"text": str(index)})
+        bus.publish("req-3", "agent_completed", {"ticker": "AAPL", "agent_type": "news"})
+        bus.publish("req-3", "complete", {})
+
+        events = await self._collect("req-3")
+        assert [m["event"] for m in events] == ["started", "token", "token", "agent_completed", "complete"]
+        assert events[1]["data"]["text"] == "8"
+        assert bus.has_events("req-3")
+        assert not bus.has_events("unknown")
+
+    @pytest.mark.asyncio
+    async def test_replays_published_events(self):
+        """Test that a late subscriber sees every event up to the terminal one."""
+        self.bus.publish("req-1", "started", {"tickers": ["AAPL"]})
+        self.bus.publish("req-1", "complete", {"ok": True})
+        self.bus.publish("req-1", "token", {"text": "ignored after completion"})
+
+        messages = await self._collect("req-1")
+
+        assert [m["event"] for m in messages] == ["started", "complete"]
+        assert [m["id"] for m in messages] == [1, 2]
+
+        resumed = await self._collect("req-1", last_event_id=1)
+        assert [m["event"] for m in resumed] == ["complete"]
+
+    @pytest.mark.asyncio
+    async def test_live_events_from_worker_thread(self):
+        """Test that events published from another thread reach a live subscriber."""
+        collector = asyncio.create_task(self._collect("req-2"))
+        await asyncio.sleep(0)
+
+        def publish():
+            self.bus.publish("req-2", "token", {"text": "Hel"})
+            self.bus.publish("req-2", "error", {"detail": "boom"})
+
+        worker = threading.Thread(target=publish)
+        worker.start()
+        worker.join()
+
+        messages = await asyncio.wait_for(collector, timeout=1)
+        assert [m["event"] for m in messages] == ["token", "error"]
+
+    def test_format_sse(self):
+        """Test Server-Sent Events framing."""
+        frame = format_sse({"id": 3, "event": "field", "data": {"name": "stance"}})
+        assert frame == 'id: 3\nevent: field\ndata: {"name": "stance"}\n\n'
+        assert format_sse(None).startswith(":")
+
+
+class TestTokenBudget:
+    """Test cases for token estimation and prompt compaction."""
+
+    def test_truncate_to_tokens(self):
+        """Test that oversized text is cut to fit its budget."""
+        text = "word " * 500
+        truncated = truncate_to_tokens(text, 50)
+
+        assert estimate_tokens(truncated) <= 50
+        assert truncated.endswith("[truncated]")
+        assert truncate_to_tokens("short", 50) == "short"
+
+    def test_compact_entries_keeps_recent_and_summarizes_older(self):
+        """Test rolling compaction of a long, chronological list of entries."""
+        entries = [f"{i}. Finding number {i}. " + "Detail " * 100 for i in range(1, 21)]
+
+        compacted = compact_entries(entries, max_tokens=400, keep_recent=3)
+
+        assert sum(estimate_tokens(entry) for entry in compacted) <= 400
+        assert compacted[0].startswith("Earlier (summarized")
+        assert compacted[-1].startswith("20. Finding number 20.")
+        assert len(compacted) == 4
+
+    def test_compact_entries_unchanged_when_within_budget(self):
+        """Test that entries that already fit are left alone."""
+        entries = ["1. Short finding", "2. Another one"]
+        assert compact_entries(entries, max_tokens=100) == entries
+
+
+class TestLLMGateway:
+    """Test cases for the LLM gateway and context caching."""
+
+    def setup_method(self):
+        """Set up a gateway around a mock chat model and a cache that registers every prefix."""
+        self.llm = Mock()
+        self.llm.ainvoke = AsyncMock(return_value=Mock(content="ok"))
+        self.cache = ContextCache("gemini-2.5-flash", min_tokens=10)
+        self.cache._create = AsyncMock(return_value="cachedContents/abc")
+        self.gateway = LLMGateway(self.llm, "gemini-2.5-flash", self.cache)
+        self.prefix = "You are a financial research agent. " * 10
+
+    @pytest.mark.asyncio
+    async def test_cached_prefix_replaces_system_message(self):
+        """Test that only the variable suffix is sent once the prefix is cached."""
+        for ticker in ["AAPL", "MSFT"]:
+            await self.gateway.ainvoke([SystemMessage(content=self.prefix), HumanMessage(content=ticker)])
+
+        assert self.cache._create.await_count == 1
+        args, kwargs = self.llm.ainvoke.call_args
+        assert [message.content for message in args[0]] == ["MSFT"]
+        assert kwargs["cached_content"] == "cachedContents/abc"
+        assert self.gateway.stats["cached_calls"] == 2
+
+    @pytest.mark.asyncio
+    async def test_short_prefix_sent_inline(self):
+        """Test that prefixes below the provider minimum are not registered."""
+        messages = [SystemMessage(content="Be brief."), HumanMessage(content="AAPL")]
+
+        await self.gateway.ainvoke(messages)
+
+        self.cache._create.assert_not_awaited()
+        assert self.llm.ainvoke.call_args.args[0] == messages
+        assert "cached_content" not in self.llm.ainvoke.call_args.kwargs
+
+    @pytest.mark.asyncio
+    async def test_rejected_cache_falls_back_to_full_prompt(self):
+        """Test that a failing cached call is retried with the full prompt."""
+        self.llm.ainvoke.side_effect = [Exception("cache expired"), Mock(content="ok")]
+        messages = [SystemMessage(content=self.prefix), HumanMessage(content="AAPL")]
+
+        response = await self.gateway.ainvoke(messages)
+
+        assert response.content == "ok"
+        assert self.llm.ainvoke.call_args.args[0] == messages
+        assert self.cache.prefix_key(self.prefix) not in self.cache._entries
+
+    @pytest.mark.asyncio
+    async def test_non_cache_failures_not_resent(self):
+        """Test that an open breaker or a passed deadline is not followed by a full-prompt call."""
+        messages = [SystemMessage(content=self.prefix), HumanMessage(content="AAPL")]
+        for error in (CircuitOpenError("gemini", 5.0), DeadlineExceeded("No time left")):
+            self.llm.ainvoke.reset_mock()
+            self.llm.ainvoke.side_effect = error
+
+            with pytest.raises(type(error)):
+                await self.gateway.ainvoke(messages)
+
+            assert self.llm.ainvoke.await_count == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -32,6 +32,26 @@ class BaseTool(ABC):
         """
         pass
     
+    def to_function_schema(self) -> Dict[str, Any]:
+        """Get the function declaration the LLM uses to call this tool."""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "What to look up, e.g. a search query or the data needed"
+                        }
+                    },
+                    "required": ["query"]
+                }
+            }
+        }
+    
     def _format_sources(self, sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Format sources into a consistent structure."""
         formatted_sources = []
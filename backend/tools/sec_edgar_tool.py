@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, List
 import structlog
 
+from backend.services.scheduler import get_scheduler
 from backend.tools.base_tool import BaseTool
 
 logger = structlog.get_logger()
@@ -57,6 +58,7 @@ class SECEdgarTool(BaseTool):
             # 2. Parse XBRL data for structured information
             # 3. Extract text from filing documents
             
+            await get_scheduler().acquire("sec")
             filings = await self._simulate_edgar_search(ticker, query)
             
             observation = self._create_observation(filings, ticker)
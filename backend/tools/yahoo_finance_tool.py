@@ -2,9 +2,12 @@
 Improved Yahoo Finance Tool - Fetches real-time stock data using Manus API Hub and web scraping.
 """
 from backend.utils.api_client import ApiClient
+from backend.utils.circuit_breaker import CircuitOpenError, get_breaker
+from backend.utils.resilience import timeout_for
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import structlog
+import threading
 import time
 import requests
 from bs4 import BeautifulSoup
@@ -12,14 +15,124 @@ import re
 
 logger = structlog.get_logger()
 
+YAHOO_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# Last good responses, shared by all tool instances: (method, ticker, args) -> (fetched_at, data)
+_response_cache: Dict[Tuple, Tuple[datetime, Any]] = {}
+_response_cache_lock = threading.Lock()
+
 
 class YahooFinanceTool:
     """Tool for fetching stock data and news from Yahoo Finance using Manus API Hub."""
     
-    def __init__(self):
-        self.api_client = ApiClient()
-        self.cache = {}
+    def __init__(self, api_client: Optional[ApiClient] = None):
+        self.api_client = api_client or ApiClient()
+        self.cache = _response_cache
         self.cache_duration = timedelta(minutes=5)
+        # How old a cached response may be when it is served because Yahoo is unavailable
+        self.stale_cache_duration = timedelta(hours=24)
+        self.breaker = get_breaker("yahoo")
+    
+    def _get_cached(self, key: Tuple, allow_stale: bool = False) -> Optional[Any]:
+        """
+        Get a cached response.
+        
+        Args:
+            key: Cache key
+            allow_stale: Accept entries older than cache_duration (up to stale_cache_duration)
+            
+        Returns:
+            Cached data, or None if there is no usable entry
+        """
+        with _response_cache_lock:
+            entry = self.cache.get(key)
+        if entry is None:
+            return None
+        
+        fetched_at, data = entry
+        max_age = self.stale_cache_duration if allow_stale else self.cache_duration
+        if datetime.now() - fetched_at > max_age:
+            return None
+        return data
+    
+    def _set_cached(self, key: Tuple, data: Any) -> None:
+        """Cache a good response."""
+        with _response_cache_lock:
+            self.cache[key] = (datetime.now(), data)
+    
+    def _serve_stale(self, key: Tuple, ticker: str, error: Exception) -> Optional[Any]:
+        """Get a stale cached response to serve instead of failing, logging why."""
+        data = self._get_cached(key, allow_stale=True)
+        if data is not None:
+            logger.warning(f"Serving cached data for {ticker}",
+                           method=key[0],
+                           circuit_open=isinstance(error, CircuitOpenError),
+                           error=str(error))
+        return data
+    
+    def _http_get(self, url: str, timeout: float = 10) -> requests.Response:
+        """
+        GET a Yahoo Finance page through the circuit breaker.
+        
+        The timeout is capped at the time left before the request deadline. Timeouts,
+        connection errors, 429s and 5xx responses count as upstream failures, except
+        for timeouts that only happened because the deadline shortened the call.
+        
+        Raises:
+            DeadlineExceeded: If there is no time left for the request
+            CircuitOpenError: If the Yahoo circuit is open
+            requests.RequestException: If the request fails
+        """
+        call_timeout = timeout_for(timeout)
+        self.breaker.before_call()
+        try:
+            response = requests.get(url, headers=YAHOO_HEADERS, timeout=call_timeout)
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 500
+            if status == 429 or status >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except requests.Timeout:
+            if call_timeout < timeout:
+                self.breaker.record_abandoned()
+            else:
+                self.breaker.record_failure()
+            raise
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+        
+        self.breaker.record_success()
+        return response
+    
+    def _get_stock_chart(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Call the Yahoo Finance chart API through the circuit breaker.
+        
+        Raises:
+            DeadlineExceeded: If there is no time left for the request
+            CircuitOpenError: If the Yahoo circuit is open
+            Exception: If the API call fails or returns an error
+        """
+        timeout_for(10)
+        self.breaker.before_call()
+        try:
+            response = self.api_client.call_api('YahooFinance/get_stock_chart', query=query)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        
+        if not response or 'error' in response:
+            self.breaker.record_failure()
+            raise Exception(f"Chart API error: {(response or {}).get('error', 'empty response')}")
+        
+        self.breaker.record_success()
+        return response
     
     def _scrape_yahoo_finance_data(self, ticker: str) -> Dict[str, Any]:
         """
@@ -32,13 +145,7 @@ class YahooFinanceTool:
             Dictionary with scraped data
         """
         try:
-            url = f'https://finance.yahoo.com/quote/{ticker}'
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            response = self._http_get(f'https://finance.yahoo.com/quote/{ticker}')
             
             soup = BeautifulSoup(response.text, 'html.parser')
             text = soup.get_text()
@@ -127,9 +234,14 @@ class YahooFinanceTool:
         Returns:
             Dictionary containing stock information
         """
+        cache_key = ('stock_info', ticker)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             # Fetch stock chart data which includes comprehensive info
-            response = self.api_client.call_api('YahooFinance/get_stock_chart', query={
+            response = self._get_stock_chart({
                 'symbol': ticker,
                 'region': 'US',
                 'interval': '1d',
@@ -179,9 +291,13 @@ class YahooFinanceTool:
                        pe_ratio=result_data['pe_ratio'],
                        market_cap=result_data['market_cap'])
             
+            self._set_cached(cache_key, result_data)
             return result_data
             
         except Exception as e:
+            stale = self._serve_stale(cache_key, ticker, e)
+            if stale is not None:
+                return stale
             logger.error(f"Error fetching stock info for {ticker}", error=str(e))
             return {
                 'ticker': ticker,
@@ -202,14 +318,13 @@ class YahooFinanceTool:
         Returns:
             List of news articles with metadata
         """
+        cache_key = ('news', ticker, limit)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            url = f'https://finance.yahoo.com/quote/{ticker}'
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            response = self._http_get(f'https://finance.yahoo.com/quote/{ticker}')
             
             soup = BeautifulSoup(response.text, 'html.parser')
             articles = []
@@ -299,9 +414,13 @@ class YahooFinanceTool:
                 articles.extend(generic_news[:limit - len(articles)])
             
             logger.info(f"Fetched {len(articles)} news articles for {ticker}")
+            self._set_cached(cache_key, articles[:limit])
             return articles[:limit]
             
         except Exception as e:
+            stale = self._serve_stale(cache_key, ticker, e)
+            if stale is not None:
+                return stale
             logger.error(f"Error fetching news for {ticker}", error=str(e))
             # Return generic news as fallback
             return [
@@ -326,8 +445,13 @@ class YahooFinanceTool:
         Returns:
             Dictionary containing price history and technical analysis
         """
+        cache_key = ('price_history', ticker, period)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            response = self.api_client.call_api('YahooFinance/get_stock_chart', query={
+            response = self._get_stock_chart({
                 'symbol': ticker,
                 'region': 'US',
                 'interval': '1d',
@@ -376,7 +500,7 @@ class YahooFinanceTool:
             else:
                 trend = 'neutral'
             
-            return {
+            price_history = {
                 'ticker': ticker,
                 'period': period,
                 'current_price': current_price,
@@ -389,8 +513,13 @@ class YahooFinanceTool:
                 'low': min(valid_prices),
                 'volume': sum(quotes.get('volume', [0])),
             }
+            self._set_cached(cache_key, price_history)
+            return price_history
             
         except Exception as e:
+            stale = self._serve_stale(cache_key, ticker, e)
+            if stale is not None:
+                return stale
             logger.error(f"Error fetching price history for {ticker}", error=str(e))
             return {
                 'ticker': ticker,
@@ -6,6 +6,8 @@ import sys
 import requests
 from typing import Dict, Any
 
+from backend.utils.resilience import timeout_for
+
 # Try to import Manus API client if available
 try:
     sys.path.append('/opt/.manus/.sandbox-runtime')
@@ -88,7 +90,7 @@ class ApiClient:
         }
         
         try:
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+            response = requests.get(url, params=params, headers=headers, timeout=timeout_for(10))
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -106,7 +108,7 @@ class ApiClient:
         }
         
         try:
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+            response = requests.get(url, params=params, headers=headers, timeout=timeout_for(10))
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -0,0 +1,194 @@
+"""
+Circuit breakers - per-upstream failure-rate tracking with open/half-open states for fast failure.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+import structlog
+
+from backend.config.settings import Settings, get_settings
+
+logger = structlog.get_logger()
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker over a sliding window of recent calls.
+
+    The circuit opens when at least `min_calls` of the last `window_size` calls were
+    recorded and the share of failures reaches `failure_threshold`. While open, calls
+    fail immediately. After `open_seconds` the circuit is half-open and lets a limited
+    number of probe calls through: a successful probe closes it, a failed one opens
+    it again. Thread-safe, so it can guard blocking calls made from worker threads.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int = 20,
+        min_calls: int = 5,
+        failure_threshold: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the open period is over."""
+        with self._lock:
+            return self._current_state()
+
+    def before_call(self) -> None:
+        """
+        Check that a call may be made, reserving a probe slot when half-open.
+
+        Raises:
+            CircuitOpenError: If the circuit is open or no probe slot is free
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return
+
+            self._rejected += 1
+            retry_after = max(self._opened_at + self.open_seconds - time.monotonic(), 0.0)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self) -> None:
+        """Record a successful call."""
+        with self._lock:
+            if self._current_state() == HALF_OPEN:
+                self._transition(CLOSED)
+                return
+            self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit if the failure rate is too high."""
+        with self._lock:
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._transition(OPEN)
+                return
+            if state == OPEN:
+                return
+
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_threshold:
+                self._transition(OPEN)
+
+    def record_abandoned(self) -> None:
+        """Record a call that was cancelled before its outcome was known, freeing its probe slot."""
+        with self._lock:
+            if self._current_state() == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the breaker state and window statistics."""
+        with self._lock:
+            state = self._current_state()
+            calls = len(self._outcomes)
+            failures = self._outcomes.count(False)
+            return {
+                "state": state,
+                "window_calls": calls,
+                "window_failures": failures,
+                "failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "rejected_calls": self._rejected,
+                "retry_after_seconds": round(
+                    max(self._opened_at + self.open_seconds - time.monotonic(), 0.0), 1
+                ) if state == OPEN else 0.0,
+            }
+
+    def _current_state(self) -> str:
+        """Get the state (caller holds the lock)."""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def _transition(self, state: str) -> None:
+        """Change state (caller holds the lock)."""
+        logger.warning("Circuit breaker state change", breaker=self.name, old_state=self._state, new_state=state)
+        self._state = state
+        self._half_open_calls = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == CLOSED:
+            self._outcomes.clear()
+
+
+class BreakerRegistry:
+    """Named circuit breakers, one per upstream, sharing the same parameters."""
+
+    def __init__(self, **breaker_options: Any):
+        self._options = breaker_options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "BreakerRegistry":
+        """Create a registry using the circuit breaker settings."""
+        return cls(
+            window_size=settings.breaker_window_size,
+            min_calls=settings.breaker_min_calls,
+            failure_threshold=settings.breaker_failure_threshold,
+            open_seconds=settings.breaker_open_seconds
+        )
+
+    def get(self, name: str) -> CircuitBreaker:
+        """Get the breaker of an upstream, creating it on first use."""
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name, **self._options)
+            return self._breakers[name]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get the state of every breaker."""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.snapshot() for name, breaker in breakers.items()}
+
+
+# Global breaker registry
+breakers = BreakerRegistry.from_settings(get_settings())
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get the circuit breaker of an upstream."""
+    return breakers.get(name)
+
+
+def get_breaker_registry() -> BreakerRegistry:
+    """Get the circuit breaker registry."""
+    return breakers
@@ -0,0 +1,364 @@
+"""
+Resilience helpers - request deadlines, hedged calls and jittered retries for upstream requests.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Deque, Iterator, Optional, Tuple, Type, TypeVar
+import structlog
+
+from backend.utils.circuit_breaker import CircuitOpenError
+
+logger = structlog.get_logger()
+
+T = TypeVar("T")
+
+# Absolute deadline (time.monotonic) of the request being processed, if any
+_request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+# Set when the request being processed is cancelled; visible to its worker threads too
+_request_cancelled: ContextVar[Optional[threading.Event]] = ContextVar("request_cancelled", default=None)
+
+
+def remaining_time() -> Optional[float]:
+    """Get the seconds left until the current request deadline, or None without a deadline."""
+    deadline = _request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@contextmanager
+def deadline_scope(timeout_seconds: float) -> Iterator[None]:
+    """
+    Set a request deadline for the code (and tasks created) inside the block.
+
+    A deadline already in effect is only ever tightened, never extended.
+
+    Args:
+        timeout_seconds: Seconds from now until the deadline
+    """
+    deadline = time.monotonic() + timeout_seconds
+    current = _request_deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _request_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request deadline leaves no time for a call or stage."""
+
+
+class RequestCancelled(DeadlineExceeded):
+    """Raised when the request was cancelled; like a passed deadline, it is never retried."""
+
+
+@contextmanager
+def cancellation_scope() -> Iterator[threading.Event]:
+    """
+    Make the code (and tasks and worker threads started) inside the block cancellable.
+
+    Setting the yielded event stops calls that size their timeout with timeout_for,
+    including blocking HTTP calls in worker threads that asyncio cancellation cannot
+    reach.
+    """
+    cancelled = threading.Event()
+    token = _request_cancelled.set(cancelled)
+    try:
+        yield cancelled
+    finally:
+        _request_cancelled.reset(token)
+
+
+def check_cancelled() -> None:
+    """
+    Raise if the current request was cancelled.
+
+    Raises:
+        RequestCancelled: If the cancellation event of the current request is set
+    """
+    cancelled = _request_cancelled.get()
+    if cancelled is not None and cancelled.is_set():
+        raise RequestCancelled("Request was cancelled")
+
+
+def has_time_for(seconds: float) -> bool:
+    """Whether at least `seconds` are left before the current request deadline (always true without one)."""
+    remaining = remaining_time()
+    return remaining is None or remaining >= seconds
+
+
+def timeout_for(default: float, minimum: float = 0.5) -> float:
+    """
+    Size the timeout of one upstream call from the remaining request budget.
+
+    Args:
+        default: Timeout used when the deadline is further away (or there is none)
+        minimum: Shortest timeout worth attempting the call with
+
+    Returns:
+        The default timeout, capped at the time left until the deadline
+
+    Raises:
+        DeadlineExceeded: If less than `minimum` seconds are left
+        RequestCancelled: If the request was cancelled
+    """
+    check_cancelled()
+    remaining = remaining_time()
+    if remaining is None:
+        return default
+    if remaining < minimum:
+        raise DeadlineExceeded(f"Only {max(remaining, 0.0):.1f}s left before the request deadline")
+    return min(default, remaining)
+
+
+async def within_deadline(awaitable: Awaitable[T], name: str = "operation") -> T:
+    """
+    Await something, giving up when the current request deadline passes.
+
+    Args:
+        awaitable: Coroutine or future to await
+        name: Operation name for error messages
+
+    Returns:
+        Result of the awaitable
+
+    Raises:
+        DeadlineExceeded: If the deadline passes first (the awaitable is cancelled)
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout=max(remaining, 0.0))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"{name} did not finish before the request deadline") from None
+
+
+class LatencyTracker:
+    """Recent latencies of one kind of call, for percentile-based hedge delays."""
+
+    def __init__(self, window: int = 200):
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Record the latency of a successful call."""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, percentile: float, min_samples: int = 20) -> Optional[float]:
+        """
+        Get a latency percentile in seconds.
+
+        Args:
+            percentile: Percentile between 0 and 100
+            min_samples: Samples needed before the estimate is trusted
+
+        Returns:
+            Latency percentile, or None if there are too few samples
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < max(min_samples, 1):
+            return None
+        index = min(int(len(latencies) * percentile / 100), len(latencies) - 1)
+        return latencies[index]
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Get a "full jitter" exponential backoff delay.
+
+    Args:
+        attempt: Zero-based number of the retry
+        base_delay: Delay ceiling of the first retry
+        max_delay: Upper bound of the delay ceiling
+
+    Returns:
+        Random delay between 0 and min(max_delay, base_delay * 2 ** attempt)
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+async def retry_with_backoff(
+    operation: Callable[[], Awaitable[T]],
+    max_attempts: int = 3,
+    base_delay: float = 0.5,
+    max_delay: float = 8.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    give_up_on: Tuple[Type[BaseException], ...] = (),
+    name: str = "operation"
+) -> T:
+    """
+    Run an operation, retrying failures with jittered exponential backoff.
+
+    A retry is only attempted if its backoff delay ends before the current request
+    deadline; otherwise the last error is raised straight away. DeadlineExceeded is
+    never retried.
+
+    Args:
+        operation: Factory returning a fresh awaitable for each attempt
+        max_attempts: Total number of attempts
+        base_delay: Backoff delay ceiling of the first retry
+        max_delay: Upper bound of the backoff delay ceiling
+        retry_on: Exception types that are retried
+        give_up_on: Exception types that are never retried (e.g. an open circuit)
+        name: Operation name for logging
+
+    Returns:
+        Result of the first successful attempt
+    """
+    for attempt in range(max_attempts):
+        try:
+            return await operation()
+        except retry_on as e:
+            if attempt + 1 >= max_attempts or isinstance(e, give_up_on + (DeadlineExceeded,)):
+                raise
+
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            remaining = remaining_time()
+            if remaining is not None and delay >= remaining:
+                logger.warning("Not retrying, request deadline too close",
+                               operation=name, remaining_seconds=remaining, error=str(e))
+                raise
+
+            logger.warning("Retrying after failure",
+                           operation=name, attempt=attempt + 1, delay_seconds=delay, error=str(e))
+            await asyncio.sleep(delay)
+
+    raise RuntimeError("max_attempts must be at least 1")
+
+
+async def hedged(
+    operation: Callable[[], Awaitable[T]],
+    hedge_delay: Optional[float],
+    name: str = "operation"
+) -> T:
+    """
+    Run an operation and start a duplicate if it has not finished after a delay.
+
+    Whichever attempt succeeds first wins and the other is cancelled. If one attempt
+    fails while the other is still running, the other one's outcome is used.
+
+    Args:
+        operation: Factory returning a fresh awaitable for each attempt
+        hedge_delay: Seconds to wait before hedging, or None to disable hedging
+        name: Operation name for logging
+
+    Returns:
+        Result of the first successful attempt
+    """
+    primary = asyncio.ensure_future(operation())
+    if hedge_delay is None:
+        return await primary
+
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        # No point in hedging if the duplicate could not finish before the deadline either
+        remaining = remaining_time()
+        if remaining is not None and remaining <= hedge_delay:
+            return await primary
+
+        logger.info("Hedging slow request", operation=name, hedge_delay_seconds=hedge_delay)
+        tasks.append(asyncio.ensure_future(operation()))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+class ResiliencePolicy:
+    """Hedging and retry parameters for one kind of upstream call."""
+
+    def __init__(
+        self,
+        hedging_enabled: bool = True,
+        hedge_percentile: float = 95.0,
+        initial_hedge_delay: float = 4.0,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        give_up_on: Tuple[Type[BaseException], ...] = ()
+    ):
+        self.hedging_enabled = hedging_enabled
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.give_up_on = give_up_on
+
+    @classmethod
+    def for_llm(cls, settings) -> "ResiliencePolicy":
+        """Create the policy for LLM calls from the application settings."""
+        return cls(
+            hedging_enabled=settings.llm_hedging_enabled,
+            hedge_percentile=settings.llm_hedge_percentile,
+            initial_hedge_delay=settings.llm_hedge_initial_delay_seconds,
+            max_attempts=settings.llm_retry_attempts,
+            base_delay=settings.llm_retry_base_delay_seconds,
+            max_delay=settings.llm_retry_max_delay_seconds,
+            give_up_on=(CircuitOpenError,)
+        )
+
+    def hedge_delay(self, latency: LatencyTracker) -> Optional[float]:
+        """Get the hedge delay: the configured latency percentile once enough calls were seen."""
+        if not self.hedging_enabled:
+            return None
+        delay = latency.percentile(self.hedge_percentile)
+        return delay if delay is not None else self.initial_hedge_delay
+
+    async def call(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        latency: LatencyTracker,
+        name: str = "operation"
+    ) -> T:
+        """
+        Run an operation with hedging and jittered retries, recording its latency.
+
+        Each attempt is cut off at the current request deadline.
+
+        Args:
+            operation: Factory returning a fresh awaitable for each attempt
+            latency: Latency history of this kind of call (updated on success)
+            name: Operation name for logging
+
+        Returns:
+            Result of the first successful attempt
+        """
+        async def attempt() -> T:
+            start_time = time.monotonic()
+            result = await within_deadline(hedged(operation, self.hedge_delay(latency), name=name), name=name)
+            latency.record(time.monotonic() - start_time)
+            return result
+
+        return await retry_with_backoff(
+            attempt,
+            max_attempts=self.max_attempts,
+            base_delay=self.base_delay,
+            max_delay=self.max_delay,
+            give_up_on=self.give_up_on,
+            name=name
+        )
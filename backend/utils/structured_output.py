@@ -0,0 +1,237 @@
+"""
+Structured output helpers - incremental JSON parsing and lightweight schema checks for LLM responses.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Parser states while scanning the members of the top-level object
+_EXPECT_OBJECT = "expect_object"
+_EXPECT_KEY = "expect_key"
+_IN_KEY = "in_key"
+_EXPECT_COLON = "expect_colon"
+_EXPECT_VALUE = "expect_value"
+_IN_VALUE = "in_value"
+_AFTER_VALUE = "after_value"
+_CLOSED = "closed"
+
+_JSON_TYPES = {
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+}
+
+
+class IncrementalJSONParser:
+    """
+    Parse a JSON object that arrives in arbitrary text chunks.
+
+    Top-level fields are returned from `feed` as soon as their value closes, so
+    callers can act on e.g. `summary` while the rest of the object is still streaming.
+    Any text before the opening brace (such as a markdown code fence) is ignored.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self._buffer = ""
+        self._pos = 0
+        self._state = _EXPECT_OBJECT
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._key = None
+        self._value_start = 0
+
+    @property
+    def complete(self) -> bool:
+        """Whether the top-level object has been closed."""
+        return self._state == _CLOSED
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Consume the next chunk of text.
+
+        Args:
+            chunk: Next piece of the streamed response
+
+        Returns:
+            List of (key, value) pairs for top-level fields completed by this chunk
+        """
+        self._buffer += chunk
+        completed = []
+
+        while self._pos < len(self._buffer) and self._state != _CLOSED:
+            char = self._buffer[self._pos]
+            field = self._consume(char, self._pos)
+            if field is not None:
+                completed.append(field)
+            self._pos += 1
+
+        return completed
+
+    def partial_field(self) -> Optional[Tuple[str, str]]:
+        """
+        Get the top-level string field that is currently streaming.
+
+        Returns:
+            Tuple of (key, text decoded so far), or None if no string value is open
+        """
+        if self._state != _IN_VALUE or self._depth != 1 or not self._in_string:
+            return None
+
+        raw = self._buffer[self._value_start + 1:self._pos]
+        # Drop a trailing, partially received escape sequence (at most 6 chars, e.g. \u00e9)
+        for end in range(len(raw), max(len(raw) - 6, 0) - 1, -1):
+            try:
+                return self._key, json.loads(f'"{raw[:end]}"')
+            except json.JSONDecodeError:
+                continue
+        return self._key, ""
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Get the fully parsed object.
+
+        Raises:
+            ValueError: If the object has not been closed yet
+        """
+        if not self.complete:
+            raise ValueError("Incomplete JSON object in response")
+        return dict(self.fields)
+
+    def _consume(self, char: str, index: int):
+        """Advance the state machine by one character."""
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._state == _IN_KEY:
+                    self._key = json.loads(self._buffer[self._string_start:index + 1])
+                    self._state = _EXPECT_COLON
+                elif self._state == _IN_VALUE and self._depth == 1:
+                    return self._emit(self._buffer[self._value_start:index + 1])
+            return None
+
+        if self._state == _EXPECT_OBJECT:
+            if char == '{':
+                self._depth = 1
+                self._state = _EXPECT_KEY
+            return None
+
+        if self._state == _EXPECT_KEY:
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+                self._state = _IN_KEY
+            elif char == '}':
+                self._close()
+            return None
+
+        if self._state == _EXPECT_COLON:
+            if char == ':':
+                self._state = _EXPECT_VALUE
+            return None
+
+        if self._state == _EXPECT_VALUE:
+            if char.isspace():
+                return None
+            self._value_start = index
+            self._state = _IN_VALUE
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in '{[':
+                self._depth += 1
+            return None
+
+        if self._state == _IN_VALUE:
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]' and self._depth > 1:
+                self._depth -= 1
+                if self._depth == 1:
+                    return self._emit(self._buffer[self._value_start:index + 1])
+            elif self._depth == 1 and (char in ',}' or char.isspace()):
+                # End of a scalar (number, true, false, null)
+                field = self._emit(self._buffer[self._value_start:index])
+                if char == ',':
+                    self._state = _EXPECT_KEY
+                elif char == '}':
+                    self._close()
+                return field
+            return None
+
+        if self._state == _AFTER_VALUE:
+            if char == ',':
+                self._state = _EXPECT_KEY
+            elif char == '}':
+                self._close()
+
+        return None
+
+    def _emit(self, value_text: str):
+        """Record a completed top-level field."""
+        self._state = _AFTER_VALUE
+        key = self._key
+        self._key = None
+        try:
+            value = json.loads(value_text)
+        except json.JSONDecodeError:
+            return None
+        self.fields[key] = value
+        return key, value
+
+    def _close(self):
+        """Mark the top-level object as closed."""
+        self._depth = 0
+        self._state = _CLOSED
+
+
+def schema_errors(data: Any, schema: Dict[str, Any]) -> List[str]:
+    """
+    Check a parsed response against a (subset of) OpenAPI-style response schema.
+
+    Only `type`, `properties`, `required` and `items` are checked, which is what the
+    response schemas in this project use.
+
+    Args:
+        data: Parsed JSON value
+        schema: Response schema
+
+    Returns:
+        List of human-readable validation errors (empty when valid)
+    """
+    return _schema_errors(data, schema, "$")
+
+
+def _schema_errors(data: Any, schema: Dict[str, Any], path: str) -> List[str]:
+    errors = []
+
+    expected_type = schema.get("type", "").lower()
+    python_types = _JSON_TYPES.get(expected_type)
+    if python_types:
+        is_bool = isinstance(data, bool)
+        if not isinstance(data, python_types) or (is_bool and expected_type != "boolean"):
+            return [f"{path}: expected {expected_type}, got {type(data).__name__}"]
+
+    if expected_type == "object":
+        for key in schema.get("required", []):
+            if key not in data:
+                errors.append(f"{path}.{key}: missing required field")
+        for key, property_schema in schema.get("properties", {}).items():
+            if key in data:
+                errors.extend(_schema_errors(data[key], property_schema, f"{path}.{key}"))
+    elif expected_type == "array" and "items" in schema:
+        for i, item in enumerate(data):
+            errors.extend(_schema_errors(item, schema["items"], f"{path}[{i}]"))
+
+    return errors
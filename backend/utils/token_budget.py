@@ -0,0 +1,112 @@
+"""
+Token budgeting helpers - local token estimation and prompt compaction.
+"""
+import re
+from typing import List
+
+# Average characters per token for English prose with Gemini/GPT-style tokenizers
+CHARS_PER_TOKEN = 4
+
+TRUNCATION_MARKER = " ...[truncated]"
+
+# Sentence end: terminator after a word (not after list numbers such as "1.")
+_SENTENCE_END = re.compile(r'(?<=[A-Za-z%)\]][.!?])\s')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a piece of text without calling a tokenizer.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Estimated token count (rounded up)
+    """
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Truncate text so that its estimated size fits within a token budget.
+
+    The cut is made on a word boundary where possible and marked as truncated.
+
+    Args:
+        text: Text to truncate
+        max_tokens: Maximum estimated tokens of the result
+
+    Returns:
+        The original text if it fits, otherwise a truncated copy
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    max_chars = max(max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER), 0)
+    cut = text[:max_chars]
+    if ' ' in cut[max_chars // 2:]:
+        cut = cut[:cut.rfind(' ')]
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def leading_sentence(text: str, max_tokens: int) -> str:
+    """Get the first sentence of a text, truncated to a token budget."""
+    text = " ".join(text.split())
+    first = _SENTENCE_END.split(text, maxsplit=1)[0]
+    return truncate_to_tokens(first, max_tokens)
+
+
+def compact_entries(
+    entries: List[str],
+    max_tokens: int,
+    keep_recent: int = 3,
+    digest_label: str = "Earlier (summarized)"
+) -> List[str]:
+    """
+    Fit a chronological list of prompt entries into a token budget.
+
+    Entries are returned unchanged when they fit. Otherwise the most recent
+    `keep_recent` entries are kept, each truncated to an equal share of the budget,
+    and older entries are rolled up into a single digest line made of their leading
+    sentences. If even the digest does not fit, the oldest entries are dropped first.
+
+    Args:
+        entries: Entries in chronological order (oldest first)
+        max_tokens: Token budget for all returned entries together
+        keep_recent: Number of most recent entries kept in (possibly truncated) full
+        digest_label: Prefix of the digest line
+
+    Returns:
+        Compacted list of entries
+    """
+    if not entries:
+        return []
+    if sum(estimate_tokens(entry) for entry in entries) <= max_tokens:
+        return list(entries)
+
+    keep_recent = max(min(keep_recent, len(entries)), 1)
+    recent = entries[-keep_recent:]
+    older = entries[:-keep_recent]
+
+    digest_budget = max_tokens // 4 if older else 0
+    per_entry = max((max_tokens - digest_budget) // len(recent), 1)
+    compacted = [truncate_to_tokens(entry, per_entry) for entry in recent]
+
+    if not older:
+        return compacted
+
+    # Keep the newest of the older entries when the digest has to shed items
+    per_item = max(digest_budget // len(older), 12)
+    items = [leading_sentence(entry, per_item) for entry in older]
+    omitted = 0
+    digest = f"{digest_label}: " + "; ".join(items)
+    while items and estimate_tokens(digest) > digest_budget:
+        items.pop(0)
+        omitted += 1
+        digest = f"{digest_label} ({omitted} older omitted): " + "; ".join(items)
+
+    if items:
+        return [digest] + compacted
+    return compacted
@@ -4,7 +4,9 @@ Streamlit frontend for the Stock Research Chatbot.
 import streamlit as st
 import requests
 import json
+import threading
 import time
+import uuid
 from datetime import datetime
 import pandas as pd
 import plotly.express as px
@@ -180,29 +182,122 @@ def main():
     if "analysis_result" in st.session_state:
         display_analysis_results(st.session_state.analysis_result)
 
+def iter_sse_events(response):
+    """Parse a Server-Sent Events response into (event, data) tuples."""
+    event, data_lines = "message", []
+    
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith(":"):
+            continue  # keep-alive comment
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+def render_live_insights(container, live: Dict[str, Dict[str, Any]]):
+    """Render partial per-ticker insights received so far."""
+    with container.container():
+        for ticker, parts in live.items():
+            fields, drafts = parts["fields"], parts["drafts"]
+            
+            stance = fields.get("stance")
+            confidence = fields.get("confidence")
+            heading = f"**{ticker}**"
+            if stance:
+                heading += f" — {stance.upper()}"
+            if confidence:
+                heading += f" ({confidence.upper()} confidence)"
+            st.markdown(heading)
+            
+            summary = fields.get("summary") or drafts.get("summary")
+            if summary:
+                st.caption(summary)
+            
+            rationale = fields.get("rationale") or drafts.get("rationale")
+            if rationale:
+                st.write(rationale)
+
+def follow_analysis_stream(stream, progress_bar, status_text, live_area):
+    """Update progress and partial insights from the analysis event stream until it ends."""
+    expected_steps = 1
+    completed_steps = 0
+    live: Dict[str, Dict[str, Any]] = {}
+    
+    for event, data in iter_sse_events(stream):
+        if event == "started":
+            expected_steps = max(1, len(data.get("tickers", [])) * len(data.get("agents", [])))
+            status_text.text(f"🔍 Researching {', '.join(data.get('tickers', []))}...")
+        elif event == "agent_completed":
+            completed_steps += 1
+            progress_bar.progress(min(95, int(completed_steps * 100 / expected_steps)))
+            status_text.text(f"✅ {data['agent_type'].title()} agent finished for {data['ticker']}")
+        elif event in ("field", "token"):
+            parts = live.setdefault(data["ticker"], {"fields": {}, "drafts": {}})
+            if event == "field":
+                parts["fields"][data["name"]] = data["value"]
+            else:
+                parts["drafts"][data["name"]] = parts["drafts"].get(data["name"], "") + data["text"]
+            render_live_insights(live_area, live)
+        elif event in ("complete", "error"):
+            break
+
 def analyze_stocks(query: str, max_iterations: int, timeout_seconds: int):
-    """Perform stock analysis using the backend API."""
+    """Perform stock analysis using the backend API, rendering partial results as they stream in."""
     
     # Progress tracking
     progress_bar = st.progress(0)
     status_text = st.empty()
+    live_area = st.empty()
+    
+    request_id = str(uuid.uuid4())
+    outcome: Dict[str, Any] = {}
+    
+    def post_analysis():
+        try:
+            outcome["response"] = requests.post(
+                f"{API_BASE_URL}/analyze",
+                json={
+                    "query": query,
+                    "max_iterations": max_iterations,
+                    "timeout_seconds": timeout_seconds,
+                    "request_id": request_id
+                },
+                timeout=timeout_seconds + 10
+            )
+        except Exception as e:
+            outcome["error"] = e
     
     try:
         status_text.text("🚀 Starting analysis...")
-        progress_bar.progress(10)
+        progress_bar.progress(5)
         
-        # Make API request
-        response = requests.post(
-            f"{API_BASE_URL}/analyze",
-            json={
-                "query": query,
-                "max_iterations": max_iterations,
-                "timeout_seconds": timeout_seconds
-            },
-            timeout=timeout_seconds + 10
-        )
+        worker = threading.Thread(target=post_analysis, daemon=True)
+        worker.start()
+        
+        # Follow progress events; the analysis request itself carries the final result
+        try:
+            with requests.get(
+                f"{API_BASE_URL}/analyze/{request_id}/stream",
+                stream=True,
+                timeout=(5, timeout_seconds + 10)
+            ) as stream:
+                follow_analysis_stream(stream, progress_bar, status_text, live_area)
+        except requests.exceptions.RequestException:
+            status_text.text("🔄 Waiting for analysis to finish...")
+        
+        worker.join(timeout_seconds + 15)
+        if "error" in outcome:
+            raise outcome["error"]
+        if "response" not in outcome:
+            raise requests.exceptions.Timeout()
         
-        progress_bar.progress(50)
+        response = outcome["response"]
         status_text.text("🔄 Processing results...")
         
         if response.status_code == 200:
@@ -231,6 +326,7 @@ def analyze_stocks(query: str, max_iterations: int, timeout_seconds: int):
     finally:
         progress_bar.empty()
         status_text.empty()
+        live_area.empty()
 
 def display_analysis_results(result: Dict[str, Any]):
     """Display the analysis results in a structured format."""
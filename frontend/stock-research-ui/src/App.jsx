@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState } from 'react'
 import { Button } from '@/components/ui/button.jsx'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card.jsx'
 import { Input } from '@/components/ui/input.jsx'
@@ -38,6 +38,56 @@ function App() {
   const [error, setError] = useState(null)
   const [progress, setProgress] = useState(0)
   const [currentStep, setCurrentStep] = useState('')
+  const [liveInsights, setLiveInsights] = useState({})
+
+  // Follow the analysis event stream: real progress plus partial insights as they arrive
+  const openEventStream = (requestId) => {
+    const eventSource = new EventSource(`${API_BASE_URL}/analyze/${requestId}/stream`)
+    let expectedSteps = 1
+    let completedSteps = 0
+
+    const updateTicker = (ticker, update) => {
+      setLiveInsights(prev => {
+        const current = prev[ticker] || { fields: {}, drafts: {} }
+        return { ...prev, [ticker]: update(current) }
+      })
+    }
+
+    eventSource.addEventListener('started', (event) => {
+      const data = JSON.parse(event.data)
+      expectedSteps = Math.max(1, data.tickers.length * data.agents.length)
+      setCurrentStep(`Researching ${data.tickers.join(', ')}...`)
+    })
+
+    eventSource.addEventListener('agent_completed', (event) => {
+      const data = JSON.parse(event.data)
+      completedSteps += 1
+      setProgress(Math.min(95, (completedSteps / expectedSteps) * 100))
+      setCurrentStep(`${data.agent_type} agent finished for ${data.ticker}`)
+    })
+
+    eventSource.addEventListener('field', (event) => {
+      const data = JSON.parse(event.data)
+      updateTicker(data.ticker, (current) => ({
+        ...current,
+        fields: { ...current.fields, [data.name]: data.value }
+      }))
+    })
+
+    eventSource.addEventListener('token', (event) => {
+      const data = JSON.parse(event.data)
+      updateTicker(data.ticker, (current) => ({
+        ...current,
+        drafts: { ...current.drafts, [data.name]: (current.drafts[data.name] || '') + data.text }
+      }))
+    })
+
+    const close = () => eventSource.close()
+    eventSource.addEventListener('complete', close)
+    eventSource.addEventListener('error', close)
+
+    return eventSource
+  }
 
   const handleAnalyze = async () => {
     if (!query.trim()) return
@@ -45,9 +95,13 @@ function App() {
     setIsAnalyzing(true)
     setError(null)
     setAnalysisResult(null)
+    setLiveInsights({})
     setProgress(0)
     setCurrentStep('Initializing analysis...')
 
+    const requestId = crypto.randomUUID()
+    const eventSource = openEventStream(requestId)
+
     try {
       const response = await fetch(`${API_BASE_URL}/analyze`, {
         method: 'POST',
@@ -57,7 +111,8 @@ function App() {
         body: JSON.stringify({
           query: query,
           max_iterations: 3,
-          timeout_seconds: 60
+          timeout_seconds: 60,
+          request_id: requestId
         })
       })
 
@@ -72,6 +127,7 @@ function App() {
     } catch (err) {
       setError(err.message)
     } finally {
+      eventSource.close()
       setIsAnalyzing(false)
     }
   }
@@ -128,20 +184,6 @@ function App() {
     }
   }
 
-  // Simulate progress updates during analysis
-  useEffect(() => {
-    if (isAnalyzing) {
-      const interval = setInterval(() => {
-        setProgress(prev => {
-          if (prev >= 90) return prev
-          return prev + Math.random() * 10
-        })
-      }, 1000)
-
-      return () => clearInterval(interval)
-    }
-  }, [isAnalyzing])
-
   return (
     <div className="min-h-screen bg-gradient-to-br from-blue-50 to-indigo-100 dark:from-gray-900 dark:to-gray-800">
       <div className="container mx-auto px-4 py-8">
@@ -215,6 +257,42 @@ function App() {
           </Card>
         )}
 
+        {/* Live Insights (streamed while the analysis runs) */}
+        {isAnalyzing && Object.keys(liveInsights).length > 0 && (
+          <Card className="mb-8">
+            <CardHeader>
+              <CardTitle>Live Insights</CardTitle>
+              <CardDescription>Partial results as each agent and the synthesis stream in</CardDescription>
+            </CardHeader>
+            <CardContent className="space-y-4">
+              {Object.entries(liveInsights).map(([ticker, { fields, drafts }]) => (
+                <div key={ticker} className="border rounded-lg p-4">
+                  <div className="flex items-center gap-2 mb-2">
+                    <span className="font-semibold text-lg">{ticker}</span>
+                    {fields.stance && (
+                      <Badge className={`${getStanceColor(fields.stance)} flex items-center gap-1`}>
+                        {getStanceIcon(fields.stance)}
+                        {fields.stance.toUpperCase()}
+                      </Badge>
+                    )}
+                    {fields.confidence && (
+                      <Badge className={getConfidenceColor(fields.confidence)}>
+                        {fields.confidence.toUpperCase()} CONFIDENCE
+                      </Badge>
+                    )}
+                  </div>
+                  {(fields.summary || drafts.summary) && (
+                    <p className="text-sm text-gray-600 dark:text-gray-400 mb-2">{fields.summary || drafts.summary}</p>
+                  )}
+                  {(fields.rationale || drafts.rationale) && (
+                    <p className="text-gray-700 dark:text-gray-300">{fields.rationale || drafts.rationale}</p>
+                  )}
+                </div>
+              ))}
+            </CardContent>
+          </Card>
+        )}
+
         {/* Error Display */}
         {error && (
           <Alert className="mb-8 border-red-200 bg-red-50">